@@ -0,0 +1,459 @@
+"""Headless HTTP service running the extraction + analysis pipeline.
+
+The Streamlit app becomes a thin client of this service (set
+ANALYSIS_SERVICE_URL), so analysis capacity scales with the number of
+service workers and nodes rather than with UI sessions.
+
+Endpoints:
+    POST /v1/analyze   multipart/form-data with a `resume` PDF file and a
+                       `job_description` text field. Returns
+                       {"local_scores", "analysis", "stats"} as JSON, or with
+                       ?stream=1 one JSON event per line (local_scores, then
+                       each section as it completes, then done or error).
+                       An optional `previous` field holding
+                       {"text", "analysis"} of an earlier version of the
+                       resume re-analyzes only the sections that changed.
+    GET  /healthz      200 when the LLM backend is configured, 503 otherwise.
+
+Each request runs under an ANALYSIS_DEADLINE_SECONDS deadline (see
+deadline.py); sections that have not finished by then are left out and
+named in stats["deadline"]. A streaming client that disconnects cancels its
+analysis.
+
+The process model is pre-fork: the parent binds the port and forks
+ANALYSIS_SERVICE_WORKERS workers that accept on the shared socket, each
+serving up to ANALYSIS_SERVICE_THREADS requests at once (others wait up to
+ANALYSIS_SERVICE_QUEUE_SECONDS, then get a 503), and replaces any worker
+that dies. The LLM rate limits are split evenly between workers. With
+METRICS_PORT set, worker N serves its metrics on METRICS_PORT + N (see
+metrics.py).
+
+Usage:
+    python analysis_service.py --port 8000 --workers 4
+    curl -F resume=@resume.pdf -F job_description="$(cat jd.txt)" localhost:8000/v1/analyze
+"""
+import argparse
+import email.message
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+
+import analyzer
+import deadline
+import llm_scheduler
+import metrics
+import pdf_extract
+import scoring
+from cache import cache_from_env
+
+HOST = os.getenv('ANALYSIS_SERVICE_HOST', '0.0.0.0')
+PORT = int(os.getenv('ANALYSIS_SERVICE_PORT', '8000'))
+WORKERS = int(os.getenv('ANALYSIS_SERVICE_WORKERS', str(os.cpu_count() or 1)))
+THREADS = int(os.getenv('ANALYSIS_SERVICE_THREADS', '8'))
+MAX_JOB_DESCRIPTION_BYTES = int(os.getenv('ANALYSIS_SERVICE_MAX_JD_BYTES', str(256 * 1024)))
+# Room for the multipart headers and boundaries around the resume, the job
+# description and a previous analysis (capped like the job description)
+MAX_REQUEST_BYTES = pdf_extract.MAX_PDF_BYTES + 2 * MAX_JOB_DESCRIPTION_BYTES + 64 * 1024
+# Seconds a request may wait for a free thread before it is turned away
+QUEUE_TIMEOUT = float(os.getenv('ANALYSIS_SERVICE_QUEUE_SECONDS', '10'))
+# Seconds a client may take to send its request before the socket is closed
+READ_TIMEOUT = float(os.getenv('ANALYSIS_SERVICE_READ_TIMEOUT_SECONDS', '30'))
+
+logger = logging.getLogger("analysis_service")
+
+
+class RequestError(Exception):
+    """A request the service rejects; status is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def analysis_events(pdf_file, job_description, cache=None, stats=None, previous=None):
+    """Yield ("local_scores", scores) and then each (key, value) analysis section.
+
+    Extraction failures raise AnalysisError before anything is yielded, so a
+    caller can tell them apart from a failed LLM call. previous is the
+    {"text", "analysis"} of an earlier version of the same resume; the
+    extracted text is recorded in stats["resume_text"] to serve as one.
+    Each stage runs within its share of the deadline in effect, if any.
+    """
+    deadline.stage("extract")
+    try:
+        with metrics.span("extract"):
+            resume_text = pdf_extract.extract_text(pdf_file)
+    except Exception as e:
+        raise analyzer.AnalysisError(f"Error extracting text from PDF: {str(e)}")
+    if not resume_text.strip():
+        raise analyzer.AnalysisError("No text could be extracted from the PDF.")
+    if stats is not None:
+        stats["resume_text"] = resume_text
+    with metrics.span("local_score"):
+        yield "local_scores", scoring.score_resume(resume_text, job_description)
+    deadline.stage("llm")
+    if previous:
+        yield from analyzer.reanalyze_stream(previous["text"], previous["analysis"], resume_text, job_description,
+                                             cache=cache, stats=stats)
+    else:
+        yield from analyzer.analyze_stream(resume_text, job_description, cache=cache, stats=stats)
+
+
+class BoundedBuffer(io.BytesIO):
+    """A form field held in memory, rejected once it grows past max_bytes"""
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def write(self, chunk):
+        if self.tell() + len(chunk) > self.max_bytes:
+            raise RequestError(413, f"Form field is longer than {self.max_bytes // 1024}KB")
+        return super().write(chunk)
+
+
+def _header_params(value):
+    """Parse a header such as Content-Disposition into (value, {param: value})"""
+    message = email.message.Message()
+    message["Content-Disposition"] = value
+    params = message.get_params(header="content-disposition") or [("", "")]
+    return params[0][0].lower(), {key.lower(): val for key, val in params[1:]}
+
+
+def read_form(stream, content_type, length):
+    """Read a multipart/form-data body of length bytes from stream, one line at a time.
+
+    The resume part is written to a pdf_extract.SpooledUpload, so a large
+    upload goes to disk instead of memory; every other field is capped at
+    MAX_JOB_DESCRIPTION_BYTES. Returns {name: (filename, SpooledUpload or
+    bytes)}; the caller closes any spooled upload.
+    """
+    kind, params = _header_params(content_type)
+    if kind != "multipart/form-data":
+        raise RequestError(415, "Expected multipart/form-data with resume and job_description fields")
+    if not params.get("boundary"):
+        raise RequestError(400, "Malformed multipart body")
+    delimiter = b"--" + params["boundary"].encode("latin-1")
+    remaining = length
+
+    def readline():
+        nonlocal remaining
+        line = stream.readline(min(remaining, 64 * 1024))
+        remaining -= len(line)
+        if not line:
+            raise RequestError(400, "Malformed multipart body")
+        return line
+
+    while readline().rstrip(b"\r\n") != delimiter:
+        pass
+    fields = {}
+    try:
+        while True:
+            headers = {}
+            for _ in range(16):
+                line = readline().rstrip(b"\r\n")
+                if not line:
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            else:
+                raise RequestError(400, "Malformed multipart body")
+            _, disposition = _header_params(headers.get("content-disposition", ""))
+            name, filename = disposition.get("name"), disposition.get("filename")
+            if name == "resume":
+                target = pdf_extract.SpooledUpload()
+            else:
+                target = BoundedBuffer(MAX_JOB_DESCRIPTION_BYTES)
+            if name:
+                fields[name] = (filename, target)
+
+            # The line break before a delimiter belongs to the delimiter, not the content
+            line_break = b""
+            while True:
+                line = readline()
+                stripped = line.rstrip(b"\r\n")
+                if stripped in (delimiter, delimiter + b"--"):
+                    break
+                target.write(line_break)
+                if line.endswith(b"\r\n"):
+                    content, line_break = line[:-2], b"\r\n"
+                elif line.endswith(b"\n"):
+                    content, line_break = line[:-1], b"\n"
+                else:
+                    content, line_break = line, b""
+                target.write(content)
+            if stripped == delimiter + b"--":
+                break
+    except pdf_extract.PDFLimitError as e:
+        _close_form(fields)
+        raise RequestError(413, str(e))
+    except BaseException:
+        _close_form(fields)
+        raise
+    return {name: (filename, target.finish() if isinstance(target, pdf_extract.SpooledUpload)
+                   else target.getvalue())
+            for name, (filename, target) in fields.items()}
+
+
+def _close_form(fields):
+    for _, value in fields.values():
+        if isinstance(value, pdf_extract.SpooledUpload):
+            value.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return this worker's analysis cache, opening it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = cache_from_env()
+        return _cache
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    server_version = "ResumeAnalysisService/1.0"
+    timeout = READ_TIMEOUT
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/healthz":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            backend = analyzer.get_backend()
+        except analyzer.AnalysisError as e:
+            self._send_json(503, {"status": "unavailable", "error": str(e), "pid": os.getpid()})
+            return
+        self._send_json(200, {"status": "ok", "backend": backend.name, "pid": os.getpid(),
+                              "scheduler": llm_scheduler.get_scheduler().stats(),
+                              "coalescing": analyzer.coalescing_stats()})
+
+    def _read_request(self):
+        """Return (spooled PDF, job description, previous version or None) from the request"""
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise RequestError(411, "Content-Length is required")
+        if not length.isdigit():
+            raise RequestError(400, "Invalid Content-Length")
+        if int(length) > MAX_REQUEST_BYTES:
+            raise RequestError(413, f"Request is larger than the {MAX_REQUEST_BYTES // (1024 * 1024)}MB limit")
+        fields = read_form(self.rfile, self.headers.get("Content-Type", ""), int(length))
+        resume = fields.get("resume", (None, None))[1]
+        job_description = fields.get("job_description", (None, b""))[1]
+        job_description = job_description.decode("utf-8", errors="replace").strip()
+        if not isinstance(resume, pdf_extract.SpooledUpload) or not resume.size:
+            _close_form(fields)
+            raise RequestError(400, "Missing resume file")
+        if not job_description:
+            resume.close()
+            raise RequestError(400, "Missing job_description")
+        previous = fields.get("previous", (None, b""))[1]
+        try:
+            previous = json.loads(previous) if previous else None
+            if previous is not None and not (isinstance(previous.get("text"), str)
+                                             and isinstance(previous.get("analysis"), dict)):
+                raise ValueError
+        except (ValueError, AttributeError):
+            resume.close()
+            raise RequestError(400, 'previous must be a JSON object with "text" and "analysis"')
+        return resume, job_description, previous
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/v1/analyze":
+            self._send_json(404, {"error": "Not found"})
+            return
+        if not self.server.slots.acquire(timeout=QUEUE_TIMEOUT):
+            # Shed load rather than queue indefinitely behind a busy worker
+            self.close_connection = True
+            self._send_json(503, {"error": "Analysis service is busy. Please try again."}, {"Retry-After": "1"})
+            return
+        try:
+            with metrics.trace():
+                self._analyze(parse_qs(url.query).get("stream", ["0"])[0] in ("1", "true"))
+        finally:
+            self.server.slots.release()
+            metrics.flush()
+
+    def _analyze(self, stream):
+        try:
+            resume, job_description, previous = self._read_request()
+        except RequestError as e:
+            self.close_connection = True
+            self._send_json(e.status, {"error": str(e)})
+            return
+        except socket.timeout:
+            self.close_connection = True
+            self._send_json(408, {"error": "Timed out reading the request"})
+            return
+
+        with resume:
+            self._run_analysis(resume, job_description, stream, previous)
+
+    def _run_analysis(self, resume, job_description, stream, previous=None):
+        with deadline.scope(deadline.Deadline()):
+            self._respond(resume, job_description, stream, previous)
+
+    def _respond(self, resume, job_description, stream, previous):
+        stats = {}
+        events = analysis_events(resume, job_description, cache=get_cache(), stats=stats, previous=previous)
+        # Extraction runs before any response is sent so unreadable PDFs get a 422
+        try:
+            with metrics.span("analyze"):
+                _, local_scores = next(events)
+        except analyzer.AnalysisError as e:
+            self._send_json(422, {"error": str(e)})
+            return
+        if stream:
+            self._stream_events(local_scores, events, stats)
+            return
+
+        analysis = {}
+        try:
+            with metrics.span("analyze"):
+                analysis.update(events)
+        except analyzer.AnalysisError as e:
+            self._send_json(502, {"error": str(e), "local_scores": local_scores})
+            return
+        self._send_json(200, {"local_scores": local_scores, "analysis": analysis, "stats": stats})
+
+    def _stream_events(self, local_scores, events, stats):
+        """Write one JSON event per line as sections complete; the body ends when the connection closes"""
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(event):
+            self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+        try:
+            send({"event": "local_scores", "value": local_scores})
+            with metrics.span("analyze"):
+                for key, value in events:
+                    send({"event": "section", "key": key, "value": value})
+            send({"event": "done", "stats": stats})
+        except analyzer.AnalysisError as e:
+            send({"event": "error", "error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client disconnected before the analysis finished")
+            deadline.current().cancel("disconnected")
+        finally:
+            events.close()
+
+
+def make_server(sock, workers=1, threads=THREADS):
+    """Build an HTTP server accepting on an already bound and listening socket"""
+    server = ThreadingHTTPServer(sock.getsockname()[:2], AnalysisHandler, bind_and_activate=False)
+    server.socket = sock
+    server.server_name, server.server_port = socket.getfqdn(), sock.getsockname()[1]
+    server.daemon_threads = True
+    server.slots = threading.BoundedSemaphore(threads)
+    # Every worker calls the same API account, so each gets its share of the limits
+    llm_scheduler.set_scheduler(llm_scheduler.LLMScheduler(
+        llm_scheduler.REQUESTS_PER_MINUTE / workers, llm_scheduler.TOKENS_PER_MINUTE / workers,
+    ))
+    return server
+
+
+def _run_worker(sock, workers, threads, index):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Each worker has its own registry, so it exports on its own port
+    metrics.start_exporters_from_env(index)
+    make_server(sock, workers, threads).serve_forever()
+
+
+def serve(host=HOST, port=PORT, workers=WORKERS, threads=THREADS):
+    """Bind the port and serve with `workers` pre-forked processes until SIGTERM/SIGINT"""
+    sock = socket.create_server((host, port), backlog=128)
+    logger.info("Analysis service listening on %s:%s with %d workers", host, sock.getsockname()[1], workers)
+    if workers <= 1:
+        metrics.start_exporters_from_env()
+        try:
+            make_server(sock, 1, threads).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # pid -> worker index; a replacement takes over the index of the worker it replaces
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, workers, threads, index)
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if not stopping and index is not None:
+            logger.warning("Worker %d exited with status %d; starting a replacement", pid, status)
+            spawn(index)
+    sock.close()
+
+
+def main(argv=None):
+    load_dotenv(encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Serve resume analysis over HTTP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes")
+    parser.add_argument("--threads", type=int, default=THREADS, help="concurrent requests per worker")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    serve(args.host, args.port, args.workers, args.threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,690 @@
+"""Resume analysis against a job description via the Anthropic API.
+
+This module holds the prompt, the API call and response parsing so that the
+Streamlit app and the batch CLI share one implementation. Requests go to the
+backend selected in llm_backends (Anthropic by default). Failures are raised
+as AnalysisError with a user-facing message; callers decide how to show them.
+
+The analysis is split into SECTIONS that are requested concurrently with the
+same cacheable system prompt, cached separately and merged into one dict, so
+a re-run that misses only one section pays only for that section. Responses
+are parsed tolerantly (see response_parser): fields that are still missing
+or invalid after repair are requested again in one small follow-up call
+instead of failing the whole analysis.
+
+Identical section requests that are in flight at the same time, e.g. from
+several sessions analyzing the same candidate, share one call (see
+singleflight).
+
+Under an analysis deadline (see deadline.py) analyze_stream stops waiting
+when the LLM stage runs out or the deadline is cancelled and finishes with
+the sections that arrived; streams nobody is waiting for any more are
+stopped. Only sections that finished are repaired and cached.
+
+A revised resume can be re-analyzed incrementally (reanalyze_stream): the
+resume is diffed section by section against the version behind a previous
+analysis, and one request sends only the changed sections with that
+analysis, merging the fields that come back into it.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import deadline
+import llm_backends
+import llm_client
+import metrics
+from llm_scheduler import BATCH, INTERACTIVE, get_scheduler
+from singleflight import SingleFlight
+from prompt_compaction import compact_inputs, compact_resume, estimate_tokens, split_sections
+from response_parser import ANALYSIS_SCHEMA, normalize_field, parse_analysis, validate_analysis
+from streaming_json import IncrementalObjectParser
+from cache import make_cache_key, normalize_text
+
+# The backend's model and the prompt version are part of the cache key, so bump
+# PROMPT_VERSION whenever the prompt or expected JSON structure changes
+PROMPT_VERSION = "v4"
+TEMPERATURE = 0.7
+# The analysis is split into independent sections that are requested
+# concurrently and cached separately; each has its own small output budget
+SECTIONS = {
+    "overview": ("strengths", "weaknesses", "suggestions", "match_score", "ats_compatibility"),
+    "skills": ("skill_matches", "missing_keywords"),
+    "action_verbs": ("action_verbs",),
+    "alignment": ("education_alignment", "experience_alignment"),
+    "format": ("format_score",),
+}
+SECTION_MAX_TOKENS = {"overview": 1024, "skills": 768, "action_verbs": 384, "alignment": 768, "format": 512}
+# A follow-up only asks for the fields a section response lacked
+FOLLOWUP_MAX_TOKENS = 1024
+# A revision changing more than this share of the resume is analyzed from scratch
+REVISION_MAX_CHANGED_SHARE = float(os.getenv('REVISION_MAX_CHANGED_SHARE', '0.5'))
+REVISION_MAX_TOKENS = 2048
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registries of in-flight section requests, keyed like the section cache
+_section_calls = SingleFlight("section")
+_section_streams = SingleFlight("stream")
+
+
+class AnalysisError(Exception):
+    """Raised when an analysis cannot be completed; the message is shown to the user"""
+
+
+def get_backend():
+    """Return the configured LLM backend or raise AnalysisError if it is unusable"""
+    try:
+        backend = llm_backends.get_backend()
+        backend.check_config()
+    except llm_backends.BackendError as e:
+        raise AnalysisError(str(e))
+    return backend
+
+
+# Static instructions and schema come first and the job description second so
+# that both form a stable prefix the API can cache across resumes; only the
+# resume in the user turn changes between calls in a batch.
+ANALYSIS_INSTRUCTIONS = """You analyze resumes against a job description.
+Provide a comprehensive analysis including:
+1. Key strengths and matches
+2. Missing skills or qualifications
+3. Specific suggestions for improvement
+4. Overall match score (percentage)
+5. ATS (Applicant Tracking System) compatibility score (percentage)
+6. Detailed skills breakdown with proficiency levels
+7. Missing important keywords from the job description
+8. Action verbs analysis
+9. Education and experience alignment
+10. Format and presentation score
+
+Format the response as a JSON with the following structure:
+{
+    "strengths": ["strength1", "strength2", ...],
+    "weaknesses": ["weakness1", "weakness2", ...],
+    "suggestions": ["suggestion1", "suggestion2", ...],
+    "match_score": percentage,
+    "ats_compatibility": percentage,
+    "skill_matches": {"skill1": percentage, "skill2": percentage, ...},
+    "missing_keywords": ["keyword1", "keyword2", ...],
+    "action_verbs": {
+        "used": ["verb1", "verb2", ...],
+        "recommended": ["verb1", "verb2", ...]
+    },
+    "education_alignment": {
+        "score": percentage,
+        "feedback": "detailed feedback"
+    },
+    "experience_alignment": {
+        "score": percentage,
+        "feedback": "detailed feedback"
+    },
+    "format_score": {
+        "score": percentage,
+        "issues": ["issue1", "issue2", ...],
+        "positives": ["positive1", "positive2", ...]
+    }
+}
+
+Ensure the analysis is thorough and actionable. For missing keywords, focus on technical skills, qualifications, and industry-specific terms that appear in the job description but are absent in the resume."""
+
+
+def build_system_prompt(job_description):
+    """Build the cacheable prompt prefix: instructions and schema, then the job description"""
+    return [
+        {"type": "text", "text": ANALYSIS_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+        {
+            "type": "text",
+            "text": f"Job Description:\n{job_description}",
+            "cache_control": {"type": "ephemeral"},
+        },
+    ]
+
+
+def build_user_prompt(resume_text, fields):
+    """Build the per-resume part of the prompt, asking only for the given top-level fields"""
+    return (
+        f"Resume:\n{resume_text}\n\nAnalyze this resume against the job description. Respond with a JSON "
+        f"object containing only these keys, structured as described above: {', '.join(fields)}."
+    )
+
+
+def prepare_inputs(resume_text, job_description, stats=None):
+    """Compact both inputs for the prompt, recording before/after token counts in stats"""
+    with metrics.span("compact") as span:
+        resume_text, job_description, report = compact_inputs(resume_text, job_description)
+        span.update(tokens_before=report["tokens_before"], tokens_after=report["tokens_after"])
+    logger.info(
+        "Prompt compaction: %d -> %d tokens (resume %d -> %d, job description %d -> %d)",
+        report["tokens_before"], report["tokens_after"],
+        report["resume_tokens_before"], report["resume_tokens_after"],
+        report["job_tokens_before"], report["job_tokens_after"],
+    )
+    if stats is not None:
+        stats["compaction"] = report
+    return resume_text, job_description
+
+
+def section_schema(fields):
+    return {key: ANALYSIS_SCHEMA[key] for key in fields}
+
+
+def parse_response(completion, fields=tuple(ANALYSIS_SCHEMA)):
+    """Parse a completion tolerantly; returns (valid fields, missing or invalid field names)"""
+    with metrics.span("parse") as span:
+        valid, problems, repaired = parse_analysis(completion.text, section_schema(fields))
+        span.update(repaired=repaired, invalid=len(problems))
+    if repaired:
+        metrics.record_repair("truncation")
+    return valid, problems
+
+
+def _request_args(resume_text, job_description, fields, max_tokens):
+    return build_system_prompt(job_description), build_user_prompt(resume_text, fields), max_tokens, TEMPERATURE
+
+
+_stats_lock = threading.Lock()
+
+
+def record_usage(completion, stats=None, estimated_tokens=None):
+    """Record token usage, including prompt-cache reads and writes, from a completion
+
+    When the request was admitted on an estimate, the rate limiter is charged
+    for the difference so the tokens/minute budget tracks real usage.
+    """
+    counts = dict(completion.usage)
+    llm_client.get_manager().record_usage(counts)
+    metrics.record_tokens(counts, completion.backend or "unknown")
+    if estimated_tokens is not None:
+        billed = counts["input_tokens"] + counts["cache_creation_input_tokens"]
+        get_scheduler().reconcile_tokens(estimated_tokens, billed)
+    logger.info(
+        "Token usage: input=%d output=%d cache_write=%d cache_read=%d",
+        counts["input_tokens"], counts["output_tokens"],
+        counts["cache_creation_input_tokens"], counts["cache_read_input_tokens"],
+    )
+    if stats is not None:
+        # Sections and follow-ups each add to the analysis' usage
+        with _stats_lock:
+            previous = stats.get("usage") or {}
+            stats["usage"] = {field: previous.get(field, 0) + value for field, value in counts.items()}
+
+
+def lookup_cache(cache, cache_key, fields=tuple(ANALYSIS_SCHEMA)):
+    """Return the cached fields or None, counting the hit or miss"""
+    if cache is None:
+        return None
+    with metrics.span("cache_lookup"):
+        cached = cache.get(cache_key)
+    if cached is not None and validate_analysis(cached, section_schema(fields))[1]:
+        # Entries written before schema validation may be incomplete
+        cached = None
+    metrics.record_cache_lookup(cached is not None)
+    return cached
+
+
+def section_key(resume_text, job_description, backend, section):
+    """Cache and in-flight key of one section request"""
+    return make_cache_key(resume_text, job_description, backend.model, f"{PROMPT_VERSION}/{section}")
+
+
+def coalescing_stats():
+    """Section requests that led a call and that joined one already in flight"""
+    calls, streams = _section_calls.stats(), _section_streams.stats()
+    return {key: calls[key] + streams[key] for key in calls}
+
+
+def plan_sections(resume_text, job_description, cache, backend):
+    """Return (fields found in the cache, {section: cache key} for sections still to request)"""
+    cached = {}
+    pending = {}
+    for section, fields in SECTIONS.items():
+        cache_key = section_key(resume_text, job_description, backend, section)
+        hit = lookup_cache(cache, cache_key, fields)
+        if hit is None:
+            pending[section] = cache_key
+        else:
+            cached.update(hit)
+    return cached, pending
+
+
+def store_sections(cache, pending, valid):
+    """Cache every requested section that came back complete"""
+    if cache is None:
+        return
+    for section, cache_key in pending.items():
+        fields = SECTIONS[section]
+        if all(key in valid for key in fields):
+            cache.set(cache_key, {key: valid[key] for key in fields})
+
+
+def estimate_request_tokens(resume_text, job_description):
+    """Estimate input tokens for rate limiting before the request is sent"""
+    return estimate_tokens(ANALYSIS_INSTRUCTIONS) + estimate_tokens(job_description) + estimate_tokens(resume_text)
+
+
+def request_section(backend, resume_text, job_description, section, stats=None, priority=INTERACTIVE):
+    """Request one section; returns (valid fields, missing or invalid field names)
+
+    An identical request already in flight is waited for instead of sent
+    again; only the caller that sent it records the token usage.
+    """
+    fields = SECTIONS[section]
+    estimated = estimate_request_tokens(resume_text, job_description)
+    args = _request_args(resume_text, job_description, fields, SECTION_MAX_TOKENS[section])
+
+    def request():
+        with metrics.span("llm", backend=backend.name, section=section):
+            completion = get_scheduler().call(lambda: backend.complete(*args), priority=priority, tokens=estimated)
+        record_usage(completion, stats, estimated)
+        return parse_response(completion, fields)
+
+    return _section_calls.call(section_key(resume_text, job_description, backend, section), request)
+
+
+async def arequest_section(backend, resume_text, job_description, section, stats=None, priority=BATCH):
+    """Async variant of request_section"""
+    fields = SECTIONS[section]
+    estimated = estimate_request_tokens(resume_text, job_description)
+    args = _request_args(resume_text, job_description, fields, SECTION_MAX_TOKENS[section])
+
+    async def request():
+        with metrics.span("llm", backend=backend.name, section=section):
+            completion = await get_scheduler().acall(
+                lambda: backend.acomplete(*args), priority=priority, tokens=estimated
+            )
+        record_usage(completion, stats, estimated)
+        return parse_response(completion, fields)
+
+    return await _section_calls.acall(section_key(resume_text, job_description, backend, section), request)
+
+
+def merge_section(valid, problems, errors, section, outcome):
+    """Fold one section's (valid, problems) or BackendError into the running totals"""
+    if isinstance(outcome, llm_backends.BackendError):
+        errors.append(outcome)
+        problems.extend(SECTIONS[section])
+        return
+    section_valid, section_problems = outcome
+    valid.update(section_valid)
+    problems.extend(section_problems)
+
+
+def merge_followup(valid, problems, completion):
+    """Add the follow-up's valid fields to valid; returns the fields still missing"""
+    extra, _, _ = parse_analysis(completion.text, section_schema(problems))
+    valid.update(extra)
+    return [key for key in problems if key not in valid]
+
+
+def request_missing(backend, resume_text, job_description, valid, problems, stats=None, priority=INTERACTIVE):
+    """Ask again for only the missing or invalid fields, merging what comes back into valid"""
+    estimated = estimate_request_tokens(resume_text, job_description)
+    args = _request_args(resume_text, job_description, problems, FOLLOWUP_MAX_TOKENS)
+    metrics.record_repair("followup")
+    try:
+        with metrics.span("llm_followup", backend=backend.name, fields=len(problems)):
+            completion = get_scheduler().call(lambda: backend.complete(*args), priority=priority, tokens=estimated)
+    except llm_backends.BackendError as e:
+        logger.warning("Follow-up request for %s failed: %s", ", ".join(problems), e)
+        return problems
+    record_usage(completion, stats, estimated)
+    return merge_followup(valid, problems, completion)
+
+
+async def arequest_missing(backend, resume_text, job_description, valid, problems, stats=None, priority=BATCH):
+    """Async variant of request_missing"""
+    estimated = estimate_request_tokens(resume_text, job_description)
+    args = _request_args(resume_text, job_description, problems, FOLLOWUP_MAX_TOKENS)
+    metrics.record_repair("followup")
+    try:
+        with metrics.span("llm_followup", backend=backend.name, fields=len(problems)):
+            completion = await get_scheduler().acall(
+                lambda: backend.acomplete(*args), priority=priority, tokens=estimated
+            )
+    except llm_backends.BackendError as e:
+        logger.warning("Follow-up request for %s failed: %s", ", ".join(problems), e)
+        return problems
+    record_usage(completion, stats, estimated)
+    return merge_followup(valid, problems, completion)
+
+
+def finish_analysis(valid, problems, errors=(), stats=None):
+    """Return the analysis in schema order, or raise AnalysisError if nothing usable came back"""
+    if not valid:
+        raise AnalysisError(str(errors[0]) if errors else "Error parsing API response. Please try again.")
+    if problems:
+        logger.warning("Analysis is missing fields after repair: %s", ", ".join(problems))
+    if stats is not None:
+        stats["missing_fields"] = list(problems)
+    return {key: valid[key] for key in ANALYSIS_SCHEMA if key in valid}
+
+
+def analyze(resume_text, job_description, cache=None, backend=None, stats=None, priority=INTERACTIVE):
+    """Analyze a resume synchronously, requesting uncached sections concurrently"""
+    if backend is None:
+        backend = get_backend()
+    resume_text, job_description = prepare_inputs(resume_text, job_description, stats)
+    valid, pending = plan_sections(resume_text, job_description, cache, backend)
+    problems = []
+    errors = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            # Each worker runs in a copy of the caller's context so spans keep the trace id
+            futures = {
+                section: executor.submit(contextvars.copy_context().run, request_section, backend,
+                                         resume_text, job_description, section, stats, priority)
+                for section in pending
+            }
+            for section, future in futures.items():
+                try:
+                    outcome = future.result()
+                except llm_backends.BackendError as e:
+                    outcome = e
+                merge_section(valid, problems, errors, section, outcome)
+    if valid and problems:
+        problems = request_missing(backend, resume_text, job_description, valid, problems, stats, priority)
+    result = finish_analysis(valid, problems, errors, stats)
+    store_sections(cache, pending, valid)
+    return result
+
+
+async def analyze_async(resume_text, job_description, cache=None, backend=None, stats=None, priority=BATCH):
+    """Analyze a resume without blocking the event loop, requesting uncached sections concurrently"""
+    if backend is None:
+        backend = get_backend()
+    resume_text, job_description = prepare_inputs(resume_text, job_description, stats)
+    valid, pending = plan_sections(resume_text, job_description, cache, backend)
+    problems = []
+    errors = []
+    outcomes = await asyncio.gather(
+        *(arequest_section(backend, resume_text, job_description, section, stats, priority) for section in pending),
+        return_exceptions=True,
+    )
+    for section, outcome in zip(pending, outcomes):
+        if isinstance(outcome, BaseException) and not isinstance(outcome, llm_backends.BackendError):
+            raise outcome
+        merge_section(valid, problems, errors, section, outcome)
+    if valid and problems:
+        problems = await arequest_missing(backend, resume_text, job_description, valid, problems, stats, priority)
+    result = finish_analysis(valid, problems, errors, stats)
+    store_sections(cache, pending, valid)
+    return result
+
+
+def stream_section(backend, resume_text, job_description, section, out, priority=INTERACTIVE, stats=None):
+    """Stream one section, putting (section, key, value) on out as members complete.
+
+    Retried by the scheduler; the caller drops members it has already seen.
+    Ends with (section, None, error or None).
+    """
+    fields = SECTIONS[section]
+    estimated = estimate_request_tokens(resume_text, job_description)
+    args = _request_args(resume_text, job_description, fields, SECTION_MAX_TOKENS[section])
+
+    def consume():
+        if getattr(out, "abandoned", False):
+            # Everyone left while this section waited for a slot
+            raise llm_backends.DeadlineExceeded("Nobody is waiting for this section any more")
+        parser = IncrementalObjectParser()
+        stream = backend.stream(*args)
+        chunks = iter(stream)
+        try:
+            for text in chunks:
+                if getattr(out, "abandoned", False):
+                    # Every caller waiting for this section has gone; closing the stream stops the request
+                    raise llm_backends.DeadlineExceeded("Nobody is waiting for this section any more")
+                for key, value in parser.feed(text):
+                    out.put((section, key, value))
+        finally:
+            chunks.close()
+        return stream, parser
+
+    try:
+        with metrics.span("llm", backend=backend.name, section=section, streamed=True):
+            stream, parser = get_scheduler().call(consume, priority=priority, tokens=estimated)
+        record_usage(stream.completion, stats, estimated)
+        if not parser.complete:
+            # The incremental parser skips members it cannot decode; the full
+            # text may still yield them once fences or a cut-off tail are handled
+            salvaged, _ = parse_response(stream.completion, fields)
+            for key, value in salvaged.items():
+                out.put((section, key, value))
+    except llm_backends.BackendError as e:
+        out.put((section, None, e))
+        return
+    except Exception as e:
+        logger.exception("Streaming section %s failed", section)
+        out.put((section, None, e))
+        return
+    out.put((section, None, None))
+
+
+def analyze_stream(resume_text, job_description, cache=None, backend=None, stats=None, priority=INTERACTIVE):
+    """Yield (key, value) pairs of the analysis as each top-level field completes.
+
+    Cached sections are yielded immediately. The remaining sections are
+    streamed concurrently and their fields yielded in arrival order, so
+    callers can render each one as soon as it is ready; a section that is
+    already streaming for another caller is joined rather than requested
+    again. Fields that fail validation are skipped and requested again in a
+    follow-up call once every section has finished.
+
+    When the deadline in effect runs out or is cancelled, sections that have
+    not finished are left out and named in stats["deadline"].
+    """
+    if backend is None:
+        backend = get_backend()
+    resume_text, job_description = prepare_inputs(resume_text, job_description, stats)
+    valid, pending = plan_sections(resume_text, job_description, cache, backend)
+    yield from valid.items()
+
+    current = deadline.current()
+    problems = []
+    errors = []
+    unfinished = set()
+    if pending:
+        out = queue.Queue()
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(pending))
+        try:
+            with metrics.span("llm_stream", backend=backend.name, sections=len(pending)) as span:
+                for section, cache_key in pending.items():
+                    task = _section_streams.stream(
+                        cache_key, out,
+                        functools.partial(stream_section, backend, resume_text, job_description, section,
+                                          priority=priority, stats=stats),
+                    )
+                    if task is not None:
+                        executor.submit(contextvars.copy_context().run, task)
+                remaining = set(pending)
+                while remaining:
+                    try:
+                        section, key, value = out.get(timeout=None if current is None else deadline.POLL_SECONDS)
+                    except queue.Empty:
+                        if current.done():
+                            unfinished |= remaining
+                            break
+                        continue
+                    if key is None:
+                        remaining.discard(section)
+                        if value is not None:
+                            errors.append(value)
+                            if current is not None and (isinstance(value, llm_backends.DeadlineExceeded)
+                                                        or current.done()):
+                                # Timed out, or was not retried for lack of time
+                                unfinished.add(section)
+                        continue
+                    value = normalize_field(key, value) if key in SECTIONS[section] else None
+                    if value is None or key in valid:
+                        continue
+                    valid[key] = value
+                    if "first_section_ms" not in span:
+                        span["first_section_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                        metrics.observe_first_section(time.perf_counter() - started)
+                    yield key, value
+        finally:
+            # Streams this caller led or joined stop once nobody else is waiting for them
+            for cache_key in pending.values():
+                _section_streams.leave(cache_key, out)
+            executor.shutdown(wait=False)
+        problems = [key for section in pending for key in SECTIONS[section] if key not in valid]
+        unexpected = [e for e in errors if not isinstance(e, llm_backends.BackendError)]
+        if unexpected:
+            raise unexpected[0]
+
+    if unfinished:
+        reason = "cancelled" if current.cancelled else "expired"
+        logger.warning("Analysis deadline %s during %s; leaving out %s", reason, current.stage,
+                       ", ".join(sorted(unfinished)))
+        metrics.record_deadline(current.stage, reason)
+        if stats is not None:
+            stats["deadline"] = dict(current.describe(), unfinished=sorted(unfinished))
+        # Reported when no section finished at all
+        errors.insert(0, llm_backends.DeadlineExceeded(
+            "The analysis was cancelled before it finished." if current.cancelled else
+            f"The analysis did not finish within {current.seconds:g} seconds. Please try again."))
+    # Sections cut off by the deadline are not worth a follow-up request
+    left_out = [key for section in unfinished for key in SECTIONS[section]]
+    repairable = [key for key in problems if key not in left_out]
+    if valid and repairable and not (current is not None and current.cancelled):
+        deadline.stage("parse")
+        before = set(valid)
+        repairable = request_missing(backend, resume_text, job_description, valid, repairable, stats, priority)
+        for key in ANALYSIS_SCHEMA:
+            if key in valid and key not in before:
+                yield key, valid[key]
+    finish_analysis(valid, repairable + left_out, errors, stats)
+    store_sections(cache, pending, valid)
+
+
+def diff_resume_sections(previous_text, resume_text):
+    """Compare two versions of a resume section by section.
+
+    Sections are matched on their heading (and position among sections with
+    the same heading). Returns (changes, changed share), where changes is a
+    list of (heading, previous body or None, new body or None) and the share
+    is the fraction of the resume's characters in changed sections.
+    """
+    def keyed(text):
+        sections, seen = {}, {}
+        for heading, body in split_sections(text):
+            name = normalize_text(heading).lower().rstrip(':')
+            seen[name] = seen.get(name, 0) + 1
+            sections[(name, seen[name])] = (heading, body)
+        return sections
+
+    before, after = keyed(previous_text), keyed(resume_text)
+    changes = []
+    changed_chars = 0
+    for key in list(after) + [key for key in before if key not in after]:
+        heading, new_body = after.get(key, (None, None))
+        old_heading, old_body = before.get(key, (None, None))
+        if new_body is not None and old_body is not None and normalize_text(new_body) == normalize_text(old_body):
+            continue
+        changes.append((heading if heading is not None else old_heading, old_body, new_body))
+        changed_chars += max(len(old_body or ""), len(new_body or ""))
+    total = max(len(previous_text), len(resume_text)) or 1
+    return changes, min(1.0, changed_chars / total)
+
+
+def build_revision_prompt(changes, previous_analysis):
+    """Build the user turn for an incremental update: the previous analysis and the changed sections"""
+    parts = []
+    for heading, old_body, new_body in changes:
+        title = heading or "(top of the resume)"
+        if old_body is None:
+            parts.append(f"Added section {title}:\n{new_body}")
+        elif new_body is None:
+            parts.append(f"Removed section {title}:\n{old_body}")
+        else:
+            parts.append(f"Section {title} before:\n{old_body}\n\nSection {title} now:\n{new_body}")
+    return (
+        f"Previous analysis of an earlier version of this resume:\n{json.dumps(previous_analysis)}\n\n"
+        "The candidate has revised the resume. Only these sections changed; everything else is as before.\n\n"
+        + "\n\n".join(parts)
+        + "\n\nUpdate the analysis for these changes. Respond with a JSON object containing only the keys "
+        "whose values change, structured as described above, and always include match_score and "
+        "ats_compatibility."
+    )
+
+
+def plan_revision(previous_text, previous_analysis, resume_text):
+    """Return the changed sections if a revision can be analyzed incrementally, otherwise None"""
+    if not previous_text or not previous_analysis:
+        return None
+    if validate_analysis(previous_analysis)[1]:
+        # A partial previous analysis has nothing to merge the missing fields into
+        return None
+    changes, share = diff_resume_sections(compact_resume(previous_text)[0], resume_text)
+    if share > REVISION_MAX_CHANGED_SHARE:
+        return None
+    return changes
+
+
+def request_revision(backend, job_description, changes, previous_analysis, stats=None, priority=INTERACTIVE):
+    """Ask for the fields that change with a revision; returns the valid ones"""
+    prompt = build_revision_prompt(changes, previous_analysis)
+    estimated = estimate_tokens(ANALYSIS_INSTRUCTIONS) + estimate_tokens(job_description) + estimate_tokens(prompt)
+    args = build_system_prompt(job_description), prompt, REVISION_MAX_TOKENS, TEMPERATURE
+    with metrics.span("llm_revision", backend=backend.name, sections=len(changes)):
+        completion = get_scheduler().call(lambda: backend.complete(*args), priority=priority, tokens=estimated)
+    record_usage(completion, stats, estimated)
+    # Fields left out are unchanged, so only the ones present are validated
+    with metrics.span("parse") as span:
+        valid, _, repaired = parse_analysis(completion.text)
+        span.update(repaired=repaired, updated=len(valid))
+    return valid
+
+
+def reanalyze_stream(previous_text, previous_analysis, resume_text, job_description, cache=None, backend=None,
+                     stats=None, priority=INTERACTIVE):
+    """Yield (key, value) pairs for a revised resume, reusing the analysis of its previous version.
+
+    Falls back to analyze_stream when there is no usable previous analysis,
+    when too much of the resume changed, when the new version is fully
+    cached, or when the update request fails.
+    """
+    if backend is None:
+        backend = get_backend()
+    changes = plan_revision(previous_text, previous_analysis, compact_resume(resume_text)[0])
+    if changes is not None:
+        prepared_resume, prepared_job = prepare_inputs(resume_text, job_description, stats)
+        pending = plan_sections(prepared_resume, prepared_job, cache, backend)[1]
+        if not pending:
+            # Reverting to an earlier version: the full analysis is already cached
+            changes = None
+    if changes is None:
+        metrics.record_revision("full")
+        yield from analyze_stream(resume_text, job_description, cache, backend, stats, priority)
+        return
+
+    if stats is not None:
+        stats["revision"] = {"changed_sections": [heading or "(top)" for heading, _, _ in changes]}
+    updated = {}
+    if changes:
+        try:
+            updated = request_revision(backend, prepared_job, changes, previous_analysis, stats, priority)
+        except llm_backends.BackendError as e:
+            logger.warning("Incremental re-analysis failed, analyzing the whole resume: %s", e)
+            metrics.record_revision("full")
+            yield from analyze_stream(resume_text, job_description, cache, backend, stats, priority)
+            return
+    metrics.record_revision("incremental")
+    result = dict(previous_analysis, **updated)
+    if stats is not None:
+        stats["revision"]["updated_fields"] = list(updated)
+        stats["missing_fields"] = []
+    for key in ANALYSIS_SCHEMA:
+        yield key, result[key]
+    # A section is only as fresh as its fields: cache the ones the revision returned in full under the
+    # revised text's keys, and leave those carried over from the previous version to a full analysis
+    revised = {section: key for section, key in pending.items() if all(field in updated for field in SECTIONS[section])}
+    store_sections(cache, revised, result)
@@ -1,13 +1,13 @@
 # Import statements
 import streamlit as st
-import PyPDF2
-import io
-import anthropic
 from dotenv import load_dotenv
 import os
-import pandas as pd
-import plotly.graph_objects as go
 import json
+import logging
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 
 # Configure page - MUST be the first Streamlit command
 st.set_page_config(
@@ -17,31 +17,66 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load environment variables with robust error handling
-print("Current working directory:", os.getcwd())
+logger = logging.getLogger("app")
+
+@st.cache_resource
+def load_config():
+    """Load .env and configure logging and metrics once per process, not on every rerun"""
+    # Load environment variables with robust error handling
+    try:
+        load_dotenv(encoding='utf-8')
+        error = None
+    except Exception as e:
+        error = e
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if error is not None:
+        logger.warning("Error loading .env: %s", error)
+    logger.info("Working directory: %s; LLM backend: %s", os.getcwd(), os.getenv('LLM_BACKEND', 'anthropic'))
+
+    import metrics
+    metrics.start_exporters_from_env()
+
+# Project modules read their settings from the environment when imported, so
+# .env is loaded first. The heavy SDKs (anthropic, pandas, plotly, PyPDF2)
+# are imported on first use inside these modules to keep startup fast.
+load_config()
+
+from cache import cache_from_env
+from charts import create_keyword_bar, create_radar_chart, create_score_histogram, create_skill_heatmap
+import analyzer
+import job_queue
+import llm_backends
+import llm_client
+import llm_scheduler
+import metrics
+import pdf_extract
+import service_client
+
 try:
-    # Try to load from .env file
-    load_dotenv(encoding='utf-8')
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    
-    # If not found in .env, check if it's set directly in environment
-    if not api_key:
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-    
-    print("API Key found:", "Yes" if api_key else "No")
-    print("API Key value:", api_key[:10] + "..." if api_key else "None")
-
-except Exception as e:
-    print("Error loading .env:", str(e))
-    # Fallback to direct environment variable
-    api_key = os.environ.get('ANTHROPIC_API_KEY')
-
-if not api_key:
-    st.error("Anthropic API key not found. Please check your .env file or environment variables.")
-    st.info("Make sure your .env file exists and contains: ANTHROPIC_API_KEY=your_key_here")
+    # With a remote analysis service the keys live on the service instead
+    if not service_client.SERVICE_URL:
+        analyzer.get_backend()
+except analyzer.AnalysisError as e:
+    st.error(str(e))
+    st.info("Make sure your .env file exists and contains the key for your LLM_BACKEND, "
+            "e.g. ANTHROPIC_API_KEY=your_key_here")
+
+@st.cache_resource
+def get_analysis_cache():
+    """Create the analysis cache once per process and share it across sessions"""
+    return cache_from_env()
+
+@st.cache_resource
+def start_job_workers():
+    """Start this process's job queue workers once; they outlive sessions and reruns"""
+    import results_store
+    return job_queue.start_workers(job_queue.get_queue(), job_queue.APP_WORKERS, cache=get_analysis_cache(),
+                                   store=results_store.get_store())
+
+start_job_workers()
 
 # Custom CSS for better UI
-st.markdown("""
+PAGE_STYLE = """
     <style>
     [data-testid="stAppViewContainer"] {
         background: linear-gradient(135deg, #f5f7fa 0%, #e4e8eb 100%);
@@ -243,297 +278,483 @@ st.markdown("""
         height: 25px;
         border-radius: 12px;
     }
-    </style>
-""", unsafe_allow_html=True)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        st.error(f"Error extracting text from PDF: {str(e)}")
-        return None
+    .score-bar {
+        background-color: #e0e0e0;
+        height: 25px;
+        border-radius: 12px;
+        overflow: hidden;
+    }
+
+    .score-bar > div {
+        background: linear-gradient(45deg, #FF6B6B, #FF8E8E);
+        height: 100%;
+    }
+    </style>
+"""
+
+@st.cache_resource
+def apply_page_style():
+    """Render the custom CSS once per process; Streamlit replays the cached element on later reruns"""
+    st.markdown(PAGE_STYLE, unsafe_allow_html=True)
+
+apply_page_style()
+
+def create_results_layout():
+    """Lay out the results view and return an empty placeholder for each section"""
+    st.markdown("<div class='results-container'>", unsafe_allow_html=True)
+    st.markdown("<h2 style='text-align: center;'>📊 Analysis Results</h2>", unsafe_allow_html=True)
+    slots = {}
+
+    # Create three columns for the main scores
+    score_col1, score_col2, score_col3 = st.columns(3)
+    slots['match_score'] = score_col1.empty()
+    slots['ats_compatibility'] = score_col2.empty()
+    slots['format_score'] = score_col3.empty()
+
+    # Results in columns
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("<h3 style='color: #28A745;'>✅ Strengths</h3>", unsafe_allow_html=True)
+        slots['strengths'] = st.empty()
+        st.markdown("<h3 style='color: #DC3545; margin-top: 20px;'>❌ Areas for Improvement</h3>", unsafe_allow_html=True)
+        slots['weaknesses'] = st.empty()
+
+    with col2:
+        st.markdown("<h3 style='color: #17A2B8;'>💡 Suggestions</h3>", unsafe_allow_html=True)
+        slots['suggestions'] = st.empty()
+        st.markdown("<h3 style='color: #FD7E14; margin-top: 20px;'>🎯 Missing Keywords</h3>", unsafe_allow_html=True)
+        slots['missing_keywords'] = st.empty()
+
+    # Action Verbs Analysis
+    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📝 Action Verbs Analysis</h3>", unsafe_allow_html=True)
+    verb_col1, verb_col2 = st.columns(2)
+
+    with verb_col1:
+        st.markdown("<h4 style='color: #28A745;'>Used in Your Resume</h4>", unsafe_allow_html=True)
+        slots['action_verbs_used'] = st.empty()
+
+    with verb_col2:
+        st.markdown("<h4 style='color: #17A2B8;'>Recommended Additions</h4>", unsafe_allow_html=True)
+        slots['action_verbs_recommended'] = st.empty()
+
+    # Education and Experience Alignment
+    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>🎓 Education & Experience Alignment</h3>", unsafe_allow_html=True)
+    edu_col1, edu_col2 = st.columns(2)
+    slots['education_alignment'] = edu_col1.empty()
+    slots['experience_alignment'] = edu_col2.empty()
+
+    # Format Analysis
+    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📋 Format Analysis</h3>", unsafe_allow_html=True)
+    format_col1, format_col2 = st.columns(2)
+
+    with format_col1:
+        st.markdown("<h4 style='color: #28A745;'>Positive Aspects</h4>", unsafe_allow_html=True)
+        slots['format_positives'] = st.empty()
+
+    with format_col2:
+        st.markdown("<h4 style='color: #DC3545;'>Areas to Improve</h4>", unsafe_allow_html=True)
+        slots['format_issues'] = st.empty()
+
+    # Radar chart for skills
+    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📊 Skills Match Analysis</h3>", unsafe_allow_html=True)
+    slots['skill_matches'] = st.empty()
+
+    st.markdown("</div>", unsafe_allow_html=True)
+    return slots
+
+# Each section is rendered as a single HTML block so it costs one element
+# update instead of one per item
+
+def render_score(slot, title, score):
+    """Render a headline percentage score with a progress bar"""
+    slot.markdown("""
+        <div style='text-align: center;'>
+            <h3>{0}</h3>
+            <div class='match-score'>{1}%</div>
+            <div class='score-bar'><div style='width: {1}%;'></div></div>
+        </div>
+    """.format(title, score), unsafe_allow_html=True)
+
+def render_items(slot, items):
+    """Render a bulleted list of analysis items"""
+    slot.markdown("".join(f"<div class='section-content'>• {item}</div>" for item in items),
+                  unsafe_allow_html=True)
+
+def render_alignment(slot, title, alignment):
+    """Render an education or experience alignment score with feedback"""
+    slot.markdown("""
+        <div style='text-align: center;'>
+            <h4>{0}</h4>
+            <div class='match-score' style='font-size: 2.5rem !important;'>{1}%</div>
+            <p>{2}</p>
+        </div>
+    """.format(title, alignment['score'], alignment['feedback']), unsafe_allow_html=True)
+
+def render_skill_chart(slot, skill_matches, key="skill_chart"):
+    """Render the skills radar chart"""
+    # The key keeps the local estimate and the AI chart apart when their data is identical
+    slot.plotly_chart(create_radar_chart(skill_matches), use_container_width=True, key=key)
+
+def render_local_scores(slots, local, analysis=None):
+    """Fill the score, keyword and skills placeholders with local estimates
+
+    Sections already present in analysis are skipped so they are not drawn twice.
+    """
+    analysis = analysis or {}
+    if 'match_score' not in analysis:
+        render_score(slots['match_score'], "Overall Match (estimate)", local['match_score'])
+    if 'ats_compatibility' not in analysis:
+        render_score(slots['ats_compatibility'], "Keyword Coverage", local['keyword_coverage'])
+    if 'missing_keywords' not in analysis:
+        render_items(slots['missing_keywords'], local['missing_keywords'])
+    if local['skill_matches'] and 'skill_matches' not in analysis:
+        render_skill_chart(slots['skill_matches'], local['skill_matches'], key="skill_chart_local")
+
+def render_section(slots, key, value):
+    """Render one completed analysis section into its placeholder"""
+    if key == 'match_score':
+        render_score(slots['match_score'], "Overall Match", value)
+    elif key == 'ats_compatibility':
+        render_score(slots['ats_compatibility'], "ATS Compatibility", value)
+    elif key == 'format_score':
+        render_score(slots['format_score'], "Format Score", value['score'])
+        render_items(slots['format_positives'], value['positives'])
+        render_items(slots['format_issues'], value['issues'])
+    elif key in ('strengths', 'weaknesses', 'suggestions', 'missing_keywords'):
+        render_items(slots[key], value)
+    elif key == 'action_verbs':
+        render_items(slots['action_verbs_used'], value['used'])
+        render_items(slots['action_verbs_recommended'], value['recommended'])
+    elif key == 'education_alignment':
+        render_alignment(slots[key], "Education Match", value)
+    elif key == 'experience_alignment':
+        render_alignment(slots[key], "Experience Match", value)
+    elif key == 'skill_matches':
+        render_skill_chart(slots[key], value)
+
+def render_analysis_notes(analysis, stats):
+    """Show warnings and prompt/token statistics below the results"""
+    if analysis is None:
+        st.warning("⚠️ AI analysis is unavailable. The scores shown are local keyword-match estimates.")
+    elif stats.get('missing_fields'):
+        st.info(
+            "ℹ️ Some sections could not be read from the AI response and show local estimates "
+            "or are left out: " + ", ".join(stats['missing_fields'])
+        )
+    if 'deadline' in stats:
+        cut = stats['deadline']
+        reason = "was stopped" if cut['cancelled'] else f"hit its {cut['seconds']:g}s time limit"
+        st.info(
+            f"⏱️ The analysis {reason} before these sections finished: {', '.join(cut['unfinished'])}. "
+            "Analyze again to complete them; the sections shown are not requested again."
+        )
+    if 'revision' in stats:
+        revision = stats['revision']
+        st.caption(
+            f"♻️ Revised resume: re-analyzed {len(revision['changed_sections'])} changed section(s) "
+            f"({', '.join(revision['changed_sections']) or 'none'}) and updated "
+            f"{len(revision.get('updated_fields', []))} field(s) of the previous analysis"
+        )
+    if 'compaction' in stats:
+        report = stats['compaction']
+        st.caption(
+            f"🧮 Prompt input: ~{report['tokens_before']:,} → ~{report['tokens_after']:,} tokens "
+            f"(resume {report['resume_tokens_before']:,} → {report['resume_tokens_after']:,}, "
+            f"job description {report['job_tokens_before']:,} → {report['job_tokens_after']:,})"
+        )
+    if 'usage' in stats:
+        usage = stats['usage']
+        st.caption(
+            f"🧾 Billed input: {usage['input_tokens']:,} tokens · "
+            f"read from prompt cache: {usage['cache_read_input_tokens']:,} · "
+            f"written to prompt cache: {usage['cache_creation_input_tokens']:,}"
+        )
+    if analysis:
+        st.download_button("⬇️ Download analysis (JSON)", json.dumps(analysis, indent=2),
+                           file_name="resume_analysis.json", mime="application/json", on_click="ignore")
+
+def draw_results(results):
+    """Draw local scores overlaid with whichever analysis sections are available"""
+    slots = create_results_layout()
+    analysis = results['analysis'] or {}
+    render_local_scores(slots, results['local'], analysis)
+    for key, value in analysis.items():
+        render_section(slots, key, value)
+
+@st.fragment
+def render_saved_results(results):
+    """Redraw the last analysis from session state; reruns inside it skip the rest of the page"""
+    with metrics.span("render", section="saved_results"):
+        draw_results(results)
+        render_analysis_notes(results['analysis'], results['stats'])
+
+def session_id():
+    """Identify this browser session to the job queue, which cancels jobs no session is watching"""
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+@st.fragment(run_every=job_queue.POLL_INTERVAL)
+def render_job_progress(job_id):
+    """Poll a queued or running job, drawing sections as the worker reports them"""
+    job_queue.get_queue().watch(job_id, session_id())
+    job = job_queue.get_queue().get(job_id)
+    if job is None or job['status'] not in job_queue.ACTIVE:
+        # Let the whole page pick up the finished job
+        st.rerun()
+    if job['status'] == job_queue.QUEUED and job['attempts']:
+        st.info(f"🔁 Retrying the analysis (attempt {job['attempts'] + 1} of {job_queue.MAX_ATTEMPTS})...")
+    elif job['status'] == job_queue.QUEUED:
+        st.info(f"⏳ Waiting to start... {job['position']} analyses ahead of yours.")
+    else:
+        st.info("🔄 Analyzing your resume... This may take a moment.")
+    if job_queue.ABANDON_SECONDS:
+        st.caption("Keep this tab open: leaving the page stops the analysis. "
+                   "Open this page's link again to see what finished.")
+    else:
+        st.caption("You can close this tab; open this page's link again to see the result.")
+    partial = job['result']
+    if partial and partial['local'] is not None:
+        with metrics.span("render", section="job_progress"):
+            draw_results(partial)
+
+def render_batch_results(rows, table=None):
+    """Show the ranking table, in the table placeholder if given, and its CSV download"""
+    import batch
+    ranking = batch.rank_rows(rows)
+    (st if table is None else table).dataframe(ranking, use_container_width=True)
+    st.download_button("⬇️ Download ranking (CSV)", ranking.to_csv(),
+                       file_name="resume_ranking.csv", mime="text/csv", on_click="ignore")
+
+def render_batch_mode():
+    """Rank many resumes against one job description, updating the table as results arrive"""
+    # Batch screening (and NumPy, via dedup) is only loaded once this mode is opened
+    import batch
+    import dedup
+    import results_store
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("<h3>📁 Upload Resumes</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #666;'>Upload several PDFs or a zip archive of PDFs</p>", unsafe_allow_html=True)
+        uploads = st.file_uploader("", type=["pdf", "zip"], accept_multiple_files=True, label_visibility="collapsed")
+
+    with col2:
+        st.markdown("<h3>📝 Job Description</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #666;'>Paste the job description to rank candidates against</p>", unsafe_allow_html=True)
+        job_description = st.text_area("", height=200, placeholder="Paste the complete job description here...", label_visibility="collapsed")
+
+    concurrency = st.sidebar.slider("Parallel analyses", 1, 32, batch.DEFAULT_CONCURRENCY)
+
+    if not st.button("🏆 Rank Resumes"):
+        # Keep the last ranking on screen across reruns
+        if 'batch_rows' in st.session_state:
+            st.caption(f"✅ {len(st.session_state['batch_rows'])} resumes analyzed · "
+                       + batch.dedup_summary(st.session_state['batch_stats']))
+            render_batch_results(st.session_state['batch_rows'])
+        return
+    if not uploads:
+        st.error("⚠️ Please upload at least one resume!")
+        return
+    if not job_description:
+        st.error("⚠️ Please provide a job description!")
+        return
+
+    progress = st.empty()
+    table = st.empty()
+    rows = []
+    stats = {}
+
+    async def stream_rows():
+        # Near-duplicate resumes share one analysis
+        async for row in batch.run_batch(batch.iter_upload_sources(uploads), job_description,
+                                         concurrency=concurrency, cache=get_analysis_cache(),
+                                         deduplicator=dedup.Deduplicator(history=dedup.get_history()),
+                                         stats=stats, store=results_store.get_store()):
+            rows.append(row)
+            progress.caption(f"🔄 {len(rows)} resumes analyzed...")
+            table.dataframe(batch.rank_rows(rows), use_container_width=True)
 
-def analyze_resume(resume_text, job_description):
-    """Analyze resume against job description using Anthropic API"""
     try:
-        api_key = os.getenv('ANTHROPIC_API_KEY')
-        if not api_key:
-            st.error("Anthropic API key not found. Please check your .env file.")
-            return None
-            
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        prompt = f"""Analyze the following resume against the job description. 
-        Provide a comprehensive analysis including:
-        1. Key strengths and matches
-        2. Missing skills or qualifications
-        3. Specific suggestions for improvement
-        4. Overall match score (percentage)
-        5. ATS (Applicant Tracking System) compatibility score (percentage)
-        6. Detailed skills breakdown with proficiency levels
-        7. Missing important keywords from the job description
-        8. Action verbs analysis
-        9. Education and experience alignment
-        10. Format and presentation score
-
-        Resume:
-        {resume_text}
-
-        Job Description:
-        {job_description}
-
-        Format the response as a JSON with the following structure:
-        {{
-            "strengths": ["strength1", "strength2", ...],
-            "weaknesses": ["weakness1", "weakness2", ...],
-            "suggestions": ["suggestion1", "suggestion2", ...],
-            "match_score": percentage,
-            "ats_compatibility": percentage,
-            "skill_matches": {{"skill1": percentage, "skill2": percentage, ...}},
-            "missing_keywords": ["keyword1", "keyword2", ...],
-            "action_verbs": {{
-                "used": ["verb1", "verb2", ...],
-                "recommended": ["verb1", "verb2", ...]
-            }},
-            "education_alignment": {{
-                "score": percentage,
-                "feedback": "detailed feedback"
-            }},
-            "experience_alignment": {{
-                "score": percentage,
-                "feedback": "detailed feedback"
-            }},
-            "format_score": {{
-                "score": percentage,
-                "issues": ["issue1", "issue2", ...],
-                "positives": ["positive1", "positive2", ...]
-            }}
-        }}
-        
-        Ensure the analysis is thorough and actionable. For missing keywords, focus on technical skills, qualifications, and industry-specific terms that appear in the job description but are absent in the resume.
-        """
-
-        try:
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            try:
-                result = json.loads(response.content[0].text)
-                return result
-            except json.JSONDecodeError:
-                st.error("Error parsing API response. Please try again.")
-                return None
-                
-        except anthropic.APIError as api_error:
-            st.error(f"API Error: {str(api_error)}")
-            return None
-            
-    except Exception as e:
-        st.error(f"Error during analysis: {str(e)}")
-        return None
-
-def create_radar_chart(skill_matches):
-    """Create a radar chart for skill matches"""
-    categories = list(skill_matches.keys())
-    values = list(skill_matches.values())
-    
-    fig = go.Figure(data=go.Scatterpolar(
-        r=values,
-        theta=categories,
-        fill='toself',
-        line_color='#FF4B4B'
-    ))
-    
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, 100]
-            )
-        ),
-        showlegend=False,
-        title="Skills Match Analysis"
-    )
-    return fig
+        with metrics.trace(), metrics.span("batch", resumes=len(uploads)):
+            asyncio.run(stream_rows())
+    except analyzer.AnalysisError as e:
+        st.error(str(e))
+        return
+    finally:
+        metrics.flush()
+
+    st.session_state['batch_rows'] = rows
+    st.session_state['batch_stats'] = stats
+    progress.caption(f"✅ {len(rows)} resumes analyzed · {batch.dedup_summary(stats)}")
+    render_batch_results(rows, table)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def dashboard_queries(version, day, days, requisitions=None):
+    """Aggregates over the results store; version and day are only cache keys that change with the data"""
+    import results_store
+    started = time.perf_counter()
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    df = results_store.get_store().load(requisitions=requisitions, since=since)
+    queries = {
+        "analyses": len(df),
+        "mean_match": float(df["match_score"].mean()) if len(df) else None,
+        "summary": results_store.requisition_summary(df),
+        "histogram": results_store.score_histogram(df),
+        "missing_keywords": results_store.top_missing_keywords(df),
+        "skill_coverage": results_store.skill_coverage(df),
+    }
+    queries["query_ms"] = (time.perf_counter() - started) * 1000
+    return queries
+
+def render_dashboard():
+    """Aggregate views across every stored analysis"""
+    import results_store
+    store = results_store.get_store()
+    if store is None:
+        st.info("ℹ️ The results store is disabled. Set RESULTS_STORE_PATH to collect analyses for the dashboard.")
+        return
+    periods = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "All time": None}
+    days = periods[st.sidebar.selectbox("Period", list(periods), index=1)]
+    version, day = store.version(), datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    with metrics.span("render", section="dashboard"):
+        overview = dashboard_queries(version, day, days)
+        if not overview["analyses"]:
+            st.info("ℹ️ No analyses have been recorded for this period yet.")
+            return
+        titles = overview["summary"]["title"].to_dict()
+        selected = st.multiselect("Requisitions", list(titles), format_func=lambda r: titles[r] or r,
+                                  placeholder="All requisitions")
+        queries = dashboard_queries(version, day, days, tuple(selected)) if selected else overview
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Analyses", f"{queries['analyses']:,}")
+        col2.metric("Requisitions", len(queries["summary"]))
+        col3.metric("Mean match", f"{queries['mean_match']:.0f}%" if queries['mean_match'] is not None else "–")
+        st.dataframe(queries["summary"], use_container_width=True)
+        st.plotly_chart(create_score_histogram(queries["histogram"], titles), use_container_width=True,
+                        key="score_histogram")
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(queries["missing_keywords"]):
+                st.plotly_chart(create_keyword_bar(queries["missing_keywords"]), use_container_width=True,
+                                key="missing_keywords")
+        with col2:
+            if len(queries["skill_coverage"]):
+                st.plotly_chart(create_skill_heatmap(queries["skill_coverage"], titles), use_container_width=True,
+                                key="skill_coverage")
+        st.caption(f"📊 Queried {queries['analyses']:,} analyses in {queries['query_ms']:.0f} ms")
 
 # Main UI
+mode = st.sidebar.radio("Mode", ["Single resume", "Batch screening", "Dashboard"])
+
 st.markdown("<h1>📄 Resume Analyzer</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align: center; font-size: 1.5rem !important; color: #666; margin-bottom: 3rem;'>Optimize your resume for your dream job</p>", unsafe_allow_html=True)
 
-# Create two columns for inputs
-col1, col2 = st.columns(2)
-
-with col1:
-    st.markdown("<h3>📎 Upload Resume</h3>", unsafe_allow_html=True)
-    st.markdown("<p style='color: #666;'>Upload your resume in PDF format</p>", unsafe_allow_html=True)
-    uploaded_file = st.file_uploader("", type="pdf", label_visibility="collapsed")
-    if uploaded_file:
-        st.markdown("<div class='success-message'>✅ Resume uploaded successfully!</div>", unsafe_allow_html=True)
-
-with col2:
-    st.markdown("<h3>📝 Job Description</h3>", unsafe_allow_html=True)
-    st.markdown("<p style='color: #666;'>Paste the job description you want to analyze against</p>", unsafe_allow_html=True)
-    job_description = st.text_area("", height=200, placeholder="Paste the complete job description here...", label_visibility="collapsed")
-
-# Center the button using custom HTML/CSS
-st.markdown("<div class='center-button'>", unsafe_allow_html=True)
-if st.button("🔍 Analyze Resume"):
-    if uploaded_file is None:
-        st.error("⚠️ Please upload a resume first!")
-    elif not job_description:
-        st.error("⚠️ Please provide a job description!")
+if mode == "Batch screening":
+    render_batch_mode()
+elif mode == "Dashboard":
+    render_dashboard()
+else:
+    # Create two columns for inputs
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("<h3>📎 Upload Resume</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #666;'>Upload your resume in PDF format</p>", unsafe_allow_html=True)
+        uploaded_file = st.file_uploader("", type="pdf", label_visibility="collapsed")
+        if uploaded_file:
+            st.markdown("<div class='success-message'>✅ Resume uploaded successfully!</div>", unsafe_allow_html=True)
+
+    with col2:
+        st.markdown("<h3>📝 Job Description</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #666;'>Paste the job description you want to analyze against</p>", unsafe_allow_html=True)
+        job_description = st.text_area("", height=200, placeholder="Paste the complete job description here...", label_visibility="collapsed")
+
+    # Center the button using custom HTML/CSS
+    st.markdown("<div class='center-button'>", unsafe_allow_html=True)
+    if st.button("🔍 Analyze Resume"):
+        if uploaded_file is None:
+            st.error("⚠️ Please upload a resume first!")
+        elif not job_description:
+            st.error("⚠️ Please provide a job description!")
+        else:
+            try:
+                # The job id goes in the URL so the result can be reopened from another session.
+                # The last result shown is the base for an incremental re-analysis of a revision.
+                previous_job = st.query_params.get('job')
+                st.query_params['job'] = job_queue.get_queue().enqueue(
+                    uploaded_file, uploaded_file.name, job_description,
+                    previous_job=st.session_state.get('results_job'))
+                if previous_job and previous_job != st.query_params['job']:
+                    # Stop an analysis this session no longer shows, unless another session is watching it
+                    job_queue.get_queue().release(previous_job, session_id())
+            except pdf_extract.PDFLimitError as e:
+                st.error(f"⚠️ {str(e)}")
+
+    job_id = st.query_params.get('job')
+    if job_id and st.session_state.get('results_job') != job_id:
+        job = job_queue.get_queue().get(job_id)
+        if job is None:
+            st.warning("⚠️ That analysis is no longer available. Please run it again.")
+            del st.query_params['job']
+        elif job['status'] in job_queue.ACTIVE:
+            render_job_progress(job_id)
+        else:
+            # Keep the finished job so later interactions redraw it without reading the queue
+            st.session_state['results_job'] = job_id
+            st.session_state['results'] = dict(job['result'] or {'local': None}, error=job['error'])
+    if job_id and st.session_state.get('results_job') == job_id:
+        results = st.session_state['results']
+        if results['error']:
+            st.error(results['error'])
+        if results['local'] is not None:
+            render_saved_results(results)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# Cache counters are rendered after the analysis so they include this run
+with st.sidebar:
+    st.markdown("### ⚡ Analysis Cache")
+    cache_stats = get_analysis_cache().stats()
+    st.caption(
+        f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+        f"Hit ratio: {cache_stats['hit_ratio']:.0%} · Stored: {cache_stats['disk_items']}"
+    )
+    st.markdown("### 🔌 API Connections")
+    pool_stats = llm_client.get_manager().stats()
+    st.caption(
+        f"Requests: {pool_stats['requests']} · In flight: {pool_stats['in_flight']} · "
+        f"Peak pool use: {pool_stats['peak_utilization']:.0%} of {pool_stats['max_connections']}"
+    )
+    st.caption(
+        f"Tokens in: {pool_stats['input_tokens']:,} · out: {pool_stats['output_tokens']:,} · "
+        f"prompt cache read: {pool_stats['cache_read_input_tokens']:,} · "
+        f"written: {pool_stats['cache_creation_input_tokens']:,}"
+    )
+    scheduler_stats = llm_scheduler.get_scheduler().stats()
+    st.caption(
+        f"Queued: {scheduler_stats['queued']} · Concurrency limit: {scheduler_stats['concurrency_limit']} · "
+        f"Throttled: {scheduler_stats['throttled']} · Retries: {scheduler_stats['retries']}"
+    )
+    coalescing = analyzer.coalescing_stats()
+    st.caption(f"Identical requests in flight: {coalescing['in_flight']} · "
+               f"Coalesced: {coalescing['coalesced']} of {coalescing['leaders'] + coalescing['coalesced']}")
+    jobs = job_queue.get_queue().counts()
+    st.caption(f"Jobs queued: {jobs['queued']} · running: {jobs['running']} · failed: {jobs['failed']} · "
+               f"cut short: {jobs['partial'] + jobs['cancelled']}")
+    if service_client.SERVICE_URL:
+        st.caption(f"Analysis service: {service_client.SERVICE_URL}")
+    backend = llm_backends.get_backend()
+    if isinstance(backend, llm_backends.HedgedBackend):
+        hedge_stats = backend.stats()
+        st.caption(
+            f"Backend: {backend.primary.name} hedged by {backend.hedge.name} after "
+            f"{hedge_stats['hedge_delay']:.1f}s · Hedged: {hedge_stats['hedged']} · "
+            f"Hedge wins: {hedge_stats['hedge_wins']}"
+        )
     else:
-        with st.spinner("🔄 Analyzing your resume... This may take a moment."):
-            # Extract text from PDF
-            resume_text = extract_text_from_pdf(uploaded_file)
-            if resume_text:
-                # Analyze resume
-                analysis = analyze_resume(resume_text, job_description)
-                
-                if analysis:
-                    st.markdown("<div class='results-container'>", unsafe_allow_html=True)
-                    st.markdown("<h2 style='text-align: center;'>📊 Analysis Results</h2>", unsafe_allow_html=True)
-                    
-                    # Create three columns for the main scores
-                    score_col1, score_col2, score_col3 = st.columns(3)
-                    
-                    with score_col1:
-                        st.markdown("""
-                            <div style='text-align: center;'>
-                                <h3>Overall Match</h3>
-                                <div class='match-score'>{0}%</div>
-                            </div>
-                        """.format(analysis['match_score']), unsafe_allow_html=True)
-                        st.progress(analysis['match_score'] / 100)
-                    
-                    with score_col2:
-                        st.markdown("""
-                            <div style='text-align: center;'>
-                                <h3>ATS Compatibility</h3>
-                                <div class='match-score'>{0}%</div>
-                            </div>
-                        """.format(analysis['ats_compatibility']), unsafe_allow_html=True)
-                        st.progress(analysis['ats_compatibility'] / 100)
-                    
-                    with score_col3:
-                        st.markdown("""
-                            <div style='text-align: center;'>
-                                <h3>Format Score</h3>
-                                <div class='match-score'>{0}%</div>
-                            </div>
-                        """.format(analysis['format_score']['score']), unsafe_allow_html=True)
-                        st.progress(analysis['format_score']['score'] / 100)
-                    
-                    # Results in columns
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.markdown("<h3 style='color: #28A745;'>✅ Strengths</h3>", unsafe_allow_html=True)
-                        for strength in analysis['strengths']:
-                            st.markdown(f"<div class='section-content'>• {strength}</div>", unsafe_allow_html=True)
-                    
-                        st.markdown("<h3 style='color: #DC3545; margin-top: 20px;'>❌ Areas for Improvement</h3>", unsafe_allow_html=True)
-                        for weakness in analysis['weaknesses']:
-                            st.markdown(f"<div class='section-content'>• {weakness}</div>", unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown("<h3 style='color: #17A2B8;'>💡 Suggestions</h3>", unsafe_allow_html=True)
-                        for suggestion in analysis['suggestions']:
-                            st.markdown(f"<div class='section-content'>• {suggestion}</div>", unsafe_allow_html=True)
-                    
-                        st.markdown("<h3 style='color: #FD7E14; margin-top: 20px;'>🎯 Missing Keywords</h3>", unsafe_allow_html=True)
-                        for keyword in analysis['missing_keywords']:
-                            st.markdown(f"<div class='section-content'>• {keyword}</div>", unsafe_allow_html=True)
-                    
-                    # Action Verbs Analysis
-                    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📝 Action Verbs Analysis</h3>", unsafe_allow_html=True)
-                    verb_col1, verb_col2 = st.columns(2)
-                    
-                    with verb_col1:
-                        st.markdown("<h4 style='color: #28A745;'>Used in Your Resume</h4>", unsafe_allow_html=True)
-                        for verb in analysis['action_verbs']['used']:
-                            st.markdown(f"<div class='section-content'>• {verb}</div>", unsafe_allow_html=True)
-                    
-                    with verb_col2:
-                        st.markdown("<h4 style='color: #17A2B8;'>Recommended Additions</h4>", unsafe_allow_html=True)
-                        for verb in analysis['action_verbs']['recommended']:
-                            st.markdown(f"<div class='section-content'>• {verb}</div>", unsafe_allow_html=True)
-                    
-                    # Education and Experience Alignment
-                    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>🎓 Education & Experience Alignment</h3>", unsafe_allow_html=True)
-                    edu_col1, edu_col2 = st.columns(2)
-                    
-                    with edu_col1:
-                        st.markdown("""
-                            <div style='text-align: center;'>
-                                <h4>Education Match</h4>
-                                <div class='match-score' style='font-size: 2.5rem !important;'>{0}%</div>
-                                <p>{1}</p>
-                            </div>
-                        """.format(analysis['education_alignment']['score'], analysis['education_alignment']['feedback']), unsafe_allow_html=True)
-                    
-                    with edu_col2:
-                        st.markdown("""
-                            <div style='text-align: center;'>
-                                <h4>Experience Match</h4>
-                                <div class='match-score' style='font-size: 2.5rem !important;'>{0}%</div>
-                                <p>{1}</p>
-                            </div>
-                        """.format(analysis['experience_alignment']['score'], analysis['experience_alignment']['feedback']), unsafe_allow_html=True)
-                    
-                    # Format Analysis
-                    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📋 Format Analysis</h3>", unsafe_allow_html=True)
-                    format_col1, format_col2 = st.columns(2)
-                    
-                    with format_col1:
-                        st.markdown("<h4 style='color: #28A745;'>Positive Aspects</h4>", unsafe_allow_html=True)
-                        for positive in analysis['format_score']['positives']:
-                            st.markdown(f"<div class='section-content'>• {positive}</div>", unsafe_allow_html=True)
-                    
-                    with format_col2:
-                        st.markdown("<h4 style='color: #DC3545;'>Areas to Improve</h4>", unsafe_allow_html=True)
-                        for issue in analysis['format_score']['issues']:
-                            st.markdown(f"<div class='section-content'>• {issue}</div>", unsafe_allow_html=True)
-                    
-                    # Radar chart for skills
-                    st.markdown("<h3 style='text-align: center; margin: 2rem 0;'>📊 Skills Match Analysis</h3>", unsafe_allow_html=True)
-                    fig = create_radar_chart(analysis['skill_matches'])
-                    fig.update_layout(
-                        height=500,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        polar=dict(
-                            radialaxis=dict(
-                                visible=True,
-                                range=[0, 100],
-                                tickfont=dict(size=12),
-                                gridcolor="#e0e0e0"
-                            ),
-                            angularaxis=dict(
-                                tickfont=dict(size=14),
-                                gridcolor="#e0e0e0"
-                            )
-                        ),
-                        font=dict(
-                            family="Arial, sans-serif",
-                            size=16,
-                            color="#2C3E50"
-                        )
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
-
-st.markdown("</div>", unsafe_allow_html=True)
+        st.caption(f"Backend: {backend.name} ({backend.model})")
 
 # Footer
 st.markdown("""
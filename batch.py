@@ -0,0 +1,324 @@
+"""Batch screening: rank a folder or zip of resumes against one job description.
+
+PDFs are extracted in parallel sandboxes (see pdf_extract.py) and each
+resume is analyzed as soon as its text is ready, with at most `concurrency`
+API calls in flight. Rows are yielded in completion order so callers can
+show a ranked table that fills in while the batch is still running.
+
+With --index, resumes are retrieved from the persistent resume index
+(see resume_index.py) and only the BM25 top-K are sent for analysis; a
+source given alongside --index is added to the index first.
+
+Near-duplicate resumes (see dedup.py) share one analysis unless --no-dedup
+is given; the summary reports how many analyses that saved. Finished
+analyses are recorded in the results store (see results_store.py).
+
+Usage:
+    python batch.py resumes/ --job-description jd.txt
+    python batch.py applicants.zip --job-description jd.txt --output ranked.csv
+    python batch.py --index .cache/resume_index.sqlite3 --top-k 50 --job-description jd.txt
+"""
+import argparse
+import asyncio
+import os
+import sys
+import zipfile
+
+from dotenv import load_dotenv
+
+import analyzer
+import dedup
+import metrics
+import pdf_extract
+import results_store
+from cache import cache_from_env
+from resume_index import ResumeIndex, index_source
+
+DEFAULT_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+RESULT_COLUMNS = ["file", "match_score", "ats_compatibility", "duplicate_of", "error"]
+
+_DONE = object()
+
+
+def iter_resume_sources(source):
+    """Yield (name, file) pairs for every PDF in a directory or zip archive"""
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.lower().endswith('.pdf'):
+                    path = os.path.join(root, filename)
+                    yield os.path.relpath(path, source), path
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                continue
+            if not info.filename.lower().endswith('.pdf'):
+                continue
+            with archive.open(info) as member:
+                yield info.filename, member
+
+
+def iter_upload_sources(uploads):
+    """Yield (name, file) pairs from Streamlit uploads, expanding any zip archives"""
+    for upload in uploads:
+        if upload.name.lower().endswith('.zip'):
+            for name, member in iter_resume_sources(upload):
+                yield f"{upload.name}/{name}", member
+        else:
+            yield upload.name, upload
+
+
+def make_row(name, result=None, error=None, duplicate_of=None):
+    """Flatten one analysis into a result table row"""
+    result = result or {}
+    return {
+        "file": name,
+        "match_score": result.get("match_score"),
+        "ats_compatibility": result.get("ats_compatibility"),
+        "duplicate_of": duplicate_of,
+        "error": error,
+    }
+
+
+def rank_rows(rows):
+    """Return rows as a DataFrame ranked by match score, then ATS compatibility"""
+    # pandas is only needed once results are shown, so it stays off the app's startup path
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    for column in ("match_score", "ats_compatibility"):
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    df = df.sort_values(
+        ["match_score", "ats_compatibility"], ascending=False, na_position="last", kind="stable"
+    ).reset_index(drop=True)
+    df.index = df.index + 1
+    df.index.name = "rank"
+    return df
+
+
+class ClusterAnalyses:
+    """Runs one analysis per near-duplicate cluster and shares its result with every member"""
+
+    def __init__(self, job_description, concurrency=DEFAULT_CONCURRENCY, cache=None, backend=None,
+                 deduplicator=None, store=None):
+        self.job_description = job_description
+        self.cache = cache
+        self.backend = backend or analyzer.get_backend()
+        self.deduplicator = deduplicator
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.resumes = 0
+        # Keyed by the representative's text, which is what gets analyzed
+        self._analyses = {}
+        self.store = store
+        self._records = []
+
+    async def _analyze(self, text):
+        async with self.semaphore:
+            return await analyzer.analyze_async(text, self.job_description, cache=self.cache, backend=self.backend)
+
+    async def row(self, name, text):
+        """Analyze a resume, or wait for its cluster's analysis, and return its row"""
+        self.resumes += 1
+        representative, analyzed_text = name, text
+        if self.deduplicator is not None:
+            representative, analyzed_text = self.deduplicator.assign(name, text)
+        # A resume seen before under the same name is not a duplicate of itself
+        duplicate_of = representative if (representative, analyzed_text) != (name, text) else None
+        if duplicate_of is not None:
+            metrics.record_duplicate()
+        analysis = self._analyses.get(analyzed_text)
+        if analysis is None:
+            analysis = self._analyses[analyzed_text] = asyncio.ensure_future(self._analyze(analyzed_text))
+        try:
+            # Shielded so one member being cancelled does not cancel the shared analysis
+            result = await asyncio.shield(analysis)
+        except Exception as e:
+            return make_row(name, error=str(e), duplicate_of=duplicate_of)
+        if self.store is not None:
+            self._records.append(results_store.flatten(result, self.job_description, "batch", name,
+                                                       duplicate_of=duplicate_of))
+        return make_row(name, result, duplicate_of=duplicate_of)
+
+    def stats(self):
+        """Resumes analyzed, analyses run and analyses saved by deduplication"""
+        stats = self.deduplicator.stats() if self.deduplicator is not None else {}
+        stats.update(resumes=self.resumes, analyses=len(self._analyses),
+                     analyses_saved=self.resumes - len(self._analyses))
+        stats["dedup_ratio"] = stats["analyses_saved"] / self.resumes if self.resumes else 0.0
+        return stats
+
+    def cancel(self):
+        for analysis in self._analyses.values():
+            analysis.cancel()
+
+    def save(self):
+        """Append the finished analyses to the results store in one write"""
+        results_store.record(self.store, self._records)
+        self._records = []
+
+
+async def _analyze_into(rows, analyses, name, text):
+    """Analyze one resume and put its row on the queue"""
+    await rows.put(await analyses.row(name, text))
+
+
+def _finish(tasks, analyses, stats):
+    for task in tasks:
+        task.cancel()
+    analyses.cancel()
+    analyses.save()
+    if stats is not None:
+        stats.update(analyses.stats())
+
+
+async def run_batch(sources, job_description, concurrency=DEFAULT_CONCURRENCY, cache=None, backend=None,
+                    deduplicator=None, stats=None, store=None):
+    """Extract and analyze resumes, yielding one row per resume as soon as it finishes
+
+    With a dedup.Deduplicator, near-duplicates share one analysis; the
+    counts are written to stats when the batch ends. With a
+    results_store.ResultsStore, the finished analyses are appended to it.
+    """
+    loop = asyncio.get_running_loop()
+    rows = asyncio.Queue()
+    analyses = ClusterAnalyses(job_description, concurrency, cache, backend, deduplicator, store)
+    tasks = []
+
+    def on_extracted(name, text, error):
+        extracted.append(name)
+        if error is not None:
+            rows.put_nowait(make_row(name, error=f"Error extracting text from PDF: {error}"))
+        elif not text.strip():
+            rows.put_nowait(make_row(name, error="No text could be extracted from this PDF"))
+        else:
+            tasks.append(loop.create_task(_analyze_into(rows, analyses, name, text)))
+
+    def extract_all():
+        # Runs in a worker thread; each resume is handed back to the event loop
+        # so its analysis starts while the rest of the batch is still extracting
+        try:
+            for name, text, error in pdf_extract.extract_many(sources):
+                loop.call_soon_threadsafe(on_extracted, name, text, error)
+        finally:
+            loop.call_soon_threadsafe(rows.put_nowait, _DONE)
+
+    extracted = []
+    extraction = loop.run_in_executor(None, extract_all)
+    received = 0
+    done = False
+    try:
+        while not done or received < len(extracted):
+            row = await rows.get()
+            if row is _DONE:
+                # Callbacks run in order, so every resume has been counted by now
+                await extraction
+                done = True
+                continue
+            received += 1
+            yield row
+    finally:
+        _finish(tasks, analyses, stats)
+
+
+async def analyze_texts(texts, job_description, concurrency=DEFAULT_CONCURRENCY, cache=None, backend=None,
+                        deduplicator=None, stats=None, store=None):
+    """Analyze already-extracted (name, text) pairs, yielding rows as they finish"""
+    rows = asyncio.Queue()
+    analyses = ClusterAnalyses(job_description, concurrency, cache, backend, deduplicator, store)
+    tasks = [asyncio.ensure_future(_analyze_into(rows, analyses, name, text)) for name, text in texts]
+    try:
+        for _ in tasks:
+            yield await rows.get()
+    finally:
+        _finish(tasks, analyses, stats)
+
+
+def dedup_summary(stats):
+    """One line describing how many resumes shared an analysis"""
+    return (f"Near-duplicates: {stats['analyses_saved']} of {stats['resumes']} resumes "
+            f"({stats['dedup_ratio']:.0%}); {stats['analyses']} analyses run, "
+            f"{stats['analyses_saved']} saved")
+
+
+def retrieve_top_k(index, job_description, top_k):
+    """Return (name, text) pairs for the index's top-K candidates for a job description"""
+    return [(doc_id, index.get_text(doc_id)) for doc_id, _ in index.search(job_description, top_k)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank a folder or zip of PDF resumes against a job description")
+    parser.add_argument("source", nargs="?", help="directory or .zip archive of PDF resumes")
+    parser.add_argument("--job-description", "-j", required=True, help="text file containing the job description")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY,
+                        help="maximum number of analyses in flight")
+    parser.add_argument("--output", "-o", help="write the ranked table to this CSV file")
+    parser.add_argument("--index", help="resume index to retrieve candidates from (see resume_index.py)")
+    parser.add_argument("--top-k", "-k", type=int, default=50,
+                        help="with --index, number of retrieved candidates to analyze")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="analyze every resume, even near-duplicates of another")
+    args = parser.parse_args(argv)
+    if args.source is None and args.index is None:
+        parser.error("a source directory/zip or --index is required")
+
+    load_dotenv(encoding='utf-8')
+    metrics.start_exporters_from_env()
+    with open(args.job_description, encoding='utf-8') as f:
+        job_description = f.read()
+
+    if args.index:
+        index = ResumeIndex(args.index)
+        if args.source:
+            index_source(index, args.source)
+        candidates = retrieve_top_k(index, job_description, args.top_k)
+        print(f"Retrieved {len(candidates)} of {len(index)} indexed resumes", file=sys.stderr)
+
+    deduplicator = None if args.no_dedup else dedup.Deduplicator(history=dedup.get_history())
+    stats = {}
+
+    async def collect():
+        if args.index:
+            results = analyze_texts(candidates, job_description, concurrency=args.concurrency,
+                                    cache=cache_from_env(), deduplicator=deduplicator, stats=stats,
+                                    store=results_store.get_store())
+        else:
+            results = run_batch(iter_resume_sources(args.source), job_description, concurrency=args.concurrency,
+                                cache=cache_from_env(), deduplicator=deduplicator, stats=stats,
+                                store=results_store.get_store())
+        rows = []
+        async for row in results:
+            rows.append(row)
+            if row["error"]:
+                print(f"[{len(rows)}] {row['file']}: {row['error']}", file=sys.stderr)
+            elif row["duplicate_of"]:
+                print(f"[{len(rows)}] {row['file']}: {row['match_score']}% match "
+                      f"(near-duplicate of {row['duplicate_of']})")
+            else:
+                print(f"[{len(rows)}] {row['file']}: {row['match_score']}% match, "
+                      f"{row['ats_compatibility']}% ATS")
+        return rows
+
+    try:
+        with metrics.trace(), metrics.span("batch"):
+            rows = asyncio.run(collect())
+    except analyzer.AnalysisError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        metrics.flush()
+
+    ranked = rank_rows(rows)
+    if deduplicator is not None:
+        print(dedup_summary(stats), file=sys.stderr)
+    print()
+    print(ranked.to_string())
+    if args.output:
+        ranked.to_csv(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""End-to-end benchmarks for the analysis pipeline.
+
+Synthetic resume PDFs (1 to 50 pages) and job descriptions of several sizes
+are pushed through every stage (PDF extraction, prompt construction, the API
+call, streaming, JSON parsing and chart rendering) against a local fake
+Messages API (see fake_llm_server.py) with configurable latency, token rate
+and error injection. Throughput, p50/p95/p99 latency and peak RSS are
+reported per stage and written as JSON. --baseline compares against an
+earlier run and --thresholds against absolute limits; either exits non-zero
+on a regression, so the suite can gate CI.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --pages 1,10,50 --iterations 5 --latency 0.2 --token-rate 500
+    python benchmark.py --baseline bench.json --tolerance 0.25 --thresholds limits.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# The fake server has no quota, so keep the scheduler from throttling the
+# benchmark; these are read when llm_scheduler is imported
+os.environ.setdefault('LLM_REQUESTS_PER_MINUTE', '1000000')
+os.environ.setdefault('LLM_TOKENS_PER_MINUTE', '1000000000')
+
+import numpy as np
+import pandas as pd
+
+import analyzer
+import batch
+import llm_backends
+import pdf_extract
+from charts import create_radar_chart
+from fake_llm_server import FakeLLMServer
+from llm_scheduler import get_scheduler
+from scoring import SKILL_PHRASES
+from streaming_json import IncrementalObjectParser
+
+DEFAULT_PAGES = (1, 2, 5, 10, 25, 50)
+JOB_DESCRIPTION_WORDS = {"small": 120, "medium": 450, "large": 1500}
+# Comparing these against a baseline; throughput regressions show up as latency
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+LINES_PER_PAGE = 48
+
+FILLER = (
+    "delivered measurable improvements across the platform while mentoring engineers and partnering "
+    "with product design and operations stakeholders to ship reliable customer facing features on time"
+).split()
+VERBS = ("Led", "Built", "Designed", "Migrated", "Automated", "Optimized", "Launched", "Reduced", "Scaled")
+
+
+def make_pdf(pages):
+    """Build a minimal text PDF with one Helvetica text line per line of each page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for index, page in enumerate(pages):
+        commands = []
+        y = 760
+        for line in page.split("\n"):
+            line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            commands.append(f"BT /F1 10 Tf 50 {y} Td ({line}) Tj ET")
+            y -= 15
+        content = "\n".join(commands)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * index} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def _sentence(rng, words=14):
+    return " ".join(rng.choice(FILLER) for _ in range(words))
+
+
+def synthetic_resume_pages(page_count, seed=0):
+    """Plausible resume text split into pages, with a repeated header and page-number footer"""
+    rng = random.Random(seed)
+    name = f"Candidate {seed:05d}"
+    lines = [name, f"candidate{seed}@example.com | +1 555 0100", "", "SUMMARY", _sentence(rng, 30), "",
+             "SKILLS", ", ".join(rng.sample(SKILL_PHRASES, 18)), "", "EXPERIENCE"]
+    role = 0
+    while len(lines) < page_count * LINES_PER_PAGE - 8:
+        role += 1
+        lines.append(f"Senior Engineer {role}, Company {rng.randint(1, 999)} ({2024 - role} - {2025 - role})")
+        for _ in range(rng.randint(3, 6)):
+            skill = rng.choice(SKILL_PHRASES)
+            lines.append(f"- {rng.choice(VERBS)} {skill} services that {_sentence(rng, 9)}")
+        lines.append("")
+    lines += ["EDUCATION", "B.S. Computer Science, State University", "", "CERTIFICATIONS", "AWS Solutions Architect"]
+
+    body_lines = LINES_PER_PAGE - 2
+    pages = []
+    for number in range(page_count):
+        chunk = lines[number * body_lines:(number + 1) * body_lines]
+        pages.append("\n".join([f"{name} - Resume"] + chunk + [f"Page {number + 1} of {page_count}"]))
+    return pages
+
+
+def synthetic_job_description(words, seed=0):
+    """A job description of roughly `words` words, including the boilerplate compaction removes"""
+    rng = random.Random(seed)
+    skills = rng.sample(SKILL_PHRASES, 12)
+    parts = ["Senior Software Engineer", "", "REQUIREMENTS:",
+             *(f"- {rng.randint(2, 8)}+ years with {skill}" for skill in skills[:8]), "",
+             "NICE TO HAVE:", *(f"- {skill}" for skill in skills[8:]), "", "RESPONSIBILITIES:"]
+    while len(" ".join(parts).split()) < words * 0.7:
+        parts.append(f"- {_sentence(rng, 16)}")
+    parts += ["", "BENEFITS:"]
+    while len(" ".join(parts).split()) < words:
+        parts.append(f"- {_sentence(rng, 12)}")
+    parts += ["", "We are an equal opportunity employer and consider applicants without regard to race, sex or age."]
+    return "\n".join(parts)
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is a high-water mark: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Record the peak RSS seen while the block runs by polling on a background thread"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _observe(self):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._observe()
+
+    def __enter__(self):
+        self._observe()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._observe()
+        return False
+
+
+class StageRecorder:
+    """Collects latency samples, item counts, errors and peak RSS for each stage"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def measure(self, stage, fn, items=1):
+        """Run fn() and record it under stage; returns fn's result, or None if it raised"""
+        record = self.samples.setdefault(stage, {"seconds": [], "items": 0, "errors": 0, "peak_rss": 0})
+        with RSSSampler() as sampler:
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                record["errors"] += 1
+                record.setdefault("last_error", str(e))
+                return None
+            elapsed = time.perf_counter() - started
+        record["seconds"].append(elapsed)
+        record["items"] += items
+        record["peak_rss"] = max(record["peak_rss"], sampler.peak or 0)
+        return result
+
+    def add(self, stage, seconds):
+        """Record a latency observed elsewhere (e.g. time to first streamed section)"""
+        record = self.samples.setdefault(stage, {"seconds": [], "items": 0, "errors": 0, "peak_rss": 0})
+        record["seconds"].append(seconds)
+        record["items"] += 1
+
+    def summary(self):
+        """Per-stage throughput, latency percentiles and peak RSS"""
+        summary = {}
+        for stage, record in self.samples.items():
+            seconds = np.array(record["seconds"])
+            stats = {"count": len(seconds), "errors": record["errors"]}
+            if len(seconds):
+                p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+                stats.update(
+                    throughput_per_s=record["items"] / seconds.sum() if seconds.sum() else None,
+                    mean_ms=float(seconds.mean() * 1000),
+                    p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99),
+                )
+            if record["peak_rss"]:
+                stats["peak_rss_mb"] = record["peak_rss"] / (1024 * 1024)
+            if "last_error" in record:
+                stats["last_error"] = record["last_error"]
+            summary[stage] = stats
+        return summary
+
+
+def run_case(page_count, jd_size, iterations, backend, batch_size, concurrency, seed=0):
+    """Benchmark every stage for one (resume length, job description size) combination"""
+    recorder = StageRecorder()
+    job_description = synthetic_job_description(JOB_DESCRIPTION_WORDS[jd_size], seed=page_count)
+    for iteration in range(iterations):
+        # A new candidate per iteration and case so the PDF page cache never hits
+        pdf = make_pdf(synthetic_resume_pages(page_count, seed=seed + iteration))
+        text = recorder.measure("extract", lambda: pdf_extract.extract_text(pdf))
+        if text is None:
+            continue
+
+        def build_prompt():
+            resume, job = analyzer.prepare_inputs(text, job_description)
+            return analyzer.build_system_prompt(job), analyzer.build_user_prompt(resume, analyzer.ANALYSIS_SCHEMA)
+        recorder.measure("compact", build_prompt)
+
+        result = recorder.measure("analyze", lambda: analyzer.analyze(text, job_description, backend=backend))
+
+        def stream():
+            started = time.perf_counter()
+            sections = []
+            for section in analyzer.analyze_stream(text, job_description, backend=backend):
+                if not sections:
+                    recorder.add("stream_first_section", time.perf_counter() - started)
+                sections.append(section)
+            return dict(sections)
+        recorder.measure("stream", stream)
+        if result is None:
+            continue
+
+        raw = json.dumps(result)
+
+        def parse():
+            parser = IncrementalObjectParser()
+            for start in range(0, len(raw), 16):
+                parser.feed(raw[start:start + 16])
+            return json.loads(raw), parser.result
+        recorder.measure("parse", parse)
+        recorder.measure("render", lambda: create_radar_chart(result.get("skill_matches", {})).to_json())
+
+    texts = [(f"resume-{n}", "\n".join(synthetic_resume_pages(page_count, seed=seed + iterations + n)))
+             for n in range(batch_size)]
+
+    async def analyze_batch():
+        return [row async for row in batch.analyze_texts(texts, job_description, concurrency, backend=backend)]
+    recorder.measure("batch", lambda: asyncio.run(analyze_batch()), items=batch_size)
+    return recorder.summary()
+
+
+def compare(results, baseline, tolerance, thresholds, allow_errors=False):
+    """Return human-readable regressions against a baseline run and absolute thresholds"""
+    problems = []
+    for case, stages in results.items():
+        for stage, stats in stages.items():
+            previous = (baseline or {}).get(case, {}).get(stage, {})
+            for metric in COMPARED_METRICS:
+                if metric in stats and previous.get(metric) and stats[metric] > previous[metric] * (1 + tolerance):
+                    problems.append(
+                        f"{case} {stage} {metric}: {stats[metric]:.1f} vs baseline {previous[metric]:.1f}"
+                    )
+            for metric, limit in (thresholds or {}).get(stage, {}).items():
+                if metric in stats and stats[metric] > limit:
+                    problems.append(f"{case} {stage} {metric}: {stats[metric]:.1f} exceeds threshold {limit}")
+            if stats.get("errors") and not allow_errors:
+                problems.append(f"{case} {stage}: {stats['errors']} errors ({stats.get('last_error')})")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the resume analysis pipeline against a fake LLM server")
+    parser.add_argument("--pages", default=",".join(map(str, DEFAULT_PAGES)), help="comma-separated resume lengths")
+    parser.add_argument("--jd-sizes", default=",".join(JOB_DESCRIPTION_WORDS),
+                        help=f"comma-separated job description sizes ({', '.join(JOB_DESCRIPTION_WORDS)})")
+    parser.add_argument("--iterations", type=int, default=3, help="runs of each stage per case")
+    parser.add_argument("--batch-size", type=int, default=10, help="resumes per batch throughput run")
+    parser.add_argument("--concurrency", type=int, default=batch.DEFAULT_CONCURRENCY)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=0, help="fake server output tokens/s (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake server requests that fail")
+    parser.add_argument("--error-status", type=int, default=529, choices=[429, 500, 529])
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs baseline")
+    parser.add_argument("--thresholds", help='JSON of absolute limits, e.g. {"extract": {"p95_ms": 200}}')
+    args = parser.parse_args(argv)
+
+    server = FakeLLMServer(latency=args.latency, token_rate=args.token_rate, error_rate=args.error_rate,
+                           error_status=args.error_status, retry_after=0, seed=0).start()
+    # The shared client is created on first use and picks these up
+    os.environ['ANTHROPIC_BASE_URL'] = server.url
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'benchmark')
+    backend = llm_backends.AnthropicBackend()
+
+    results = {}
+    started = time.perf_counter()
+    try:
+        for page_count in (int(p) for p in args.pages.split(",")):
+            for jd_size in (s.strip() for s in args.jd_sizes.split(",")):
+                case = f"pages={page_count},jd={jd_size}"
+                print(f"Running {case}...", file=sys.stderr)
+                results[case] = run_case(page_count, jd_size, args.iterations, backend,
+                                         args.batch_size, args.concurrency, seed=len(results) * 10000)
+    finally:
+        server.stop()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "thresholds")},
+        "duration_s": time.perf_counter() - started,
+        "server": server.stats(),
+        "scheduler": get_scheduler().stats(),
+        "results": results,
+    }
+
+    table = pd.DataFrame(
+        [dict(case=case, stage=stage, **stats) for case, stages in results.items() for stage, stats in stages.items()]
+    )
+    columns = [c for c in ("case", "stage", "count", "errors", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms",
+                           "peak_rss_mb") if c in table]
+    print(table[columns].to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    thresholds = None
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    problems = compare(results, baseline, args.tolerance, thresholds, allow_errors=args.error_rate > 0)
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Two-tier cache for resume analysis results.
+
+Results are keyed on a hash of the normalized resume text, the job
+description, the model name and the prompt version. Lookups go to an
+in-process LRU first and fall back to a SQLite file on disk, so repeated
+analyses of the same pair survive Streamlit reruns and process restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "analysis_cache.sqlite3")
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different extractions share a key"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def make_cache_key(resume_text, job_description, model, prompt_version):
+    """Build a content-addressed cache key for one analysis request"""
+    payload = json.dumps(
+        [normalize_text(resume_text), normalize_text(job_description), model, prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """In-process LRU backed by a persistent SQLite tier with TTL and size limits"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_items=256,
+                 ttl_seconds=7 * 24 * 3600, max_disk_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self._stats["disk_hits"] += 1
+            return value
+
+    def set(self, key, value):
+        """Store a JSON-serializable value in both tiers"""
+        now = time.time()
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now, value)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded.encode("utf-8")), now, now),
+            )
+            self._stats["writes"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM analysis_cache")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache"
+            ).fetchone()
+            stats["memory_items"] = len(self._memory)
+        stats["disk_items"] = count
+        stats["disk_bytes"] = size
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, created_at, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        cursor = self._conn.execute(
+            "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self._stats["evictions"] += cursor.rowcount
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM analysis_cache"
+        ).fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM analysis_cache ORDER BY accessed_at ASC"
+        ).fetchall():
+            self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._stats["evictions"] += 1
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+
+def cache_from_env():
+    """Build an AnalysisCache configured from ANALYSIS_CACHE_* environment variables"""
+    return AnalysisCache(
+        path=os.getenv('ANALYSIS_CACHE_PATH', DEFAULT_CACHE_PATH),
+        max_memory_items=int(os.getenv('ANALYSIS_CACHE_MEMORY_ITEMS', '256')),
+        ttl_seconds=float(os.getenv('ANALYSIS_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+        max_disk_bytes=int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', str(50 * 1024 * 1024))),
+    )
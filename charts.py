@@ -0,0 +1,100 @@
+"""Plotly figures for the results view"""
+import functools
+
+
+def _graph_objects():
+    # Job workers load pandas in the background (results_store writes go through
+    # pyarrow, which imports it). Plotly looks pandas up in sys.modules without
+    # importing it, so finish that import first instead of seeing it half done.
+    import pandas  # noqa: F401
+    import plotly.graph_objects as go
+
+    return go
+
+
+def create_radar_chart(skill_matches):
+    """Create a radar chart for skill matches
+
+    Figures are memoized per set of skill matches, so Streamlit reruns reuse
+    the same figure; treat the returned figure as read-only.
+    """
+    return _radar_chart(tuple(skill_matches.items()))
+
+
+@functools.lru_cache(maxsize=64)
+def _radar_chart(skill_matches):
+    go = _graph_objects()
+
+    categories = [skill for skill, _ in skill_matches]
+    values = [value for _, value in skill_matches]
+    
+    fig = go.Figure(data=go.Scatterpolar(
+        r=values,
+        theta=categories,
+        fill='toself',
+        line_color='#FF4B4B'
+    ))
+    
+    fig.update_layout(
+        height=500,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 100],
+                tickfont=dict(size=12),
+                gridcolor="#e0e0e0"
+            ),
+            angularaxis=dict(
+                tickfont=dict(size=14),
+                gridcolor="#e0e0e0"
+            )
+        ),
+        font=dict(
+            family="Arial, sans-serif",
+            size=16,
+            color="#2C3E50"
+        ),
+        showlegend=False,
+        title="Skills Match Analysis"
+    )
+    return fig
+
+
+def create_score_histogram(histogram, titles):
+    """Stacked bars of analyses per score bin, one trace per requisition"""
+    go = _graph_objects()
+
+    labels = [f"{low}-{low + 9}" if low < 90 else "90-100" for low in histogram.columns]
+    fig = go.Figure(data=[
+        go.Bar(x=labels, y=histogram.loc[requisition].to_numpy(), name=titles.get(requisition, requisition))
+        for requisition in histogram.index
+    ])
+    fig.update_layout(barmode='stack', height=400, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                      xaxis_title="Match score", yaxis_title="Analyses", title="Match Score Distribution")
+    return fig
+
+
+def create_keyword_bar(keywords):
+    """Horizontal bars of the most frequently missing keywords"""
+    go = _graph_objects()
+
+    fig = go.Figure(data=go.Bar(x=keywords.to_numpy()[::-1], y=keywords.index.to_numpy()[::-1],
+                                orientation='h', marker_color='#FF4B4B'))
+    fig.update_layout(height=max(300, 22 * len(keywords)), paper_bgcolor='rgba(0,0,0,0)',
+                      plot_bgcolor='rgba(0,0,0,0)', xaxis_title="Analyses", title="Most Frequent Missing Keywords")
+    return fig
+
+
+def create_skill_heatmap(coverage, titles):
+    """Heatmap of the mean skill score per requisition"""
+    go = _graph_objects()
+
+    fig = go.Figure(data=go.Heatmap(
+        z=coverage.to_numpy(), x=list(coverage.columns), y=[titles.get(r, r) for r in coverage.index],
+        zmin=0, zmax=100, colorscale='RdYlGn', colorbar=dict(title="Score")
+    ))
+    fig.update_layout(height=max(300, 40 * len(coverage)), paper_bgcolor='rgba(0,0,0,0)',
+                      plot_bgcolor='rgba(0,0,0,0)', title="Skill Coverage by Requisition")
+    return fig
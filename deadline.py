@@ -0,0 +1,131 @@
+"""End-to-end deadlines and cancellation for one analysis.
+
+The PRD targets a finished analysis within ANALYSIS_DEADLINE_SECONDS (30s).
+A Deadline covers one analysis and is split into stage budgets
+(STAGE_SHARES): extraction must finish within its share, the LLM stage ends
+early enough to leave the parse stage (response repair) its share, and time
+an earlier stage leaves unused carries over to the next one. When the LLM
+stage runs out, the analysis returns the sections that did finish.
+
+The deadline in effect is held in a context variable, so the code that waits
+(sandboxed extraction, the scheduler's queue and backoff, API timeouts) finds
+it without extra arguments; worker threads started with
+contextvars.copy_context() inherit it. Callers without a deadline, such as
+batch screening, run unbounded as before.
+
+A deadline can also be cancelled, e.g. when the user leaves the page or
+starts another analysis: waits end at once, streams stop at their next chunk
+and extraction sandboxes are killed.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEADLINE_SECONDS = float(os.getenv('ANALYSIS_DEADLINE_SECONDS', '30'))
+STAGES = ("extract", "llm", "parse")
+STAGE_SHARES = {"extract": 0.2, "llm": 0.7, "parse": 0.1}
+# How often waits that cannot be woken directly check for cancellation
+POLL_SECONDS = 0.25
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class Deadline:
+    """A time limit for one analysis, split into stage budgets, that can also be cancelled"""
+
+    def __init__(self, seconds=DEADLINE_SECONDS, shares=STAGE_SHARES):
+        self.seconds = seconds
+        self.shares = shares
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+        self.stage = None
+        self._stage_ends = self.expires
+        self._cancelled = threading.Event()
+        self.reason = None
+
+    def start_stage(self, stage):
+        """Enter stage; it ends when only the later stages' shares of the deadline are left"""
+        later = STAGES[STAGES.index(stage) + 1:]
+        self.stage = stage
+        self._stage_ends = self.expires - self.seconds * sum(self.shares[name] for name in later)
+
+    def remaining(self):
+        """Seconds left in the current stage; 0 once it has run out or the deadline was cancelled"""
+        if self._cancelled.is_set():
+            return 0.0
+        return max(0.0, self._stage_ends - time.monotonic())
+
+    def expired(self):
+        """True once the current stage has run out of time"""
+        return time.monotonic() >= self._stage_ends
+
+    def cancel(self, reason="cancelled"):
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        """True once the current stage has run out of time or the deadline was cancelled"""
+        return self.cancelled or self.expired()
+
+    def sleep(self, seconds):
+        """Sleep for seconds; returns False early if the stage runs out or the deadline is cancelled first"""
+        if seconds >= self.remaining():
+            self._cancelled.wait(self.remaining())
+            return False
+        return not self._cancelled.wait(seconds)
+
+    async def asleep(self, seconds):
+        """Async variant of sleep(), checking for cancellation every POLL_SECONDS"""
+        ends = time.monotonic() + seconds
+        while True:
+            now = time.monotonic()
+            if now >= ends:
+                return True
+            if self.done():
+                return False
+            await asyncio.sleep(min(ends - now, POLL_SECONDS))
+
+    def describe(self):
+        """Summary for analysis stats: the limit, the stage that ran out and whether it was cancelled"""
+        return {"seconds": self.seconds, "stage": self.stage, "cancelled": self.cancelled,
+                "elapsed": round(time.monotonic() - self.started, 2)}
+
+
+def current():
+    """Return the Deadline in effect, or None"""
+    return _current.get()
+
+
+@contextmanager
+def scope(deadline):
+    """Make deadline the one in effect for this thread and the worker threads it starts"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def stage(name):
+    """Enter a stage of the deadline in effect, if any"""
+    deadline = current()
+    if deadline is not None:
+        deadline.start_stage(name)
+
+
+def remaining(default=None):
+    """Seconds left in the current stage, capped at default; default when no deadline is in effect"""
+    deadline = current()
+    if deadline is None:
+        return default
+    if default is None:
+        return deadline.remaining()
+    return min(default, deadline.remaining())
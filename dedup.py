@@ -0,0 +1,217 @@
+"""Near-duplicate detection for bulk intake.
+
+The same candidate often applies several times, through several agencies,
+with trivially different PDFs. Each resume is fingerprinted with a MinHash
+signature of its word shingles (the scorer's tokens, so formatting and
+stopword differences do not count). Signatures are split into LSH bands:
+resumes sharing any band are candidates, and a candidate joins a cluster
+when the signatures estimate a Jaccard similarity of at least
+DEDUP_THRESHOLD. Only the first resume of a cluster is analyzed; the others
+get its result.
+
+Fingerprints are also kept in a small SQLite history (DEDUP_HISTORY_PATH;
+empty disables it) so a resume that matches one seen in an earlier batch is
+analyzed using the earlier text, which the analysis cache has usually seen
+for the same requisition already.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cache import normalize_text
+from scoring import tokenize
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
+DEFAULT_HISTORY_PATH = os.path.join(".cache", "fingerprints.sqlite3")
+HISTORY_PATH = os.getenv('DEDUP_HISTORY_PATH', DEFAULT_HISTORY_PATH)
+
+_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: stored signatures must stay comparable across processes and runs
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 1 << 31, NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Return the set of size-token shingles of text"""
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(text):
+    """Return the MinHash signature of text, or None if it has no tokens"""
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little") for gram in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+    # (a * h + b) mod p for every permutation at once; operands stay below 2**63
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(signature == other))
+
+
+def band_keys(signature):
+    """One bucket key per LSH band"""
+    return [
+        f"{band}:" + hashlib.blake2b(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(),
+                                     digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+class FingerprintHistory:
+    """Signatures and text of previously seen resumes, bucketed by LSH band on disk"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                id INTEGER PRIMARY KEY,
+                text_hash TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                text TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                band_key TEXT NOT NULL,
+                fingerprint_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fingerprint_bands ON fingerprint_bands (band_key);
+            """
+        )
+        self._conn.commit()
+
+    def add(self, name, text, signature):
+        """Remember a resume; an identical text already in the history is kept as is"""
+        text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO fingerprints (text_hash, name, text, signature, added_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (text_hash, name, text, signature.tobytes(), time.time()),
+            )
+            if cursor.rowcount:
+                self._conn.executemany(
+                    "INSERT INTO fingerprint_bands (band_key, fingerprint_id) VALUES (?, ?)",
+                    [(key, cursor.lastrowid) for key in band_keys(signature)],
+                )
+
+    def candidates(self, signature):
+        """Return (name, text, signature) for stored resumes sharing a band with signature"""
+        keys = band_keys(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, text, signature FROM fingerprints WHERE id IN "
+                f"(SELECT fingerprint_id FROM fingerprint_bands WHERE band_key IN ({','.join('?' * len(keys))})) "
+                "ORDER BY id",
+                keys,
+            ).fetchall()
+        return [(name, text, np.frombuffer(blob, dtype=np.uint64)) for name, text, blob in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Deduplicator:
+    """Assigns each resume of a batch to a near-duplicate cluster and counts what was saved"""
+
+    def __init__(self, threshold=THRESHOLD, history=None):
+        self.threshold = threshold
+        self.history = history
+        self._buckets = {}
+        self._members = []
+        self.resumes = 0
+        self.clusters = 0
+        self.history_matches = 0
+
+    def assign(self, name, text):
+        """Return (representative name, representative text) for a resume.
+
+        The representative is the resume itself when it starts a new
+        cluster, the first member of its cluster in this batch, or a
+        matching resume from the history.
+        """
+        self.resumes += 1
+        signature = minhash(text)
+        if signature is None:
+            self.clusters += 1
+            return name, text
+
+        best, best_similarity = None, 0.0
+        # The closest match wins; ties go to the earliest member
+        for member in sorted({index for key in band_keys(signature) for index in self._buckets.get(key, ())}):
+            member_similarity = similarity(signature, self._members[member][0])
+            if member_similarity >= self.threshold and member_similarity > best_similarity:
+                best, best_similarity = self._members[member][1], member_similarity
+        if best is None and self.history is not None:
+            for other_name, other_text, other_signature in self.history.candidates(signature):
+                other_similarity = similarity(signature, other_signature)
+                if other_similarity >= self.threshold and other_similarity > best_similarity:
+                    best, best_similarity = (other_name, other_text), other_similarity
+            if best is not None:
+                self.history_matches += 1
+        if best is None:
+            self.clusters += 1
+            best = (name, text)
+
+        self._members.append((signature, best))
+        for key in band_keys(signature):
+            self._buckets.setdefault(key, []).append(len(self._members) - 1)
+        if self.history is not None:
+            self.history.add(name, text, signature)
+        return best
+
+    def stats(self):
+        """Resumes seen, clusters formed, duplicates skipped and the dedup ratio"""
+        duplicates = self.resumes - self.clusters
+        return {
+            "resumes": self.resumes,
+            "clusters": self.clusters,
+            "duplicates": duplicates,
+            "history_matches": self.history_matches,
+            "dedup_ratio": duplicates / self.resumes if self.resumes else 0.0,
+        }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Return the process-wide fingerprint history, or None when DEDUP_HISTORY_PATH is empty"""
+    global _history
+    if not HISTORY_PATH:
+        return None
+    with _history_lock:
+        if _history is None:
+            _history = FingerprintHistory(HISTORY_PATH)
+        return _history
@@ -0,0 +1,205 @@
+"""Local stand-in for the Anthropic Messages API, for benchmarks and offline testing.
+
+Serves POST /v1/messages, streaming (SSE) and non-streaming, with a fixed
+time to first token, a configurable output token rate and optional error
+injection. Responses are schema-valid analyses from the offline mock backend,
+and usage reports prompt-cache writes and reads the way the real API does
+for system blocks marked with cache_control.
+
+Point the app or batch CLI at it with ANTHROPIC_BASE_URL:
+    python fake_llm_server.py --port 8765 --latency 0.5 --token-rate 200
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=fake streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_backends import MockBackend, system_text
+from prompt_compaction import CHARS_PER_TOKEN
+
+ERROR_TYPES = {429: "rate_limit_error", 500: "api_error", 529: "overloaded_error"}
+
+
+class FakeLLMServer:
+    """Threaded HTTP server answering like the Messages API.
+
+    latency is seconds before the first token, token_rate is output tokens
+    per second (0 for instant), error_rate is the share of requests answered
+    with error_status instead.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_rate=0.0,
+                 error_rate=0.0, error_status=529, retry_after=1, seed=None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes = set()
+        self._stats = {"requests": 0, "errors": 0, "streams": 0}
+        self._mock = MockBackend(latency=0.0)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread; returns self for chaining"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _inject_error(self):
+        with self._lock:
+            self._stats["requests"] += 1
+            failed = self._random.random() < self.error_rate
+            self._stats["errors"] += failed
+        return failed
+
+    def _usage(self, system, prompt, text):
+        """Token counts, with the system prefix billed as a cache write the first time it is seen"""
+        usage = {"input_tokens": len(prompt) // CHARS_PER_TOKEN, "output_tokens": len(text) // CHARS_PER_TOKEN,
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        prefix = system_text(system)
+        cacheable = isinstance(system, list) and any("cache_control" in block for block in system)
+        if not cacheable:
+            usage["input_tokens"] += len(prefix) // CHARS_PER_TOKEN
+            return usage
+        digest = hashlib.sha256(prefix.encode("utf-8")).digest()
+        with self._lock:
+            seen = digest in self._prefixes
+            self._prefixes.add(digest)
+        usage["cache_read_input_tokens" if seen else "cache_creation_input_tokens"] = len(prefix) // CHARS_PER_TOKEN
+        return usage
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, event, data):
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.split("?")[0] != "/v1/messages":
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                    return
+                time.sleep(server.latency)
+                if server._inject_error():
+                    status = server.error_status
+                    self._send_json(
+                        status,
+                        {"type": "error", "error": {"type": ERROR_TYPES.get(status, "api_error"),
+                                                    "message": "Injected error"}},
+                        {"retry-after": str(server.retry_after)} if status == 429 else None,
+                    )
+                    return
+
+                system = request.get("system") or ""
+                content = request["messages"][-1]["content"]
+                prompt = content if isinstance(content, str) else system_text(content)
+                text = server._mock.respond(system, prompt)
+                usage = server._usage(system, prompt, text)
+                message = {
+                    "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+                    "model": request.get("model", "fake"), "stop_reason": "end_turn", "stop_sequence": None,
+                    "content": [{"type": "text", "text": text}], "usage": usage,
+                }
+                if not request.get("stream"):
+                    if server.token_rate:
+                        time.sleep(usage["output_tokens"] / server.token_rate)
+                    self._send_json(200, message)
+                    return
+                with server._lock:
+                    server._stats["streams"] += 1
+                self._stream(message, text, usage)
+
+            def _stream(self, message, text, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=0))
+                self._send_event("message_start", {"type": "message_start", "message": start})
+                self._send_event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                         "content_block": {"type": "text", "text": ""}})
+                # Send a few tokens per event so high token rates don't drown in syscalls
+                chunk_chars = 4 * CHARS_PER_TOKEN
+                for offset in range(0, len(text), chunk_chars):
+                    piece = text[offset:offset + chunk_chars]
+                    self._send_event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                             "delta": {"type": "text_delta", "text": piece}})
+                    if server.token_rate:
+                        time.sleep(len(piece) / CHARS_PER_TOKEN / server.token_rate)
+                self._send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                self._send_event("message_delta", {"type": "message_delta",
+                                                   "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                                   "usage": {"output_tokens": usage["output_tokens"]}})
+                self._send_event("message_stop", {"type": "message_stop"})
+                self.close_connection = True
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200, help="output tokens per second (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=529, choices=sorted(ERROR_TYPES))
+    args = parser.parse_args(argv)
+
+    server = FakeLLMServer(args.host, args.port, args.latency, args.token_rate, args.error_rate, args.error_status)
+    print(f"Fake Messages API on {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
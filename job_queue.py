@@ -0,0 +1,614 @@
+"""Durable SQLite job queue for single-resume analyses.
+
+The app's Analyze button enqueues a job and returns its id instead of
+running the analysis inside the Streamlit script, so closing the tab or
+restarting the session does not throw away work that was already paid for.
+Workers claim jobs with a lease and record partial results as sections
+arrive, which also extends the lease. A job whose worker died is picked up
+again once its lease expires; failed attempts are retried with backoff up to
+JOB_MAX_ATTEMPTS. Retries are idempotent: jobs are keyed on the PDF and job
+description, so resubmitting returns the existing job, and the per-section
+analysis cache means a retry only pays for the sections that had not
+finished.
+
+A job may name the previous job of the same session (previous_job). When
+that job finished for the same job description, the worker re-analyzes only
+the resume sections that changed since, starting from its result.
+
+Each job runs under an analysis deadline (see deadline.py). A job that runs
+out of time finishes as PARTIAL with the sections that arrived. Sessions
+showing a job watch it; once every session watching it has gone for
+JOB_ABANDON_SECONDS, or the last one starts another analysis, the job is
+CANCELLED, its in-flight calls and extraction are stopped and what finished
+is kept. Resubmitting a partial or cancelled job runs it again, and the
+sections that finished come from the cache.
+
+The app runs JOB_APP_WORKERS worker threads of its own. To drain the queue
+from separate processes instead, set JOB_APP_WORKERS=0 and run:
+
+Usage:
+    python job_queue.py work --workers 4 --threads 2
+    python job_queue.py status
+    python job_queue.py show <job id>
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+import analyzer
+import deadline
+import metrics
+import pdf_extract
+import results_store
+import service_client
+from cache import cache_from_env, normalize_text
+
+DEFAULT_QUEUE_PATH = os.path.join(".cache", "jobs.sqlite3")
+QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# A running job is handed to another worker if it makes no progress for this long
+LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '300'))
+RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY_SECONDS', '5'))
+MAX_RETRY_DELAY = 300.0
+RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+POLL_INTERVAL = float(os.getenv('JOB_POLL_SECONDS', '1'))
+APP_WORKERS = int(os.getenv('JOB_APP_WORKERS', '2'))
+# A job nobody has polled for this long is cancelled; 0 lets every job run to the end
+ABANDON_SECONDS = float(os.getenv('JOB_ABANDON_SECONDS', '20'))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+PARTIAL = "partial"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+# Finished jobs that resubmitting the same inputs runs again
+RERUNNABLE = (PARTIAL, FAILED, CANCELLED)
+CANCELLED_MESSAGE = ("The analysis was stopped because nobody was watching it. "
+                     "Analyze again to finish it; sections that already finished are kept.")
+
+logger = logging.getLogger("job_queue")
+
+
+def job_key(pdf_digest, job_description):
+    """Identify a job by its inputs so resubmitting the same pair reuses it"""
+    digest = hashlib.sha256(pdf_digest.encode("ascii"))
+    digest.update(b"\0" + normalize_text(job_description).encode("utf-8"))
+    digest.update(b"\0" + analyzer.PROMPT_VERSION.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class JobQueue:
+    """Jobs stored in SQLite, claimed by workers under a renewable lease.
+
+    Uploads small enough to stay in memory are stored in the row; larger
+    ones are kept as files in upload_dir (next to the database by default)
+    and extraction reads them from there.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, max_attempts=MAX_ATTEMPTS, lease_seconds=LEASE_SECONDS,
+                 upload_dir=None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.upload_dir = os.path.abspath(upload_dir or os.path.join(os.path.dirname(path), "job_uploads"))
+        self._lock = threading.Lock()
+        # Wakes this process's idle workers; workers in other processes poll
+        self.ready = threading.Event()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit mode so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_key TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                filename TEXT,
+                job_description TEXT NOT NULL,
+                pdf BLOB,
+                pdf_path TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_until REAL,
+                worker TEXT,
+                previous_job TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at);
+            CREATE TABLE IF NOT EXISTS job_watchers (
+                job_id TEXT NOT NULL,
+                session TEXT NOT NULL,
+                watched_until REAL NOT NULL,
+                PRIMARY KEY (job_id, session)
+            );
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "previous_job" not in columns:
+            # Queues created before revisions were tracked
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN previous_job TEXT")
+
+    def _transaction(self):
+        """Hold the write lock for a read-modify-write across processes"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def _upload_path(self, job_id):
+        return os.path.join(self.upload_dir, f"{job_id}.pdf")
+
+    def _store_upload(self, job_id, upload):
+        """Return (pdf bytes, pdf path) to store for a job's spooled upload"""
+        if upload.path is None:
+            return upload.source(), None
+        os.makedirs(self.upload_dir, exist_ok=True)
+        upload.save(self._upload_path(job_id))
+        return None, upload.path
+
+    def _discard_upload(self, job_id):
+        try:
+            os.unlink(self._upload_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def enqueue(self, pdf_file, filename, job_description, previous_job=None):
+        """Add a job for a PDF file or bytes and return its id, reusing any job for the same inputs
+
+        previous_job is the id of a job for an earlier version of the resume.
+        Raises pdf_extract.PDFLimitError if the PDF is over the size limit.
+        """
+        now = time.time()
+        with pdf_extract.spool(pdf_file) as upload, self._lock:
+            key = job_key(upload.digest, job_description)
+            conn = self._transaction()
+            try:
+                conn.execute("DELETE FROM jobs WHERE status IN (?, ?, ?, ?) AND updated_at < ?",
+                             (DONE, PARTIAL, FAILED, CANCELLED, now - RETENTION_SECONDS))
+                conn.execute("DELETE FROM job_watchers WHERE job_id NOT IN (SELECT id FROM jobs)")
+                row = conn.execute("SELECT id, status FROM jobs WHERE job_key = ?", (key,)).fetchone()
+                if row is None:
+                    job_id = uuid.uuid4().hex
+                    pdf, pdf_path = self._store_upload(job_id, upload)
+                    conn.execute(
+                        "INSERT INTO jobs (id, job_key, status, filename, job_description, pdf, pdf_path, "
+                        "previous_job, available_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, key, QUEUED, filename, job_description, pdf, pdf_path, previous_job,
+                         now, now, now),
+                    )
+                elif row["status"] in RERUNNABLE:
+                    # Resubmitting an unfinished job gives it a fresh set of attempts
+                    job_id = row["id"]
+                    conn.execute("DELETE FROM job_watchers WHERE job_id = ?", (job_id,))
+                    pdf, pdf_path = self._store_upload(job_id, upload)
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, pdf = ?, pdf_path = ?, result = NULL, error = NULL, "
+                        "attempts = 0, previous_job = ?, available_at = ?, updated_at = ? WHERE id = ?",
+                        (QUEUED, pdf, pdf_path, previous_job, now, now, job_id),
+                    )
+                else:
+                    job_id = row["id"]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.ready.set()
+        return job_id
+
+    def claim(self, worker):
+        """Lease the oldest runnable job to worker; returns the job dict or None"""
+        now = time.time()
+        with self._lock:
+            conn = self._transaction()
+            try:
+                while True:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE (status = ? AND available_at <= ?) "
+                        "OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                        (QUEUED, now, RUNNING, now),
+                    ).fetchone()
+                    if row is not None and self._abandoned(row["id"], now):
+                        # Everyone who asked for it has left; don't pay for it
+                        conn.execute("UPDATE jobs SET status = ?, error = ?, pdf = NULL, pdf_path = NULL, "
+                                     "updated_at = ? WHERE id = ?", (CANCELLED, CANCELLED_MESSAGE, now, row["id"]))
+                        self._discard_upload(row["id"])
+                        continue
+                    if row is None or row["attempts"] < self.max_attempts:
+                        break
+                    # Its worker kept dying mid-analysis; stop handing it out
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, pdf = NULL, pdf_path = NULL, error = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (FAILED, f"The analysis did not finish after {row['attempts']} attempts. Please try again.",
+                         now, row["id"]),
+                    )
+                    self._discard_upload(row["id"])
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, worker = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (RUNNING, now + self.lease_seconds, worker, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def _update_leased(self, job_id, worker, sql, params, status=RUNNING):
+        """Apply an update only while worker still holds the job's lease"""
+        with self._lock:
+            cursor = self._conn.execute(
+                sql + " WHERE id = ? AND worker = ? AND status = ?", params + (job_id, worker, status)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, worker, result):
+        """Save partial results and renew the lease; False means the job was handed to someone else"""
+        now = time.time()
+        return self._update_leased(job_id, worker, "UPDATE jobs SET result = ?, lease_until = ?, updated_at = ?",
+                                   (json.dumps(result), now + self.lease_seconds, now))
+
+    def complete(self, job_id, worker, result, partial=False):
+        """Store the final result and drop the uploaded PDF; partial marks a result cut short by the deadline"""
+        if not self._update_leased(job_id, worker,
+                                   "UPDATE jobs SET status = ?, result = ?, error = NULL, pdf = NULL, pdf_path = NULL, "
+                                   "updated_at = ?", (PARTIAL if partial else DONE, json.dumps(result), time.time())):
+            return False
+        self._discard_upload(job_id)
+        return True
+
+    def save_cancelled(self, job_id, worker, result):
+        """Keep what a cancelled job's worker finished, and drop the uploaded PDF"""
+        if not self._update_leased(job_id, worker, "UPDATE jobs SET result = ?, pdf = NULL, pdf_path = NULL, "
+                                   "updated_at = ?", (json.dumps(result), time.time()), status=CANCELLED):
+            return False
+        self._discard_upload(job_id)
+        return True
+
+    def fail(self, job_id, worker, error, result=None, attempts=0, retry=True):
+        """Requeue the job with backoff, or mark it failed once retries are exhausted"""
+        now = time.time()
+        encoded = json.dumps(result) if result is not None else None
+        if retry and attempts < self.max_attempts:
+            delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            return self._update_leased(job_id, worker,
+                                       "UPDATE jobs SET status = ?, result = ?, error = ?, available_at = ?, "
+                                       "lease_until = NULL, updated_at = ?",
+                                       (QUEUED, encoded, error, now + delay, now))
+        if not self._update_leased(job_id, worker,
+                                   "UPDATE jobs SET status = ?, result = ?, error = ?, pdf = NULL, pdf_path = NULL, "
+                                   "updated_at = ?", (FAILED, encoded, error, now)):
+            return False
+        self._discard_upload(job_id)
+        return True
+
+    def get(self, job_id):
+        """Return a job's status, attempts, error, result and queue position, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, filename, result, error, attempts, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            job["position"] = 0
+            if job["status"] == QUEUED:
+                job["position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def watch(self, job_id, session):
+        """Record that session is still showing the job, keeping it from being abandoned"""
+        if not ABANDON_SECONDS:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO job_watchers (job_id, session, watched_until) VALUES (?, ?, ?)",
+                               (job_id, session, time.time() + ABANDON_SECONDS))
+
+    def release(self, job_id, session):
+        """Stop watching a job, cancelling it if it is unfinished and no other session is watching it"""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_watchers WHERE job_id = ? AND session = ?", (job_id, session))
+            if self._conn.execute("SELECT 1 FROM job_watchers WHERE job_id = ? AND watched_until >= ?",
+                                  (job_id, time.time())).fetchone() is not None:
+                return False
+        return self.cancel(job_id, CANCELLED_MESSAGE)
+
+    def cancel(self, job_id, error="The analysis was cancelled."):
+        """Cancel a queued or running job; its worker notices within JOB_POLL_SECONDS"""
+        now = time.time()
+        with self._lock:
+            queued = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, pdf = NULL, pdf_path = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ?", (CANCELLED, error, now, job_id, QUEUED),
+            ).rowcount
+            # A running job's worker keeps what it finished and then drops the upload
+            running = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, error, now, job_id, RUNNING),
+            ).rowcount
+        if queued:
+            self._discard_upload(job_id)
+        return bool(queued or running)
+
+    def _abandoned(self, job_id, now):
+        """True if sessions watched the job and none has polled it recently; jobs nobody watched never are"""
+        watchers, latest = self._conn.execute(
+            "SELECT COUNT(*), MAX(watched_until) FROM job_watchers WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return bool(ABANDON_SECONDS) and watchers > 0 and latest < now
+
+    def should_stop(self, job_id, worker):
+        """True if worker should stop the job: it was cancelled, re-leased or abandoned (which cancels it)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT status, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != RUNNING or row["worker"] != worker:
+                return True
+            abandoned = self._abandoned(job_id, now)
+        if abandoned:
+            self.cancel(job_id, CANCELLED_MESSAGE)
+        return abandoned
+
+    def previous_version(self, job):
+        """Return {"text", "analysis"} of the job's previous version, or None if it cannot be reused"""
+        if not job.get("previous_job") or job["previous_job"] == job["id"]:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_description, result FROM jobs WHERE id = ? AND status = ?", (job["previous_job"], DONE)
+            ).fetchone()
+        if row is None or normalize_text(row["job_description"]) != normalize_text(job["job_description"]):
+            return None
+        result = json.loads(row["result"])
+        if not result.get("text") or not result.get("analysis"):
+            return None
+        return {"text": result["text"], "analysis": result["analysis"]}
+
+    def counts(self):
+        """Return the number of jobs in each status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, PARTIAL, FAILED, CANCELLED), 0)
+        counts.update((status, count) for status, count in rows)
+        return counts
+
+
+def job_events(job, cache=None, stats=None, previous=None):
+    """Yield ("local_scores", scores) and each analysis section for a claimed job"""
+    # Large uploads are read from their file rather than loaded into this process
+    source = job["pdf_path"] or job["pdf"]
+    if service_client.SERVICE_URL:
+        if job["pdf_path"]:
+            with open(job["pdf_path"], 'rb') as f:
+                source = f.read()
+        return service_client.analysis_events(source, job["filename"], job["job_description"], stats,
+                                              previous=previous)
+    # Imported here: the service module brings in its HTTP server and scoring, which the app's first paint doesn't need
+    import analysis_service
+    return analysis_service.analysis_events(source, job["job_description"], cache=cache, stats=stats,
+                                            previous=previous)
+
+
+class Worker:
+    """Claims jobs from a queue and runs them one at a time, recording finished analyses in store"""
+
+    def __init__(self, queue, cache=None, name=None, store=None):
+        self.queue = queue
+        self.cache = cache
+        self.store = store
+        self.name = name or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def run_once(self):
+        """Run one job if any is ready; returns True if a job was claimed"""
+        job = self.queue.claim(self.name)
+        if job is None:
+            return False
+        with metrics.trace(), metrics.span("job", job=job["id"], attempt=job["attempts"]):
+            self.process(job)
+        metrics.flush()
+        return True
+
+    def process(self, job):
+        """Run a claimed job under an analysis deadline that is cancelled if the job is"""
+        current = deadline.Deadline()
+        finished = threading.Event()
+        threading.Thread(target=self._watch, args=(job["id"], current, finished), daemon=True).start()
+        try:
+            with deadline.scope(current):
+                self._analyze(job, current)
+        finally:
+            finished.set()
+
+    def _watch(self, job_id, current, finished):
+        """Cancel the deadline once the job is cancelled, abandoned or handed to another worker"""
+        while not finished.wait(POLL_INTERVAL):
+            if self.queue.should_stop(job_id, self.name):
+                current.cancel()
+                return
+
+    def _analyze(self, job, current):
+        stats = {}
+        # The extracted text is kept so a later revision of the resume can be diffed against it
+        result = {"local": None, "analysis": {}, "stats": stats, "text": None}
+        try:
+            events = job_events(job, cache=self.cache, stats=stats, previous=self.queue.previous_version(job))
+            try:
+                for key, value in events:
+                    result["text"] = stats.pop("resume_text", result["text"])
+                    if key == "local_scores":
+                        result["local"] = value
+                    else:
+                        result["analysis"][key] = value
+                    if current.cancelled or not self.queue.heartbeat(job["id"], self.name, result):
+                        # Cancelled, or handed to another worker after the lease ran out
+                        current.cancel()
+                        break
+            finally:
+                # Stops a remote analysis too, by closing its connection
+                events.close()
+        except analyzer.AnalysisError as e:
+            if current.cancelled:
+                self._cancelled(job, result)
+                return
+            # An unreadable PDF will not get better on a retry, nor will one that ran out of time
+            retry = result["local"] is not None and "deadline" not in stats
+            result["analysis"] = None
+            self.queue.fail(job["id"], self.name, str(e), result, job["attempts"], retry=retry)
+            return
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            result["analysis"] = None
+            self.queue.fail(job["id"], self.name, f"Error during analysis: {str(e)}", result, job["attempts"])
+            return
+        if current.cancelled:
+            self._cancelled(job, result)
+            return
+        # The analysis service reports the text with its final stats
+        result["text"] = stats.pop("resume_text", result["text"])
+        # Sections cut off by the deadline are left out; such results are not recorded for the dashboard
+        partial = "deadline" in stats
+        if self.queue.complete(job["id"], self.name, result, partial) and result["analysis"] and not partial:
+            results_store.record(self.store, [results_store.flatten(
+                result["analysis"], job["job_description"], "app", job["filename"], local=result["local"])])
+
+    def _cancelled(self, job, result):
+        if self.queue.save_cancelled(job["id"], self.name, result):
+            logger.info("Job %s was cancelled", job["id"])
+        else:
+            logger.warning("Lost the lease on job %s; abandoning it", job["id"])
+
+    def run(self, stop=None, poll_interval=POLL_INTERVAL):
+        """Process jobs until stop is set, sleeping poll_interval when the queue is empty"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except sqlite3.Error:
+                logger.exception("Job queue unavailable")
+            if self.queue.ready.wait(poll_interval):
+                self.queue.ready.clear()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Return the process-wide job queue, opening it on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(QUEUE_PATH)
+            metrics.REGISTRY.register_collector(_queue_gauges)
+        return _queue
+
+
+def _queue_gauges():
+    """Jobs in the queue by status"""
+    for status, count in get_queue().counts().items():
+        yield "jobs", "gauge", "Analysis jobs in the queue by status", {"status": status}, count
+
+
+def start_workers(queue, count, cache=None, store=None):
+    """Start count daemon worker threads; returns the event that stops them"""
+    stop = threading.Event()
+    for index in range(count):
+        worker = Worker(queue, cache=cache, store=store)
+        threading.Thread(target=worker.run, args=(stop,), name=f"job-worker-{index}", daemon=True).start()
+    return stop
+
+
+def _work(path, threads):
+    """Entry point of one worker process"""
+    stop = threading.Event()
+    # Finish the job in hand on SIGTERM; an unfinished one is retried after its lease expires
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    queue = JobQueue(path)
+    cache = cache_from_env()
+    store = results_store.get_store()
+    workers = [threading.Thread(target=Worker(queue, cache=cache, store=store).run, args=(stop,))
+               for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run or inspect the analysis job queue")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite queue file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    work = commands.add_parser("work", help="drain the queue")
+    work.add_argument("--workers", type=int, default=1, help="worker processes")
+    work.add_argument("--threads", type=int, default=1, help="jobs run at once per worker process")
+    commands.add_parser("status", help="print the number of jobs in each status")
+    show = commands.add_parser("show", help="print one job as JSON")
+    show.add_argument("job_id")
+    args = parser.parse_args(argv)
+
+    load_dotenv(encoding='utf-8')
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    if args.command == "status":
+        print(json.dumps(JobQueue(args.queue).counts()))
+        return 0
+    if args.command == "show":
+        job = JobQueue(args.queue).get(args.job_id)
+        if job is None:
+            print(f"No job {args.job_id}", file=sys.stderr)
+            return 1
+        print(json.dumps(job, indent=2))
+        return 0
+
+    metrics.start_exporters_from_env()
+    if args.workers <= 1:
+        _work(args.queue, args.threads)
+        return 0
+    processes = [multiprocessing.Process(target=_work, args=(args.queue, args.threads))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,630 @@
+"""Interchangeable LLM backends behind one interface.
+
+The analyzer talks to an LLMBackend rather than a specific SDK, so the
+Anthropic API, Groq and a local mock can be swapped with LLM_BACKEND. Every
+backend takes the same prompt (a list of system text blocks plus the user
+message) and returns a Completion with the response text and token usage.
+Provider errors are re-raised as BackendError so the scheduler can apply one
+retry policy regardless of SDK.
+
+Setting LLM_HEDGE_BACKEND wraps the primary in a HedgedBackend: if the
+primary has not answered by its observed p95 latency, the same request is
+sent to the hedge backend (or a second replica of the primary) and whichever
+answers first wins.
+
+Under an analysis deadline (see deadline.py) each request is sent with the
+time left as its timeout, and streams stop at the next chunk once the
+deadline has passed or been cancelled.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import deadline
+import llm_client
+
+ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-haiku-20240307')
+GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
+
+HEDGE_QUANTILE = float(os.getenv('LLM_HEDGE_QUANTILE', '0.95'))
+# Used until enough latencies have been observed to estimate the quantile
+HEDGE_INITIAL_DELAY = float(os.getenv('LLM_HEDGE_DELAY_SECONDS', '10'))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+# Async calls to backends without a native async client run on these threads
+# rather than the event loop's default executor, which admission waiters and
+# other work share
+_sync_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_MAX_CONCURRENCY', '16')),
+                                    thread_name_prefix="llm-sync")
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+class BackendError(Exception):
+    """A failed LLM call; status_code/retry_after/retriable drive the retry policy"""
+
+    def __init__(self, message, status_code=None, retry_after=None, retriable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retriable = retriable
+
+
+class DeadlineExceeded(BackendError):
+    """The analysis ran out of time or was cancelled before the call finished; never retried"""
+
+    def __init__(self, message="The analysis ran out of time before this request finished"):
+        super().__init__(message)
+
+
+def check_deadline(current=None):
+    """Raise DeadlineExceeded if the deadline (by default the one in effect) has passed or was cancelled"""
+    current = current or deadline.current()
+    if current is not None and current.cancelled:
+        raise DeadlineExceeded("The analysis was cancelled before this request finished")
+    if current is not None and current.expired():
+        raise DeadlineExceeded()
+
+
+def wrap_api_error(error):
+    """Convert an Anthropic or Groq SDK error (both share one error hierarchy) to BackendError"""
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after")) if headers.get("retry-after") is not None else None
+    except ValueError:
+        retry_after = None
+    # No status code means the request never got a response (timeout, reset)
+    retriable = status is None or status == 429 or status >= 500
+    return BackendError(f"API Error: {error}", status, retry_after, retriable)
+
+
+class Completion:
+    """Response text plus token usage in Anthropic's field names"""
+
+    def __init__(self, text, usage=None, backend=None):
+        self.text = text
+        self.usage = {field: (usage or {}).get(field, 0) or 0 for field in USAGE_FIELDS}
+        self.backend = backend
+
+
+class CompletionStream:
+    """Iterate text chunks; .completion is set once the stream is exhausted"""
+
+    def __init__(self, chunks):
+        # chunks is a generator that yields text and returns a Completion
+        self._chunks = chunks
+        self.completion = None
+
+    def __iter__(self):
+        self.completion = yield from self._chunks
+
+
+class LLMBackend:
+    """Interface shared by every backend"""
+
+    name = "base"
+    model = None
+
+    def check_config(self):
+        """Raise BackendError if the backend cannot be used (missing key or package)"""
+
+    def complete(self, system, prompt, max_tokens, temperature):
+        raise NotImplementedError
+
+    async def acomplete(self, system, prompt, max_tokens, temperature):
+        # Backends without a native async client run in a worker thread, keeping the deadline in effect
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_sync_executor, contextvars.copy_context().run, self.complete,
+                                          system, prompt, max_tokens, temperature)
+
+    def stream(self, system, prompt, max_tokens, temperature):
+        # Backends without native streaming deliver the whole response as one chunk
+        def chunks():
+            completion = self.complete(system, prompt, max_tokens, temperature)
+            yield completion.text
+            return completion
+        return CompletionStream(chunks())
+
+
+def with_timeout(kwargs):
+    """Add the time left before the deadline in effect as the request's timeout"""
+    timeout = deadline.remaining()
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    return kwargs
+
+
+def system_text(system):
+    """Flatten Anthropic-style system blocks into a single string"""
+    if isinstance(system, str):
+        return system
+    return "\n\n".join(block["text"] for block in system)
+
+
+class AnthropicBackend(LLMBackend):
+    """Claude via the pooled clients in llm_client; the SDK is imported on first call"""
+
+    name = "anthropic"
+
+    def __init__(self, model=ANTHROPIC_MODEL, client=None, async_client=None):
+        self.model = model
+        self._client = client
+        self._async_client = async_client
+
+    def check_config(self):
+        if self._client is None and self._async_client is None and not os.getenv('ANTHROPIC_API_KEY'):
+            raise BackendError("Anthropic API key not found. Please check your .env file.")
+
+    def _kwargs(self, system, prompt, max_tokens, temperature):
+        return with_timeout(dict(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": prompt}],
+            # Newer SDK releases dropped the temperature argument; sending it
+            # in the body keeps the request identical on every SDK version
+            extra_body={"temperature": temperature},
+        ))
+
+    def _completion(self, message):
+        usage = message.usage
+        counts = {field: getattr(usage, field, 0) for field in USAGE_FIELDS} if usage is not None else None
+        return Completion(message.content[0].text, counts, self.name)
+
+    def complete(self, system, prompt, max_tokens, temperature):
+        import anthropic
+
+        self.check_config()
+        client = self._client or llm_client.get_client()
+        try:
+            with llm_client.get_manager().track():
+                message = client.messages.create(**self._kwargs(system, prompt, max_tokens, temperature))
+        except anthropic.APIError as error:
+            raise wrap_api_error(error)
+        return self._completion(message)
+
+    async def acomplete(self, system, prompt, max_tokens, temperature):
+        import anthropic
+
+        self.check_config()
+        client = self._async_client or llm_client.get_async_client()
+        try:
+            with llm_client.get_manager().track():
+                message = await client.messages.create(**self._kwargs(system, prompt, max_tokens, temperature))
+        except anthropic.APIError as error:
+            raise wrap_api_error(error)
+        return self._completion(message)
+
+    def stream(self, system, prompt, max_tokens, temperature):
+        import anthropic
+
+        def chunks():
+            self.check_config()
+            client = self._client or llm_client.get_client()
+            try:
+                with llm_client.get_manager().track():
+                    with client.messages.stream(**self._kwargs(system, prompt, max_tokens, temperature)) as stream:
+                        yield from stream.text_stream
+                        message = stream.get_final_message()
+            except anthropic.APIError as error:
+                raise wrap_api_error(error)
+            return self._completion(message)
+        return CompletionStream(chunks())
+
+
+class GroqBackend(LLMBackend):
+    """Open models on Groq's OpenAI-compatible chat completions API"""
+
+    name = "groq"
+
+    def __init__(self, model=GROQ_MODEL, client=None, async_client=None):
+        self.model = model
+        self._client = client
+        self._async_client = async_client
+        # httpx async pools are bound to their event loop, so each loop gets its own client
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def check_config(self):
+        if self._client is not None or self._async_client is not None:
+            return
+        try:
+            import groq  # noqa: F401
+        except ImportError:
+            raise BackendError("The groq package is not installed. Run `pip install groq` to use LLM_BACKEND=groq.")
+        if not os.getenv('GROQ_API_KEY'):
+            raise BackendError("Groq API key not found. Please check your .env file.")
+
+    def _get_client(self):
+        self.check_config()
+        with self._lock:
+            if self._client is None:
+                import groq
+                self._client = groq.Groq(api_key=os.getenv('GROQ_API_KEY'), max_retries=0)
+            return self._client
+
+    def _get_async_client(self):
+        if self._async_client is not None:
+            return self._async_client
+        self.check_config()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                import groq
+                client = self._async_clients[loop] = groq.AsyncGroq(api_key=os.getenv('GROQ_API_KEY'),
+                                                                    max_retries=0)
+                llm_client.close_with_loop(client)
+            return client
+
+    def _kwargs(self, system, prompt, max_tokens, temperature):
+        return with_timeout(dict(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[
+                {"role": "system", "content": system_text(system)},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+        ))
+
+    @staticmethod
+    def _usage(usage):
+        if usage is None:
+            return None
+        return {"input_tokens": usage.prompt_tokens, "output_tokens": usage.completion_tokens}
+
+    def complete(self, system, prompt, max_tokens, temperature):
+        import groq
+
+        client = self._get_client()
+        try:
+            response = client.chat.completions.create(**self._kwargs(system, prompt, max_tokens, temperature))
+        except groq.APIError as error:
+            raise wrap_api_error(error)
+        return Completion(response.choices[0].message.content, self._usage(response.usage), self.name)
+
+    async def acomplete(self, system, prompt, max_tokens, temperature):
+        import groq
+
+        if self._async_client is None and self._client is not None:
+            # Only a sync client was supplied
+            return await super().acomplete(system, prompt, max_tokens, temperature)
+        client = self._get_async_client()
+        try:
+            response = await client.chat.completions.create(**self._kwargs(system, prompt, max_tokens, temperature))
+        except groq.APIError as error:
+            raise wrap_api_error(error)
+        return Completion(response.choices[0].message.content, self._usage(response.usage), self.name)
+
+    def stream(self, system, prompt, max_tokens, temperature):
+        import groq
+
+        def chunks():
+            client = self._get_client()
+            parts = []
+            usage = None
+            try:
+                for chunk in client.chat.completions.create(
+                        stream=True, **self._kwargs(system, prompt, max_tokens, temperature)):
+                    # Groq reports usage on the final chunk under x_groq
+                    usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            except groq.APIError as error:
+                raise wrap_api_error(error)
+            return Completion("".join(parts), self._usage(usage), self.name)
+        return CompletionStream(chunks())
+
+
+class MockBackend(LLMBackend):
+    """Offline stand-in that answers from the local keyword scorer.
+
+    Useful for development without an API key, demos and load tests. latency
+    (plus up to `jitter` extra seconds) is slept before answering; respond
+    can be any callable (system, prompt) -> str to script the reply.
+    """
+
+    name = "mock"
+    model = "mock"
+
+    def __init__(self, respond=None, latency=None, jitter=0.0, chunk_size=40):
+        self.respond = respond or self._score_locally
+        self.latency = float(os.getenv('MOCK_LLM_LATENCY_SECONDS', '0')) if latency is None else latency
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _score_locally(system, prompt):
+        import scoring
+
+        # The last system block is the job description under a one-line heading
+        job_description = system_text(system[-1:] if isinstance(system, list) else system).split("\n", 1)[-1]
+        scores = scoring.score_resume(prompt, job_description)
+        percent = scores["match_score"]
+        analysis = {
+            "strengths": [f"Mentions {keyword}" for keyword in scores["matched_keywords"][:5]],
+            "weaknesses": [f"No evidence of {keyword}" for keyword in scores["missing_keywords"][:5]],
+            "suggestions": [f"Add concrete results involving {keyword}" for keyword in scores["missing_keywords"][:3]],
+            "match_score": percent,
+            "ats_compatibility": scores["keyword_coverage"],
+            "skill_matches": scores["skill_matches"],
+            "missing_keywords": scores["missing_keywords"],
+            "action_verbs": {"used": [], "recommended": []},
+            "education_alignment": {"score": percent, "feedback": "Estimated locally by the mock backend."},
+            "experience_alignment": {"score": percent, "feedback": "Estimated locally by the mock backend."},
+            "format_score": {"score": percent, "issues": [], "positives": []},
+        }
+        # Answer only the keys a section prompt asks for, like the real model would
+        requested = re.search(r"only these keys[^:]*: ([\w, ]+)", prompt)
+        if requested:
+            keys = [key.strip() for key in requested.group(1).split(",")]
+            analysis = {key: value for key, value in analysis.items() if key in keys}
+        return json.dumps(analysis)
+
+    def _delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def _completion(self, system, prompt, text):
+        usage = {"input_tokens": len(system_text(system) + prompt) // 4, "output_tokens": len(text) // 4}
+        return Completion(text, usage, self.name)
+
+    def _sleep(self):
+        # Like a real request, give up once the deadline in effect has passed
+        current = deadline.current()
+        if current is None:
+            time.sleep(self._delay())
+        elif not current.sleep(self._delay()):
+            check_deadline()
+
+    def complete(self, system, prompt, max_tokens, temperature):
+        self._sleep()
+        return self._completion(system, prompt, self.respond(system, prompt))
+
+    async def acomplete(self, system, prompt, max_tokens, temperature):
+        await asyncio.sleep(self._delay())
+        return self._completion(system, prompt, self.respond(system, prompt))
+
+    def stream(self, system, prompt, max_tokens, temperature):
+        def chunks():
+            self._sleep()
+            text = self.respond(system, prompt)
+            for start in range(0, len(text), self.chunk_size):
+                yield text[start:start + self.chunk_size]
+            return self._completion(system, prompt, text)
+        return CompletionStream(chunks())
+
+
+class LatencyTracker:
+    """Sliding window of response latencies with a quantile estimate"""
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, default):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgedBackend(LLMBackend):
+    """Send a backup request when the primary is slower than its p95, and take the first answer.
+
+    Sync calls run both requests on a small thread pool; the losing request
+    is left to finish in the background because the SDKs cannot abort a
+    blocking call. Async losers are cancelled. Streams are hedged on time to
+    first chunk, after which the slower stream is closed.
+    """
+
+    name = "hedged"
+
+    def __init__(self, primary, hedge, quantile=HEDGE_QUANTILE, initial_delay=HEDGE_INITIAL_DELAY):
+        self.primary = primary
+        self.hedge = hedge
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.model = primary.model if primary.model == hedge.model else f"{primary.model}|{hedge.model}"
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+
+    def check_config(self):
+        self.primary.check_config()
+        self.hedge.check_config()
+
+    def hedge_delay(self):
+        """Seconds to wait on the primary before sending the backup request"""
+        return self.latency.quantile(self.quantile, self.initial_delay)
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def complete(self, system, prompt, max_tokens, temperature):
+        self._count("requests")
+        started = time.monotonic()
+        args = (system, prompt, max_tokens, temperature)
+        first = self._executor.submit(self.primary.complete, *args)
+        done, _ = wait([first], timeout=self.hedge_delay())
+        if done:
+            # Primary answered in time (or failed fast; the scheduler retries)
+            completion = first.result()
+            self.latency.record(time.monotonic() - started)
+            return completion
+
+        self._count("hedged")
+        second = self._executor.submit(self.hedge.complete, *args)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    self.latency.record(time.monotonic() - started)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def acomplete(self, system, prompt, max_tokens, temperature):
+        self._count("requests")
+        started = time.monotonic()
+        args = (system, prompt, max_tokens, temperature)
+        first = asyncio.ensure_future(self.primary.acomplete(*args))
+        done, _ = await asyncio.wait([first], timeout=self.hedge_delay())
+        if done:
+            completion = first.result()
+            self.latency.record(time.monotonic() - started)
+            return completion
+
+        self._count("hedged")
+        second = asyncio.ensure_future(self.hedge.acomplete(*args))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        self.latency.record(time.monotonic() - started)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, system, prompt, max_tokens, temperature):
+        args = (system, prompt, max_tokens, temperature)
+
+        def chunks():
+            self._count("requests")
+            started = time.monotonic()
+            events = queue.Queue()
+            stop = threading.Event()
+
+            def pump(index, backend):
+                # Runs on a worker thread, forwarding ("chunk" | "done" | "error", payload)
+                stream = backend.stream(*args)
+                iterator = iter(stream)
+                try:
+                    for text in iterator:
+                        if stop.is_set():
+                            return
+                        events.put((index, "chunk", text))
+                    events.put((index, "done", stream.completion))
+                except Exception as error:
+                    events.put((index, "error", error))
+                finally:
+                    iterator.close()
+
+            self._executor.submit(pump, 0, self.primary)
+            running = 1
+            winner = None
+            error = None
+            timeout = self.hedge_delay()
+            try:
+                while True:
+                    try:
+                        index, kind, payload = events.get(timeout=timeout)
+                    except queue.Empty:
+                        # No first chunk from the primary by the hedge delay
+                        self._count("hedged")
+                        self._executor.submit(pump, 1, self.hedge)
+                        running += 1
+                        timeout = None
+                        continue
+                    if winner is not None and index != winner:
+                        continue
+                    if kind == "error":
+                        running -= 1
+                        if winner is not None or timeout is not None:
+                            # The winner broke mid-stream, or the primary failed
+                            # before the hedge fired; let the scheduler retry
+                            raise payload
+                        error = error or payload
+                        if running == 0:
+                            raise error
+                        continue
+                    if winner is None:
+                        winner = index
+                        timeout = None
+                        if index == 1:
+                            self._count("hedge_wins")
+                        self.latency.record(time.monotonic() - started)
+                    if kind == "chunk":
+                        yield payload
+                    else:
+                        return payload
+            finally:
+                stop.set()
+        return CompletionStream(chunks())
+
+    def stats(self):
+        """Return request, hedge and hedge-win counters plus the current hedge delay"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedge_delay"] = self.hedge_delay()
+        return stats
+
+
+BACKENDS = {
+    "anthropic": AnthropicBackend,
+    "groq": GroqBackend,
+    "mock": MockBackend,
+}
+
+
+def create_backend(name):
+    """Build a backend by name: anthropic, groq or mock"""
+    try:
+        return BACKENDS[name.strip().lower()]()
+    except KeyError:
+        raise BackendError(f"Unknown LLM backend {name!r}; choose one of {', '.join(BACKENDS)}.")
+
+
+def backend_from_env():
+    """Build the configured backend, hedged when LLM_HEDGE_BACKEND is set"""
+    backend = create_backend(os.getenv('LLM_BACKEND', 'anthropic'))
+    hedge = os.getenv('LLM_HEDGE_BACKEND')
+    if hedge:
+        backend = HedgedBackend(backend, create_backend(hedge))
+    return backend
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend selected by LLM_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_env()
+        return _backend
@@ -0,0 +1,161 @@
+"""Process-wide pooled Anthropic clients.
+
+Creating anthropic.Anthropic() per analysis opens a fresh connection pool and
+pays a TLS handshake every time. The ClientManager here builds one sync
+client per process and one async client per event loop, each with keep-alive
+connection limits, so the Streamlit app and batch runs reuse connections. An
+async client is closed when asyncio.run() finishes its loop, so a batch run
+does not leave its sockets open until garbage collection.
+Modules stay loaded across Streamlit reruns, so the manager is shared by every
+session in the server process. SDK retries are turned off because
+llm_scheduler owns the retry policy. The SDK itself is imported on first use,
+since it takes over a second to load and the app should paint without it.
+"""
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
+MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '60'))
+
+_closers = set()
+
+
+async def _close_on_shutdown(client):
+    """Wait until cancelled, then close client; asyncio.run() cancels leftover tasks before closing its loop"""
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.close()
+
+
+def close_with_loop(client):
+    """Close an async client when the running event loop shuts down"""
+    task = asyncio.get_running_loop().create_task(_close_on_shutdown(client))
+    # The loop only keeps weak references to tasks; a collected closer would close the client mid-run
+    _closers.add(task)
+    task.add_done_callback(_closers.discard)
+
+
+class ClientManager:
+    """Owns the shared sync client, per-loop async clients and pool metrics"""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS,
+                 max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=KEEPALIVE_EXPIRY):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0}
+        self._usage = {"input_tokens": 0, "output_tokens": 0,
+                       "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+    def _limits(self):
+        # Use the SDK's own Limits class so this works with whichever httpx
+        # build the installed anthropic release depends on
+        import anthropic
+
+        limits_cls = type(anthropic.DEFAULT_CONNECTION_LIMITS)
+        return limits_cls(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def get_client(self, api_key=None):
+        """Return the shared synchronous client, creating it on first use"""
+        import anthropic
+
+        with self._lock:
+            if self._client is None:
+                self._client = anthropic.Anthropic(
+                    api_key=api_key or os.getenv('ANTHROPIC_API_KEY'),
+                    max_retries=0,
+                    http_client=anthropic.DefaultHttpxClient(limits=self._limits()),
+                )
+            return self._client
+
+    def get_async_client(self, api_key=None):
+        """Return the async client for the running event loop, creating it on first use.
+
+        httpx async pools are bound to the loop they were created on, so each
+        loop (e.g. each asyncio.run in a batch) gets its own client.
+        """
+        import anthropic
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = anthropic.AsyncAnthropic(
+                    api_key=api_key or os.getenv('ANTHROPIC_API_KEY'),
+                    max_retries=0,
+                    http_client=anthropic.DefaultAsyncHttpxClient(limits=self._limits()),
+                )
+                self._async_clients[loop] = client
+                close_with_loop(client)
+            return client
+
+    @contextmanager
+    def track(self):
+        """Count one in-flight request around a sync or awaited client call"""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+
+    def record_usage(self, counts):
+        """Add one response's token usage to the process-wide totals"""
+        with self._lock:
+            for field, value in counts.items():
+                self._usage[field] = self._usage.get(field, 0) + value
+
+    def stats(self):
+        """Return request counters, token usage totals and pool utilization"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(self._usage)
+            stats["async_clients"] = len(self._async_clients)
+            stats["sync_client"] = self._client is not None
+        stats["max_connections"] = self.max_connections
+        stats["utilization"] = stats["in_flight"] / self.max_connections
+        stats["peak_utilization"] = stats["peak_in_flight"] / self.max_connections
+        return stats
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Return the process-wide ClientManager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ClientManager()
+        return _manager
+
+
+def get_client(api_key=None):
+    """Shortcut for get_manager().get_client()"""
+    return get_manager().get_client(api_key)
+
+
+def get_async_client(api_key=None):
+    """Shortcut for get_manager().get_async_client()"""
+    return get_manager().get_async_client(api_key)
@@ -0,0 +1,326 @@
+"""Central admission control and retry policy for every LLM call.
+
+All analyses go through one process-wide LLMScheduler:
+
+* token buckets cap requests/minute and input tokens/minute,
+* a priority queue lets interactive UI requests jump ahead of batch jobs,
+* the concurrency limit adapts to errors (halved on 429/overload, raised by
+  one after a run of successes), and
+* retriable failures back off exponentially with full jitter, honoring the
+  server's retry-after header and pausing every caller after a 429.
+
+The SDK's own retries are disabled in llm_client so they don't compound with
+these. Backends report failures as llm_backends.BackendError, so one policy
+covers every provider.
+
+Under an analysis deadline (see deadline.py) a call gives up with
+DeadlineExceeded instead of waiting for a slot past the deadline, and a
+failure is not retried when the backoff would outlast it.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import deadline
+from llm_backends import BackendError, DeadlineExceeded, check_deadline
+
+INTERACTIVE = 0
+BATCH = 10
+
+REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '50'))
+TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '50000'))
+MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+MIN_CONCURRENCY = 1
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` tokens are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+def is_retriable(error):
+    """Rate limits, overloads, 5xx, timeouts and dropped connections are worth retrying"""
+    if getattr(error, "retriable", False):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def retry_after_seconds(error):
+    """Return the server's retry-after delay for an error, if it sent one"""
+    value = getattr(error, "retry_after", None)
+    return max(0.0, value) if value is not None else None
+
+
+class LLMScheduler:
+    """Priority admission queue with rate limits, adaptive concurrency and retries"""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.concurrency_limit = max_concurrency
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._successes = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        # ticket -> (loop, Future) of async waiters, resolved by _notify
+        self._async_waiters = {}
+        self._stats = {"admitted": 0, "throttled": 0, "retries": 0, "failures": 0}
+
+    # Admission -----------------------------------------------------------
+
+    def _notify(self):
+        """Wake every waiter, blocked threads and event-loop waiters alike; called with the lock held"""
+        self._cond.notify_all()
+        for loop, future in self._async_waiters.values():
+            loop.call_soon_threadsafe(_wake, future)
+        self._async_waiters.clear()
+
+    def _admit(self, ticket, tokens, throttled):
+        """Admit ticket if it is first in line and the limits allow; returns (admitted, seconds to wait or None)"""
+        if self._waiters[0] != ticket or self._in_flight >= self.concurrency_limit:
+            return False, None
+        now = time.monotonic()
+        timeout = max(
+            self._paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+        if timeout > 0:
+            return False, timeout
+        heapq.heappop(self._waiters)
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        self._stats["throttled"] += throttled
+        self._notify()
+        return True, None
+
+    def _leave(self, ticket):
+        """Give up ticket's place in line"""
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._notify()
+
+    def _acquire(self, priority, tokens, current=None):
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            throttled = False
+            while True:
+                if current is not None and current.done():
+                    # Out of time (or cancelled) while queued: give up the place in line
+                    self._leave(ticket)
+                    check_deadline(current)
+                admitted, timeout = self._admit(ticket, tokens, throttled)
+                if admitted:
+                    return
+                throttled = True
+                if current is not None:
+                    # Wake up in time to notice the deadline passing or being cancelled
+                    timeout = deadline.POLL_SECONDS if timeout is None else min(timeout, deadline.POLL_SECONDS)
+                self._cond.wait(timeout)
+
+    async def _aacquire(self, priority, tokens, current=None):
+        """Async variant of _acquire: waits on the event loop for a Future that _notify resolves"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+        throttled = False
+        try:
+            while True:
+                with self._cond:
+                    if current is not None and current.done():
+                        self._leave(ticket)
+                        check_deadline(current)
+                    admitted, timeout = self._admit(ticket, tokens, throttled)
+                    if admitted:
+                        self._async_waiters.pop(ticket, None)
+                        return
+                    wake = loop.create_future()
+                    self._async_waiters[ticket] = (loop, wake)
+                throttled = True
+                if current is not None:
+                    timeout = deadline.POLL_SECONDS if timeout is None else min(timeout, deadline.POLL_SECONDS)
+                await asyncio.wait([wake], timeout=timeout)
+        except asyncio.CancelledError:
+            with self._cond:
+                self._async_waiters.pop(ticket, None)
+                if ticket in self._waiters:
+                    self._leave(ticket)
+            raise
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._notify()
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, tokens=0):
+        """Block until a request may be sent, and hold a concurrency slot while it runs"""
+        self._acquire(priority, tokens, deadline.current())
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, priority=BATCH, tokens=0):
+        """Async variant of slot(); waiting happens on the event loop, not on a thread"""
+        await self._aacquire(priority, tokens, deadline.current())
+        try:
+            yield
+        finally:
+            self._release()
+
+    # Feedback ------------------------------------------------------------
+
+    def reconcile_tokens(self, estimated, actual):
+        """Charge the token bucket for the difference between estimated and actual usage"""
+        with self._cond:
+            self.tokens.take(actual - estimated)
+
+    def record_success(self):
+        """Additive increase: raise the concurrency limit after a run of successes"""
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                self.concurrency_limit += 1
+                self._successes = 0
+                self._notify()
+
+    def backoff(self, error, attempt):
+        """Return seconds to wait before retrying, or None if the error should be raised"""
+        with self._cond:
+            if not is_retriable(error) or attempt >= self.max_retries:
+                self._stats["failures"] += 1
+                return None
+            # Multiplicative decrease on any retriable failure
+            self.concurrency_limit = max(MIN_CONCURRENCY, self.concurrency_limit // 2)
+            self._successes = 0
+            delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if getattr(error, "status_code", None) == 429:
+                # Everyone backs off after a 429, not just the caller that saw it
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._stats["retries"] += 1
+            return delay
+
+    # Convenience wrappers ---------------------------------------------------
+
+    def call(self, fn, priority=INTERACTIVE, tokens=0):
+        """Run fn() under admission control, retrying retriable API errors"""
+        attempt = 0
+        while True:
+            try:
+                with self.slot(priority, tokens):
+                    result = fn()
+                self.record_success()
+                return result
+            except DeadlineExceeded:
+                raise
+            except BackendError as error:
+                delay = self.backoff(error, attempt)
+                if delay is None:
+                    raise
+                current = deadline.current()
+                if current is None:
+                    time.sleep(delay)
+                elif delay >= current.remaining() or not current.sleep(delay):
+                    # No time left for another attempt; the original error says more than a timeout
+                    raise
+                attempt += 1
+
+    async def acall(self, fn, priority=BATCH, tokens=0):
+        """Await fn() under admission control, retrying retriable API errors"""
+        attempt = 0
+        while True:
+            try:
+                async with self.aslot(priority, tokens):
+                    result = await fn()
+                self.record_success()
+                return result
+            except DeadlineExceeded:
+                raise
+            except BackendError as error:
+                delay = self.backoff(error, attempt)
+                if delay is None:
+                    raise
+                current = deadline.current()
+                if current is None:
+                    await asyncio.sleep(delay)
+                elif delay >= current.remaining() or not await current.asleep(delay):
+                    raise
+                attempt += 1
+
+    def stats(self):
+        """Return admission, retry and concurrency counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+            stats["queued"] = len(self._waiters)
+            stats["concurrency_limit"] = self.concurrency_limit
+            stats["paused_for"] = max(0.0, self._paused_until - time.monotonic())
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide LLMScheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Replace the process-wide LLMScheduler, e.g. with a worker's share of the limits"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
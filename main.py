@@ -1,7 +1,12 @@
 import streamlit as st
-import PyPDF2
 import io
-from groq import Groq
+import os
+from dotenv import load_dotenv
+import analyzer
+import llm_backends
+import pdf_extract
+
+load_dotenv()
 
 # Configure page settings
 st.set_page_config(
@@ -31,48 +36,17 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize Groq client
-client = Groq(
-    api_key='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'
-)
+# Same analysis pipeline as app.py; this page defaults to the Groq backend
+@st.cache_resource
+def get_backend(name):
+    """Build the backend, and its API client, once per server process rather than on every rerun"""
+    return llm_backends.create_backend(name)
 
 def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+    return pdf_extract.extract_text(pdf_file)
 
 def analyze_resume(resume_text, job_description):
-    prompt = f"""
-    Analyze the following resume against the job description:
-    
-    Resume:
-    {resume_text}
-    
-    Job Description:
-    {job_description}
-    
-    Please provide:
-    1. Key strengths matching the job requirements
-    2. Areas of improvement or missing skills
-    3. Specific suggestions to improve the resume
-    4. Overall match percentage
-    """
-    
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        model="llama-guard-3-8b",
-        temperature=0.5,
-        max_tokens=2048
-    )
-    
-    return response.choices[0].message.content
+    return analyzer.analyze(resume_text, job_description, backend=get_backend(os.getenv('LLM_BACKEND', 'groq')))
 
 # App header
 st.title("🎯 Smart Resume Analyzer")
@@ -97,7 +71,7 @@ if st.button("🔍 Analyze Resume"):
                 # Extract text from PDF
                 resume_text = extract_text_from_pdf(uploaded_file)
                 
-                # Get analysis from Groq
+                # Get analysis from the configured backend
                 analysis = analyze_resume(resume_text, job_description)
                 
                 # Display results in an organized manner
@@ -106,13 +80,10 @@ if st.button("🔍 Analyze Resume"):
                 # Create tabs for different sections
                 tab1, tab2, tab3 = st.tabs(["Strengths", "Areas for Improvement", "Suggestions"])
                 
-                # Split the analysis into sections (assuming the API returns formatted text)
-                sections = analysis.split("\n\n")
-                
                 with tab1:
                     st.markdown("### 💪 Key Strengths")
-                    strengths = sections[0] if len(sections) > 0 else "No strengths identified"
-                    st.write(strengths)
+                    strengths = "\n".join(f"- {item}" for item in analysis.get("strengths", [])) or "No strengths identified"
+                    st.markdown(strengths)
                     if strengths != "No strengths identified":
                         st.markdown("#### Suggested Improvements:")
                         st.write("- Quantify your achievements with specific metrics")
@@ -121,8 +92,8 @@ if st.button("🔍 Analyze Resume"):
                 
                 with tab2:
                     st.markdown("### 🎯 Areas for Improvement")
-                    improvements = sections[1] if len(sections) > 1 else "No improvements suggested"
-                    st.write(improvements)
+                    improvements = "\n".join(f"- {item}" for item in analysis.get("weaknesses", [])) or "No improvements suggested"
+                    st.markdown(improvements)
                     if improvements != "No improvements suggested":
                         st.markdown("#### How to Address:")
                         st.write("- Focus on developing skills mentioned in the job description")
@@ -131,8 +102,8 @@ if st.button("🔍 Analyze Resume"):
                 
                 with tab3:
                     st.markdown("### 💡 Suggestions")
-                    suggestions = sections[2] if len(sections) > 2 else "No specific suggestions"
-                    st.write(suggestions)
+                    suggestions = "\n".join(f"- {item}" for item in analysis.get("suggestions", [])) or "No specific suggestions"
+                    st.markdown(suggestions)
                     if suggestions != "No specific suggestions":
                         st.markdown("#### Action Items:")
                         st.write("- Tailor your resume format for better readability")
@@ -140,10 +111,12 @@ if st.button("🔍 Analyze Resume"):
                         st.write("- Ensure your resume aligns with industry standards")
                 
                 # Display match percentage if available
-                if len(sections) > 3:
+                if isinstance(analysis.get("match_score"), (int, float)):
                     st.markdown("### 📈 Overall Match")
-                    st.progress(float(sections[3].strip("%"))/100 if "%" in sections[3] else 0.5)
+                    st.progress(min(max(analysis["match_score"], 0), 100) / 100)
                     
+            except analyzer.AnalysisError as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"An error occurred during analysis: {str(e)}")
     else:
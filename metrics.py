@@ -0,0 +1,325 @@
+"""Per-stage timing spans and counters for the analysis pipeline.
+
+Every stage (PDF extraction, local scoring, prompt compaction, the LLM call,
+parsing, rendering) runs inside span(), which records a duration histogram
+and an error counter and emits one structured JSON log line on the
+"metrics" logger. Token usage, analysis-cache lookups and live pool and
+scheduler gauges are tracked alongside.
+
+Metrics are exposed in Prometheus text format:
+
+* METRICS_PORT starts an HTTP endpoint serving GET /metrics, and
+* METRICS_TEXTFILE names a file rewritten by flush(), for node_exporter's
+  textfile collector.
+
+Both are started once per process by start_exporters_from_env(). Pre-forked
+workers (see analysis_service.py) each pass their index: worker N serves on
+METRICS_PORT + N, writes its own textfile and labels its series worker="N".
+"""
+import asyncio
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "resumechecker_"
+
+logger = logging.getLogger("metrics")
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    """Thread-safe counters and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        # (name, value) labels added to every series, e.g. the worker index
+        self.const_labels = ()
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        """Record one observation in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                     "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(histogram["buckets"], value)
+            if index < len(histogram["counts"]):
+                histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def register_collector(self, collect):
+        """Add a callable yielding (name, kind, help, labels, value) samples, read at every export"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(h, counts=list(h["counts"]))) for key, h in self._histograms.items())
+            collectors = list(self._collectors)
+
+        described = set()
+        const = self.const_labels
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            help_text = self._help.get(name, (kind, name))[1]
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(const + labels)} {value}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            labels = const + labels
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+        for collect in collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                logger.exception("Metrics collector failed")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                self._help.setdefault(name, (kind, help_text))
+                header(name, kind)
+                lines.append(f"{PREFIX}{name}{_format_labels(const + _label_key(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.describe("stage_duration_seconds", "histogram", "Wall time of each analysis pipeline stage")
+REGISTRY.describe("stage_errors_total", "counter", "Pipeline stages that raised an exception")
+REGISTRY.describe("llm_tokens_total", "counter", "LLM tokens by type, as reported in response usage")
+REGISTRY.describe("analysis_cache_requests_total", "counter", "Analysis cache lookups by result (hit or miss)")
+REGISTRY.describe("stream_first_section_seconds", "histogram", "Time from request to the first streamed section")
+REGISTRY.describe("analysis_repairs_total", "counter", "LLM responses repaired, by kind (truncation or followup)")
+REGISTRY.describe("coalesced_requests_total", "counter",
+                  "LLM requests that joined an identical request already in flight, by kind")
+REGISTRY.describe("revision_analyses_total", "counter",
+                  "Re-analyses of a revised resume, by mode (incremental or full)")
+REGISTRY.describe("batch_duplicates_total", "counter", "Batch resumes that reused a near-duplicate's analysis")
+REGISTRY.describe("analysis_deadlines_total", "counter",
+                  "Analyses cut short, by stage and reason (expired or cancelled)")
+
+
+@contextmanager
+def trace():
+    """Tag every span logged inside the block with one request id"""
+    token = _trace_id.set(uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a pipeline stage; yields a dict the caller can add log fields to"""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except (GeneratorExit, KeyboardInterrupt):
+        status = "cancelled"
+        raise
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status = "error"
+        REGISTRY.inc("stage_errors_total", stage=stage, error=type(e).__name__)
+        fields["error"] = str(e)[:200]
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        REGISTRY.observe("stage_duration_seconds", duration, stage=stage)
+        record = {"event": "span", "stage": stage, "status": status, "duration_ms": round(duration * 1000, 2)}
+        if _trace_id.get():
+            record["trace_id"] = _trace_id.get()
+        record.update(fields)
+        logger.info(json.dumps(record, default=str))
+
+
+def record_tokens(counts, backend="unknown"):
+    """Count one response's token usage by type"""
+    for field, value in counts.items():
+        if value:
+            REGISTRY.inc("llm_tokens_total", value, type=field.replace("_tokens", ""), backend=backend)
+
+
+def record_cache_lookup(hit):
+    REGISTRY.inc("analysis_cache_requests_total", result="hit" if hit else "miss")
+
+
+def observe_first_section(seconds):
+    REGISTRY.observe("stream_first_section_seconds", seconds)
+
+
+def record_repair(kind):
+    REGISTRY.inc("analysis_repairs_total", kind=kind)
+
+
+def record_duplicate():
+    REGISTRY.inc("batch_duplicates_total")
+
+
+def record_coalesced(kind):
+    REGISTRY.inc("coalesced_requests_total", kind=kind)
+
+
+def record_revision(mode):
+    REGISTRY.inc("revision_analyses_total", mode=mode)
+
+
+def record_deadline(stage, reason):
+    REGISTRY.inc("analysis_deadlines_total", stage=stage or "unknown", reason=reason)
+
+
+def _runtime_gauges():
+    """Live connection pool and scheduler state"""
+    import llm_client
+    import llm_scheduler
+
+    pool = llm_client.get_manager().stats()
+    yield "llm_requests_in_flight", "gauge", "Requests currently holding a pooled connection", {}, pool["in_flight"]
+    yield ("llm_pool_peak_utilization", "gauge", "Peak share of the connection pool in use", {},
+           pool["peak_utilization"])
+    scheduler = llm_scheduler.get_scheduler().stats()
+    yield "llm_scheduler_queued", "gauge", "Requests waiting for admission", {}, scheduler["queued"]
+    yield ("llm_scheduler_concurrency_limit", "gauge", "Current adaptive concurrency limit", {},
+           scheduler["concurrency_limit"])
+    yield "llm_retries_total", "counter", "LLM calls retried after a retriable error", {}, scheduler["retries"]
+    yield ("llm_throttled_total", "counter", "LLM calls delayed by the rate limiter", {},
+           scheduler["throttled"])
+
+
+REGISTRY.register_collector(_runtime_gauges)
+
+
+def render():
+    """Prometheus text for the process-wide registry"""
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_textfile = None
+_exporter_lock = threading.Lock()
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics on a background thread; later calls return the running server"""
+    global _server
+    with _exporter_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logger.info(json.dumps({"event": "metrics_server", "port": _server.server_address[1]}))
+        return _server
+
+
+def write_textfile(path):
+    """Atomically write the current metrics to path"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def start_exporters_from_env(worker=None):
+    """Start the exporters configured by METRICS_PORT / METRICS_TEXTFILE (idempotent).
+
+    worker is this process's index among pre-forked siblings, which each
+    export their own metrics on their own port and textfile.
+    """
+    global _textfile
+    port = os.getenv('METRICS_PORT')
+    textfile = os.getenv('METRICS_TEXTFILE') or None
+    if worker is not None:
+        REGISTRY.const_labels = (("worker", str(worker)),)
+        if port:
+            port = int(port) + worker
+        if textfile:
+            root, ext = os.path.splitext(textfile)
+            textfile = f"{root}.{worker}{ext}"
+    if port:
+        try:
+            start_http_server(int(port))
+        except OSError as e:
+            # Another Streamlit process may already own the port
+            logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+    _textfile = textfile
+
+
+def flush():
+    """Write the metrics textfile, if one is configured"""
+    if _textfile:
+        try:
+            write_textfile(_textfile)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", _textfile, e)
@@ -0,0 +1,456 @@
+"""PDF text extraction engine shared by app.py and main.py.
+
+Uploads are spooled: they stay in memory up to PDF_SPOOL_THRESHOLD_BYTES and
+are written to a temporary file beyond that, so extraction is handed a path
+rather than a copy of the bytes. PDFs are only ever parsed in sandboxed
+child processes started from a fork server, each with hard CPU-time and
+address-space limits, so a decompression bomb or a pathological file kills
+its own sandbox instead of the server. Large documents are split into page
+ranges extracted in parallel sandboxes, and results are cached per document
+by the SHA-256 of the file bytes. Size and page-count limits stop a single
+upload from tying up a worker. Under an analysis deadline (see deadline.py)
+sandboxes only get the time left in the extraction stage and are killed if
+the deadline is cancelled.
+"""
+import contextvars
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import deadline
+
+try:
+    import resource
+except ImportError:  # not available on Windows; sandboxes then only get the wall-clock limit
+    resource = None
+
+# The PRD caps uploads at 10MB; page limit keeps portfolio dumps in check
+MAX_PDF_BYTES = int(os.getenv('PDF_MAX_BYTES', str(10 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv('PDF_MAX_PAGES', '100'))
+# Uploads larger than this are written to disk instead of held in memory
+SPOOL_THRESHOLD = int(os.getenv('PDF_SPOOL_THRESHOLD_BYTES', str(1024 * 1024)))
+SPOOL_DIR = os.getenv('PDF_SPOOL_DIR') or None
+# Below this many pages one sandbox extracts the whole document
+PARALLEL_PAGE_THRESHOLD = int(os.getenv('PDF_PARALLEL_PAGE_THRESHOLD', '16'))
+PAGES_PER_TASK = 8
+# Sandboxes running at once across the whole process
+MAX_WORKERS = int(os.getenv('PDF_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+SANDBOX_CPU_SECONDS = int(os.getenv('PDF_SANDBOX_CPU_SECONDS', '20'))
+# Address space a sandbox may use on top of the interpreter it starts with
+SANDBOX_MEMORY_BYTES = int(os.getenv('PDF_SANDBOX_MEMORY_MB', '512')) * 1024 * 1024
+SANDBOX_TIMEOUT = float(os.getenv('PDF_SANDBOX_TIMEOUT_SECONDS', str(SANDBOX_CPU_SECONDS * 2)))
+CACHE_SIZE = 64
+CHUNK_SIZE = 64 * 1024
+# Pages are joined with a form feed, as pdftotext does, so later stages can
+# still tell where one page ends and the next begins
+PAGE_BREAK = "\f"
+
+_executor = None
+_executor_lock = threading.Lock()
+_context = None
+_sandbox_slots = threading.BoundedSemaphore(MAX_WORKERS)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class PDFLimitError(ValueError):
+    """Raised when a PDF exceeds the configured size, page or sandbox limits"""
+
+
+def _size_error(max_bytes):
+    return PDFLimitError(f"PDF is larger than the {max_bytes / (1024 * 1024):g}MB limit")
+
+
+class SpooledUpload:
+    """An upload held in memory up to a threshold and in a temporary file beyond it.
+
+    Written in chunks, so the size limit is enforced and the SHA-256 computed
+    without ever holding more than the threshold in memory. Use as a context
+    manager, or call close(), to remove the temporary file.
+    """
+
+    def __init__(self, max_bytes=MAX_PDF_BYTES, threshold=SPOOL_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self.size = 0
+        self.path = None
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise _size_error(self.max_bytes)
+        self._hash.update(chunk)
+        if self._file is None and self.size > self.threshold:
+            self._file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=SPOOL_DIR, delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        (self._file or self._buffer).write(chunk)
+
+    def finish(self):
+        """Stop writing; returns self"""
+        if self._file is not None:
+            self._file.close()
+        return self
+
+    @property
+    def digest(self):
+        return self._hash.hexdigest()
+
+    def source(self):
+        """The upload as something a sandbox can open: bytes in memory or a file path"""
+        return self.path if self.path is not None else self._buffer.getvalue()
+
+    def save(self, path):
+        """Move or write the upload to path, keeping it out of memory"""
+        if self.path is not None:
+            shutil.move(self.path, path)
+            # The file now belongs to the caller; close() leaves it alone
+            self.path, self._file = path, None
+            return
+        with open(path, 'wb') as f:
+            f.write(self._buffer.getvalue())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def spool(pdf_file, max_bytes=MAX_PDF_BYTES, threshold=SPOOL_THRESHOLD):
+    """Copy an uploaded file or bytes object into a SpooledUpload, enforcing the size limit"""
+    upload = SpooledUpload(max_bytes, threshold)
+    try:
+        if isinstance(pdf_file, (bytes, bytearray, memoryview)):
+            for start in range(0, len(pdf_file), CHUNK_SIZE):
+                upload.write(bytes(pdf_file[start:start + CHUNK_SIZE]))
+        else:
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+            for chunk in iter(lambda: pdf_file.read(CHUNK_SIZE), b""):
+                upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    return upload.finish()
+
+
+def open_source(pdf_file, max_bytes=MAX_PDF_BYTES):
+    """Return (source, sha256, upload) for a PDF without loading large files into memory.
+
+    source is bytes or a path; upload is a SpooledUpload the caller must
+    close, or None when nothing was spooled.
+    """
+    if isinstance(pdf_file, SpooledUpload):
+        return pdf_file.source(), pdf_file.digest, None
+    if isinstance(pdf_file, (str, os.PathLike)):
+        if os.path.getsize(pdf_file) > max_bytes:
+            raise _size_error(max_bytes)
+        digest = hashlib.sha256()
+        with open(pdf_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return os.fspath(pdf_file), digest.hexdigest(), None
+    upload = spool(pdf_file, max_bytes)
+    return upload.source(), upload.digest, upload
+
+
+def _open(source):
+    """Open PDF bytes or a path as a stream; the file is read lazily rather than copied"""
+    return open(source, 'rb') if isinstance(source, str) else io.BytesIO(source)
+
+
+def iter_page_texts(source, start=0, stop=None):
+    """Yield the text of each page in [start, stop) of PDF bytes or a path, one at a time"""
+    import PyPDF2
+
+    with _open(source) as stream:
+        pages = PyPDF2.PdfReader(stream).pages
+        stop = len(pages) if stop is None else min(stop, len(pages))
+        for index in range(start, stop):
+            yield pages[index].extract_text() or ""
+
+
+def count_pages(source):
+    """Return the number of pages without extracting any text"""
+    import PyPDF2
+
+    with _open(source) as stream:
+        return len(PyPDF2.PdfReader(stream).pages)
+
+
+def _extract_page_range(source, start, stop):
+    """Sandbox task: extract one contiguous range of pages"""
+    return list(iter_page_texts(source, start, stop))
+
+
+def _extract_document_serial(source, max_pages):
+    """Sandbox task: extract a whole document"""
+    import PyPDF2
+
+    with _open(source) as stream:
+        pages = PyPDF2.PdfReader(stream).pages
+        if len(pages) > max_pages:
+            raise PDFLimitError(f"PDF has {len(pages)} pages; the limit is {max_pages}")
+        return [page.extract_text() or "" for page in pages]
+
+
+def _extract_or_count(source, max_pages):
+    """Sandbox task: extract a short document whole, or return (page_count, first pages) of a long one.
+
+    The document is parsed once here; a long one's first PAGES_PER_TASK pages
+    are extracted while it is open, so only the remaining ranges need sandboxes
+    of their own.
+    """
+    import PyPDF2
+
+    with _open(source) as stream:
+        pages = PyPDF2.PdfReader(stream).pages
+        page_count = len(pages)
+        if page_count > max_pages:
+            raise PDFLimitError(f"PDF has {page_count} pages; the limit is {max_pages}")
+        if page_count < PARALLEL_PAGE_THRESHOLD or MAX_WORKERS <= 1:
+            return [page.extract_text() or "" for page in pages]
+        return page_count, [pages[index].extract_text() or "" for index in range(PAGES_PER_TASK)]
+
+
+def _address_space():
+    """Current virtual memory size of this process in bytes, or 0 if unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _sandbox_main(conn, func, args, cpu_seconds, memory_bytes):
+    """Entry point of a sandbox process: apply the limits, run func and send back its result"""
+    if resource is not None:
+        # SIGXCPU at the soft limit, SIGKILL a second later
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_bytes:
+            # RLIMIT_RSS is not enforced on Linux; capping address space bounds it
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = _address_space() + memory_bytes
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        result = ("ok", func(*args))
+    except MemoryError:
+        result = ("error", PDFLimitError("PDF needs too much memory to extract"))
+    except Exception as e:
+        result = ("error", e)
+    try:
+        conn.send(result)
+    except Exception:
+        # The exception could not be pickled; send its message instead
+        conn.send(("error", ValueError(str(result[1]))))
+    conn.close()
+
+
+def _get_context():
+    """Start sandboxes from a fork server: cheap like fork, without inheriting the server's threads"""
+    global _context
+    with _executor_lock:
+        if _context is None:
+            methods = multiprocessing.get_all_start_methods()
+            _context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if "forkserver" in methods:
+                _context.set_forkserver_preload(["pdf_extract", "PyPDF2"])
+        return _context
+
+
+def _wait(ready, timeout, current):
+    """Call ready(seconds) until it returns True; False once timeout passes or current is cancelled"""
+    if current is None:
+        return ready(timeout)
+    ends = time.monotonic() + timeout
+    while not current.cancelled:
+        left = ends - time.monotonic()
+        if ready(max(0.0, min(left, deadline.POLL_SECONDS))):
+            return True
+        if left <= deadline.POLL_SECONDS:
+            break
+    return False
+
+
+def _timeout_error(current):
+    if current is not None and current.cancelled:
+        return PDFLimitError("PDF extraction was cancelled")
+    if current is not None and current.expired():
+        budget = current.seconds * current.shares["extract"]
+        return PDFLimitError(f"PDF extraction took longer than its {budget:g} second share of the analysis deadline")
+    return PDFLimitError(f"PDF extraction took longer than {SANDBOX_TIMEOUT:g} seconds")
+
+
+def run_sandboxed(func, *args):
+    """Run func(*args) in a fresh process under the CPU, memory and wall-clock limits"""
+    context = _get_context()
+    current = deadline.current()
+    if current is None:
+        _sandbox_slots.acquire()
+    elif not _wait(lambda seconds: _sandbox_slots.acquire(timeout=seconds), current.remaining(), current):
+        raise _timeout_error(current)
+    try:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_sandbox_main, daemon=True,
+                                  args=(sender, func, args, SANDBOX_CPU_SECONDS, SANDBOX_MEMORY_BYTES))
+        process.start()
+        sender.close()
+        try:
+            if not _wait(receiver.poll, deadline.remaining(SANDBOX_TIMEOUT), current):
+                raise _timeout_error(current)
+            status, value = receiver.recv()
+        except EOFError:
+            # Killed by the CPU limit, or by the kernel for running out of memory
+            raise PDFLimitError("PDF extraction exceeded its CPU or memory limit")
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+    finally:
+        _sandbox_slots.release()
+    if status == "error":
+        raise value
+    return value
+
+
+def _get_executor():
+    """Threads that wait on sandboxes; the slots cap how many run at once"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="pdf-extract")
+        return _executor
+
+
+def extract_pages(source, max_pages=MAX_PDF_PAGES):
+    """Extract every page's text from PDF bytes or a path, in parallel sandboxes for large documents"""
+    result = run_sandboxed(_extract_or_count, source, max_pages)
+    if isinstance(result, list):
+        return result
+
+    page_count, pages = result
+    executor = _get_executor()
+    futures = [
+        # Each page range runs in a copy of the caller's context so it keeps the deadline
+        executor.submit(contextvars.copy_context().run, run_sandboxed, _extract_page_range, source, start,
+                        min(start + PAGES_PER_TASK, page_count))
+        for start in range(len(pages), page_count, PAGES_PER_TASK)
+    ]
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def _cache_get(digest):
+    with _cache_lock:
+        pages = _cache.get(digest)
+        if pages is not None:
+            _cache.move_to_end(digest)
+        return pages
+
+
+def _cache_put(digest, pages):
+    with _cache_lock:
+        _cache[digest] = pages
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def extract_document(pdf_file, max_bytes=MAX_PDF_BYTES, max_pages=MAX_PDF_PAGES):
+    """Return (sha256, pages) for a PDF, served from the per-document cache when possible"""
+    source, digest, upload = open_source(pdf_file, max_bytes)
+    try:
+        pages = _cache_get(digest)
+        if pages is not None:
+            if len(pages) > max_pages:
+                raise PDFLimitError(f"PDF has {len(pages)} pages; the limit is {max_pages}")
+            return digest, pages
+
+        pages = tuple(extract_pages(source, max_pages))
+        _cache_put(digest, pages)
+        return digest, pages
+    finally:
+        if upload is not None:
+            upload.close()
+
+
+def extract_text(pdf_file, max_bytes=MAX_PDF_BYTES, max_pages=MAX_PDF_PAGES):
+    """Extract the full text of a PDF, joining pages once with PAGE_BREAK"""
+    _, pages = extract_document(pdf_file, max_bytes, max_pages)
+    return PAGE_BREAK.join(pages)
+
+
+def _collect(future, pending):
+    """Return (name, text, error) for a finished extract_many future and release its upload"""
+    name, digest, upload = pending.pop(future)
+    if upload is not None:
+        upload.close()
+    try:
+        pages = tuple(future.result())
+    except Exception as e:
+        return name, None, e
+    _cache_put(digest, pages)
+    return name, PAGE_BREAK.join(pages), None
+
+
+def extract_many(sources, max_bytes=MAX_PDF_BYTES, max_pages=MAX_PDF_PAGES):
+    """Extract many PDFs in parallel, one sandbox per document.
+
+    sources is an iterable of (name, file) pairs where file is a path, bytes
+    or a file object; file objects are spooled before the next one is read.
+    Yields (name, text, error) in completion order; exactly one of text and
+    error is None.
+    """
+    executor = _get_executor()
+    pending = {}
+    try:
+        for name, pdf_file in sources:
+            try:
+                source, digest, upload = open_source(pdf_file, max_bytes)
+            except Exception as e:
+                yield name, None, e
+                continue
+            pages = _cache_get(digest)
+            if pages is not None and len(pages) <= max_pages:
+                if upload is not None:
+                    upload.close()
+                yield name, PAGE_BREAK.join(pages), None
+                continue
+            future = executor.submit(run_sandboxed, _extract_document_serial, source, max_pages)
+            pending[future] = (name, digest, upload)
+            # Hand back documents that finished while later ones were still being read
+            for done in [done for done in pending if done.done()]:
+                yield _collect(done, pending)
+
+        for future in as_completed(list(pending)):
+            yield _collect(future, pending)
+    finally:
+        # Spooled files are removed once their sandbox is done with them
+        for future, (_, _, upload) in pending.items():
+            if upload is not None:
+                future.cancel()
+                future.add_done_callback(lambda _, upload=upload: upload.close())
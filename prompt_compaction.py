@@ -0,0 +1,217 @@
+"""Shrink resume and job description text before it goes into the prompt.
+
+Input tokens drive both latency and cost. This stage normalizes whitespace,
+removes header/footer lines repeated on every PDF page, drops low-value job
+description sections (benefits, EEO statements, company boilerplate) and
+enforces a token budget by keeping the most useful sections first.
+"""
+import math
+import os
+import re
+from collections import Counter
+
+from pdf_extract import PAGE_BREAK
+
+RESUME_TOKEN_BUDGET = int(os.getenv('RESUME_TOKEN_BUDGET', '3000'))
+JOB_TOKEN_BUDGET = int(os.getenv('JOB_DESCRIPTION_TOKEN_BUDGET', '1500'))
+
+# Roughly four characters per token for English prose
+CHARS_PER_TOKEN = 4
+# Lines near the top or bottom of a page that repeat on at least this share
+# of pages are treated as headers/footers
+FURNITURE_MIN_SHARE = 0.5
+FURNITURE_EDGE_LINES = 3
+
+PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+
+LOW_VALUE_JOB_HEADINGS = re.compile(
+    r"benefits|perks|what we offer|why (join|work)|compensation|salary|pay range|"
+    r"equal (employment )?opportunit|eeo|diversity|accommodation|about (us|the company|the team)|"
+    r"who we are|our (culture|values|mission|story)|life at|how to apply|legal|disclaimer|privacy",
+    re.IGNORECASE,
+)
+BOILERPLATE_PHRASES = re.compile(
+    r"equal opportunity employer|without regard to (race|sex|age)|reasonable accommodation|"
+    r"e-verify|protected veteran|sexual orientation|gender identity|national origin",
+    re.IGNORECASE,
+)
+
+# Higher numbers are kept first when a resume has to be truncated
+RESUME_SECTION_PRIORITY = (
+    (re.compile(r"skill|technolog|competenc|tools", re.IGNORECASE), 5),
+    (re.compile(r"experience|employment|work history|career", re.IGNORECASE), 5),
+    (re.compile(r"summary|profile|objective|about", re.IGNORECASE), 4),
+    (re.compile(r"education|degree|academic", re.IGNORECASE), 4),
+    (re.compile(r"project", re.IGNORECASE), 3),
+    (re.compile(r"certific|license|award|achievement", re.IGNORECASE), 3),
+    (re.compile(r"publication|volunteer|leadership|activit", re.IGNORECASE), 2),
+    (re.compile(r"interest|hobb|reference|personal", re.IGNORECASE), 1),
+)
+DEFAULT_SECTION_PRIORITY = 3
+HEADER_PRIORITY = 6
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for budgeting and reporting"""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces, strip lines and squeeze blank lines"""
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in (text or "").splitlines()]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _furniture_key(line):
+    # Page numbers and dates change per page; compare lines with digits masked
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def strip_page_furniture(pages):
+    """Drop page numbers and header/footer lines repeated across pages"""
+    split_pages = [[line for line in page.splitlines() if line.strip()] for page in pages]
+    repeated = set()
+    if len(split_pages) >= 2:
+        counts = Counter()
+        for lines in split_pages:
+            edges = lines[:FURNITURE_EDGE_LINES] + lines[-FURNITURE_EDGE_LINES:]
+            counts.update({_furniture_key(line) for line in edges})
+        threshold = max(2, math.ceil(FURNITURE_MIN_SHARE * len(split_pages)))
+        repeated = {key for key, count in counts.items() if count >= threshold}
+
+    cleaned = []
+    for lines in split_pages:
+        edge = set(range(FURNITURE_EDGE_LINES)) | set(range(len(lines) - FURNITURE_EDGE_LINES, len(lines)))
+        kept = [
+            line for index, line in enumerate(lines)
+            if not PAGE_NUMBER.match(line.strip())
+            and not (index in edge and _furniture_key(line) in repeated)
+        ]
+        cleaned.append("\n".join(kept))
+    return cleaned
+
+
+def _is_heading(line):
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60:
+        return False
+    if stripped.endswith(':'):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters) and len(stripped.split()) <= 6
+
+
+def split_sections(text):
+    """Split text into (heading, body) pairs; text before the first heading has heading ''"""
+    sections = []
+    heading, body = "", []
+    for line in text.splitlines():
+        if _is_heading(line):
+            if heading or any(l.strip() for l in body):
+                sections.append((heading, "\n".join(body).strip()))
+            heading, body = line.strip(), []
+        else:
+            body.append(line)
+    if heading or any(l.strip() for l in body):
+        sections.append((heading, "\n".join(body).strip()))
+    return sections
+
+
+def _join_sections(sections):
+    return "\n\n".join(f"{heading}\n{body}".strip() for heading, body in sections if heading or body)
+
+
+def drop_low_value_job_sections(job_description):
+    """Remove benefits/EEO/company-boilerplate sections and paragraphs; return (text, dropped headings)"""
+    kept, dropped = [], []
+    for heading, body in split_sections(job_description):
+        if heading and LOW_VALUE_JOB_HEADINGS.search(heading):
+            dropped.append(heading)
+            continue
+        paragraphs = [p for p in re.split(r"\n\s*\n", body) if not BOILERPLATE_PHRASES.search(p)]
+        kept.append((heading, "\n\n".join(paragraphs).strip()))
+    return _join_sections(kept), dropped
+
+
+def _section_priority(heading):
+    if not heading:
+        return HEADER_PRIORITY
+    for pattern, priority in RESUME_SECTION_PRIORITY:
+        if pattern.search(heading):
+            return priority
+    return DEFAULT_SECTION_PRIORITY
+
+
+def truncate_to_budget(text, budget, priority=_section_priority):
+    """Fit text into a token budget, keeping whole high-priority sections first.
+
+    Sections are admitted in priority order. One that does not fit whole is
+    cut at a line boundary to fill what is left, and lower-priority sections
+    are still admitted if they fit the remainder. The survivors are
+    reassembled in their original order; returns the text plus the headings
+    that were trimmed and the headings that were dropped entirely.
+    """
+    if estimate_tokens(text) <= budget:
+        return text, [], []
+    sections = split_sections(text)
+    order = sorted(range(len(sections)), key=lambda i: -priority(sections[i][0]))
+    remaining = budget
+    kept = {}
+    trimmed = []
+    dropped = []
+    for index in order:
+        heading, body = sections[index]
+        cost = estimate_tokens(f"{heading}\n{body}")
+        if cost <= remaining:
+            kept[index] = (heading, body)
+            remaining -= cost
+            continue
+        lines = []
+        used = estimate_tokens(heading)
+        for line in body.splitlines():
+            line_cost = estimate_tokens(line) + 1
+            if used + line_cost > remaining:
+                break
+            lines.append(line)
+            used += line_cost
+        if lines:
+            kept[index] = (heading, "\n".join(lines))
+            remaining -= used
+            trimmed.append(heading or "(untitled)")
+        else:
+            dropped.append(heading or "(untitled)")
+    return _join_sections(kept[i] for i in sorted(kept)), trimmed, dropped
+
+
+def compact_resume(text, budget=RESUME_TOKEN_BUDGET):
+    """Compact extracted resume text; pages are separated by PAGE_BREAK"""
+    pages = strip_page_furniture(text.split(PAGE_BREAK))
+    return truncate_to_budget(normalize_whitespace("\n".join(pages)), budget)
+
+
+def compact_job_description(text, budget=JOB_TOKEN_BUDGET):
+    """Compact a pasted job description"""
+    text, dropped = drop_low_value_job_sections(normalize_whitespace(text))
+    text, trimmed, truncated = truncate_to_budget(text, budget, priority=lambda heading: 1)
+    return text, trimmed, dropped + truncated
+
+
+def compact_inputs(resume_text, job_description,
+                   resume_budget=RESUME_TOKEN_BUDGET, job_budget=JOB_TOKEN_BUDGET):
+    """Compact both prompt inputs and report before/after token estimates"""
+    resume, resume_trimmed, resume_dropped = compact_resume(resume_text, resume_budget)
+    job, job_trimmed, job_dropped = compact_job_description(job_description, job_budget)
+    report = {
+        "resume_tokens_before": estimate_tokens(resume_text),
+        "resume_tokens_after": estimate_tokens(resume),
+        "job_tokens_before": estimate_tokens(job_description),
+        "job_tokens_after": estimate_tokens(job),
+        "resume_sections_trimmed": resume_trimmed,
+        "resume_sections_dropped": resume_dropped,
+        "job_sections_trimmed": job_trimmed,
+        "job_sections_dropped": job_dropped,
+    }
+    report["tokens_before"] = report["resume_tokens_before"] + report["job_tokens_before"]
+    report["tokens_after"] = report["resume_tokens_after"] + report["job_tokens_after"]
+    return resume, job, report
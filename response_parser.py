@@ -0,0 +1,226 @@
+"""Tolerant parsing and schema validation of the analysis JSON.
+
+Model output is not always clean JSON: it can arrive wrapped in a code fence,
+after a sentence of preamble, or cut off when max_tokens runs out. Rather
+than rejecting the whole response, extract_json() finds the object and
+repairs a truncated tail by closing the open brackets and dropping the
+member that was cut off. validate_analysis() then normalizes each field
+against the schema (e.g. "85%" -> 85) and reports the fields that are still
+missing or invalid, so only those need to be requested again.
+"""
+import json
+import re
+
+PERCENT = "percent"
+TEXT = "text"
+TEXT_LIST = "text_list"
+PERCENT_MAP = "percent_map"
+
+# Mirrors the structure requested in analyzer.ANALYSIS_INSTRUCTIONS
+ANALYSIS_SCHEMA = {
+    "strengths": TEXT_LIST,
+    "weaknesses": TEXT_LIST,
+    "suggestions": TEXT_LIST,
+    "match_score": PERCENT,
+    "ats_compatibility": PERCENT,
+    "skill_matches": PERCENT_MAP,
+    "missing_keywords": TEXT_LIST,
+    "action_verbs": {"used": TEXT_LIST, "recommended": TEXT_LIST},
+    "education_alignment": {"score": PERCENT, "feedback": TEXT},
+    "experience_alignment": {"score": PERCENT, "feedback": TEXT},
+    "format_score": {"score": PERCENT, "issues": TEXT_LIST, "positives": TEXT_LIST},
+}
+
+CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+# Repair gives up after this many attempts at shorter prefixes
+MAX_REPAIR_ATTEMPTS = 25
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class SchemaError(ValueError):
+    """Raised when a value cannot be coerced to its schema type"""
+
+
+def _percent(value):
+    if isinstance(value, bool):
+        raise SchemaError("expected a percentage")
+    fraction = isinstance(value, float)
+    if isinstance(value, str):
+        match = re.fullmatch(r"\s*(-?\d+(?:(\.)\d+)?)\s*(%?)\s*", value)
+        if not match:
+            raise SchemaError(f"expected a percentage, got {value!r}")
+        value = float(match.group(1))
+        # "0.5%" is half a percent; only a bare decimal like "0.85" can be a fraction
+        fraction = bool(match.group(2)) and not match.group(3)
+    if not isinstance(value, (int, float)):
+        raise SchemaError("expected a percentage")
+    if 0 < value <= 1 and fraction:
+        # A fraction such as 0.85 rather than 85
+        value *= 100
+    return int(round(min(max(value, 0), 100)))
+
+
+def _text(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str) or not value.strip():
+        raise SchemaError("expected text")
+    return value.strip()
+
+
+def _text_list(value):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        raise SchemaError("expected a list of text")
+    items = []
+    for item in value:
+        try:
+            items.append(_text(item))
+        except SchemaError:
+            continue
+    return items
+
+
+def _percent_map(value):
+    if not isinstance(value, dict):
+        raise SchemaError("expected an object of percentages")
+    matches = {}
+    for key, item in value.items():
+        try:
+            matches[str(key)] = _percent(item)
+        except SchemaError:
+            continue
+    return matches
+
+
+NORMALIZERS = {PERCENT: _percent, TEXT: _text, TEXT_LIST: _text_list, PERCENT_MAP: _percent_map}
+
+
+def normalize(spec, value):
+    """Coerce value to the schema spec, raising SchemaError if it cannot be"""
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            raise SchemaError("expected an object")
+        normalized = {}
+        for key, child in spec.items():
+            if key in value:
+                normalized[key] = normalize(child, value[key])
+            elif child == TEXT_LIST:
+                # Models often omit an empty list entirely
+                normalized[key] = []
+            else:
+                raise SchemaError(f"missing {key}")
+        return normalized
+    return NORMALIZERS[spec](value)
+
+
+def normalize_field(key, value, schema=ANALYSIS_SCHEMA):
+    """Normalize one top-level member; returns None if it is unknown or invalid"""
+    if key not in schema:
+        return None
+    try:
+        return normalize(schema[key], value)
+    except SchemaError:
+        return None
+
+
+def validate_analysis(data, schema=ANALYSIS_SCHEMA):
+    """Return (normalized fields, names of fields that are missing or invalid)"""
+    if not isinstance(data, dict):
+        return {}, list(schema)
+    valid = {}
+    problems = []
+    for key in schema:
+        value = normalize_field(key, data[key], schema) if key in data else None
+        if value is None:
+            problems.append(key)
+        else:
+            valid[key] = value
+    return valid, problems
+
+
+def _scan(text):
+    """Return (commas with the closers needed there, open stack, in_string, end of object)"""
+    stack = []
+    commas = []
+    in_string = False
+    escape = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return commas, stack, False, i + 1
+        elif char == ",":
+            commas.append((i, "".join(reversed(stack))))
+    return commas, stack, in_string, len(text)
+
+
+def _close(prefix, closers):
+    """Parse prefix closed with closers; a member cut off inside nested brackets is dropped"""
+    data = json.loads(prefix + closers)
+    if len(closers) > 1 and isinstance(data, dict) and data:
+        # The last top-level member was itself cut short, so it is incomplete
+        data.popitem()
+    return data
+
+
+def repair_json(text):
+    """Parse a JSON object whose tail may be cut off, dropping the unfinished member.
+
+    Returns (object, repaired) or (None, False) when nothing can be salvaged.
+    """
+    commas, stack, in_string, end = _scan(text)
+    if not stack:
+        try:
+            return json.loads(text[:end]), False
+        except json.JSONDecodeError:
+            pass
+    if not in_string:
+        try:
+            return _close(text[:end].rstrip().rstrip(","), "".join(reversed(stack))), True
+        except json.JSONDecodeError:
+            pass
+    for position, closers in list(reversed(commas))[:MAX_REPAIR_ATTEMPTS]:
+        try:
+            return _close(text[:position], closers), True
+        except json.JSONDecodeError:
+            continue
+    return None, False
+
+
+def extract_json(text):
+    """Find the analysis object in model output that may be fenced, prefixed or truncated.
+
+    Returns (object or None, repaired) where repaired is True when a
+    truncated tail had to be dropped.
+    """
+    text = text or ""
+    fenced = CODE_FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        return None, False
+    data, repaired = repair_json(text[start:])
+    return (data, repaired) if isinstance(data, dict) else (None, False)
+
+
+def parse_analysis(text, schema=ANALYSIS_SCHEMA):
+    """Extract and validate an analysis; returns (valid fields, problem fields, repaired)"""
+    data, repaired = extract_json(text)
+    valid, problems = validate_analysis(data, schema)
+    return valid, problems, repaired
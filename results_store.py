@@ -0,0 +1,436 @@
+"""Append-only columnar store of analysis results for aggregate dashboards.
+
+Every finished analysis (single-resume jobs and batch rows) is flattened
+into one row and appended to a Parquet dataset under RESULTS_STORE_PATH,
+partitioned by requisition (a hash of the normalized job description) and
+UTC date:
+
+    <path>/requisition=<id>/date=<YYYY-MM-DD>/part-<time>-<id>.parquet
+
+Files are never modified, only added or (by `compact`, which merges a
+partition's small files into one) replaced, so each file is read once per
+process and kept in memory; a reload after an append only reads the new
+files. A merged file names the files it replaces in its metadata, so a
+reader that lists both while compaction is deleting them skips the old ones,
+and one that finds a listed file already gone lists again. Compactions are
+serialized across processes by a lock file in the store. Reads prune
+partitions from the directory names, columns stay Arrow-backed in pandas and
+the aggregates below are vectorized over them (list columns are flattened,
+never iterated), so dashboards stay fast with hundreds of thousands of rows.
+
+Usage:
+    python results_store.py summary
+    python results_store.py compact
+    python results_store.py benchmark --rows 100000
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from cache import normalize_text
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; compactions are then only serialized within a process
+    fcntl = None
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "results")
+# Empty disables the store
+STORE_PATH = os.getenv('RESULTS_STORE_PATH', DEFAULT_STORE_PATH)
+# Parquet metadata key naming the files a compacted file replaces
+REPLACES_KEY = b"resumechecker.replaces"
+# Times load() lists the files again when compaction removes one it is reading
+LOAD_ATTEMPTS = 5
+SCORE_COLUMNS = ("match_score", "ats_compatibility", "format_score", "education_score", "experience_score")
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("analyzed_at", pa.timestamp("ms", tz="UTC")),
+            ("requisition_title", pa.string()),
+            ("source", pa.string()),
+            ("file", pa.string()),
+        ]
+        + [(column, pa.int16()) for column in SCORE_COLUMNS]
+        + [
+            ("local_match_score", pa.int16()),
+            ("missing_keywords", pa.list_(pa.string())),
+            ("skills", pa.list_(pa.string())),
+            ("skill_scores", pa.list_(pa.int16())),
+            ("duplicate_of", pa.string()),
+        ]
+    )
+
+
+def requisition_id(job_description):
+    """Stable short id for a job description; the store's partition key"""
+    return hashlib.sha256(normalize_text(job_description).encode("utf-8")).hexdigest()[:12]
+
+
+def requisition_title(job_description):
+    """First non-empty line of a job description, for display"""
+    for line in (job_description or "").splitlines():
+        if line.strip():
+            return line.strip()[:80]
+    return ""
+
+
+def _score(value):
+    if isinstance(value, dict):
+        value = value.get("score")
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def flatten(analysis, job_description, source, file=None, local=None, duplicate_of=None, analyzed_at=None):
+    """Flatten one analysis dict into a store row"""
+    analysis = analysis or {}
+    skills = analysis.get("skill_matches") or {}
+    return {
+        "analyzed_at": analyzed_at or datetime.now(timezone.utc),
+        "requisition": requisition_id(job_description),
+        "requisition_title": requisition_title(job_description),
+        "source": source,
+        "file": file,
+        "match_score": _score(analysis.get("match_score")),
+        "ats_compatibility": _score(analysis.get("ats_compatibility")),
+        "format_score": _score(analysis.get("format_score")),
+        "education_score": _score(analysis.get("education_alignment")),
+        "experience_score": _score(analysis.get("experience_alignment")),
+        "local_match_score": _score((local or {}).get("match_score")),
+        "missing_keywords": list(analysis.get("missing_keywords") or []),
+        "skills": list(skills),
+        "skill_scores": [_score(value) for value in skills.values()],
+        "duplicate_of": duplicate_of,
+    }
+
+
+class ResultsStore:
+    """A Parquet dataset of flattened analyses, partitioned by requisition and date"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Parsed files by path; safe to keep because files are never modified in place
+        self._tables = {}
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, rows):
+        """Write rows as one new file per partition they fall into"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        partitions = {}
+        for row in rows:
+            date = row["analyzed_at"].astimezone(timezone.utc).strftime("%Y-%m-%d")
+            partitions.setdefault((row["requisition"], date), []).append(row)
+        schema = _schema()
+        for (requisition, date), partition_rows in partitions.items():
+            directory = os.path.join(self.path, f"requisition={requisition}", f"date={date}")
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pylist(partition_rows, schema=schema)
+            name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            # Written under a dot name and renamed so readers never see a partial file
+            temp_path = os.path.join(directory, f".{name}")
+            pq.write_table(table, temp_path, compression="zstd")
+            os.replace(temp_path, os.path.join(directory, name))
+
+    def _files(self):
+        for root, dirs, files in os.walk(self.path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.endswith(".parquet") and not filename.startswith("."):
+                    yield os.path.join(root, filename)
+
+    def version(self):
+        """(file count, latest modification time); changes whenever rows are appended or compacted"""
+        count, latest = 0, 0
+        for path in self._files():
+            count += 1
+            latest = max(latest, os.stat(path).st_mtime_ns)
+        return count, latest
+
+    def _read(self, path, requisition, date):
+        """Return a file's rows with its partition values as columns, parsing it only once"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            table = self._tables.get(path)
+        if table is None:
+            table = pq.ParquetFile(path).read()
+            table = table.append_column("requisition", pa.array([requisition] * table.num_rows, pa.string()))
+            table = table.append_column("date", pa.array([date] * table.num_rows, pa.string()))
+            with self._lock:
+                self._tables[path] = table
+        return table
+
+    def _select(self, requisitions, since):
+        """List the files in the requested partitions as (path, requisition, date)"""
+        selected = []
+        for path in self._files():
+            # Partition pruning: skip files by their directory names without opening them
+            requisition, date = (part.split("=", 1)[1] for part in os.path.relpath(path, self.path).split(os.sep)[:2])
+            if requisitions and requisition not in requisitions:
+                continue
+            if since is not None and date < since:
+                continue
+            selected.append((path, requisition, date))
+        return selected
+
+    def _read_all(self, selected):
+        """Read the selected files, leaving out those a compacted file in the list replaces"""
+        tables = {path: self._read(path, requisition, date) for path, requisition, date in selected}
+        replaced = set()
+        for path, table in tables.items():
+            names = (table.schema.metadata or {}).get(REPLACES_KEY)
+            if names:
+                replaced.update(os.path.join(os.path.dirname(path), name) for name in json.loads(names))
+        return [table for path, table in tables.items() if path not in replaced]
+
+    def load(self, requisitions=None, since=None, columns=None):
+        """Return the stored rows as a DataFrame, optionally for some requisitions and days since a date.
+
+        Columns are Arrow-backed (pd.ArrowDtype), list columns included.
+        """
+        import pandas as pd
+        import pyarrow as pa
+
+        since = since.strftime("%Y-%m-%d") if since is not None else None
+        for attempt in range(LOAD_ATTEMPTS):
+            selected = self._select(requisitions, since)
+            with self._lock:
+                # Forget files that compaction has replaced
+                for path in set(self._tables) - {path for path, _, _ in selected}:
+                    if not os.path.exists(path):
+                        del self._tables[path]
+            try:
+                tables = self._read_all(selected)
+                break
+            except FileNotFoundError:
+                # Compaction in another process removed a file after it was listed
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+        schema = _schema().append(pa.field("requisition", pa.string())).append(pa.field("date", pa.string()))
+        table = pa.concat_tables(tables) if tables else schema.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    @contextmanager
+    def _compaction_lock(self):
+        """Hold an advisory lock on the store so only one process compacts it at a time"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, ".compact.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def compact(self):
+        """Merge each partition's files into one; returns the number of files removed"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        removed = 0
+        with self._lock, self._compaction_lock():
+            directories = {}
+            for path in self._files():
+                directories.setdefault(os.path.dirname(path), []).append(path)
+            for directory, paths in directories.items():
+                if len(paths) < 2:
+                    continue
+                table = pa.concat_tables(pq.read_table(path, schema=_schema()) for path in sorted(paths))
+                # Readers that still list the old files skip them in favour of this one
+                replaces = json.dumps([os.path.basename(path) for path in paths]).encode("utf-8")
+                table = table.replace_schema_metadata({REPLACES_KEY: replaces})
+                name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+                temp_path = os.path.join(directory, f".{name}")
+                pq.write_table(table, temp_path, compression="zstd")
+                os.replace(temp_path, os.path.join(directory, name))
+                for path in paths:
+                    os.unlink(path)
+                removed += len(paths) - 1
+        return removed
+
+
+def requisition_summary(df):
+    """Analyses, mean and median scores and the latest analysis per requisition"""
+    summary = df.groupby("requisition", observed=True).agg(
+        title=("requisition_title", "last"),
+        analyses=("match_score", "size"),
+        mean_match=("match_score", "mean"),
+        median_match=("match_score", "median"),
+        mean_ats=("ats_compatibility", "mean"),
+        last_analyzed=("analyzed_at", "max"),
+    )
+    summary = summary.sort_values("last_analyzed", ascending=False)
+    score_columns = ["mean_match", "median_match", "mean_ats"]
+    summary[score_columns] = summary[score_columns].astype(float).round(1)
+    return summary
+
+
+def score_histogram(df, column="match_score", bin_size=10):
+    """Count analyses per requisition in score bins of bin_size; columns are the bins' lower bounds"""
+    scores = df[column].dropna()
+    bins = (scores // bin_size * bin_size).clip(upper=100 - bin_size).astype(int)
+    counts = bins.groupby([df.loc[scores.index, "requisition"], bins], observed=True).size()
+    if counts.empty:
+        import pandas as pd
+
+        return pd.DataFrame(columns=range(0, 100, bin_size), dtype=int)
+    return counts.unstack(fill_value=0).reindex(columns=range(0, 100, bin_size), fill_value=0)
+
+
+def top_missing_keywords(df, n=20):
+    """The n keywords most often reported missing, with how many analyses missed each"""
+    keywords = df["missing_keywords"].list.flatten().str.strip().str.lower()
+    return keywords[keywords != ""].value_counts().head(n)
+
+
+def skill_coverage(df, top=15):
+    """Mean skill score per requisition for the top most frequently assessed skills"""
+    import numpy as np
+    import pandas as pd
+
+    # One row per (analysis, skill): flatten the list columns and repeat each requisition's code per skill
+    codes, requisitions = pd.factorize(df["requisition"])
+    lengths = df["skills"].list.len().fillna(0).to_numpy(dtype=int)
+    long = pd.DataFrame({
+        "requisition": np.repeat(codes, lengths),
+        "skill": df["skills"].list.flatten().str.strip().str.lower().reset_index(drop=True),
+        "score": df["skill_scores"].list.flatten().reset_index(drop=True),
+    })
+    skills = long["skill"].value_counts().head(top).index
+    long = long[long["skill"].isin(skills)]
+    coverage = long.groupby(["requisition", "skill"], observed=True)["score"].mean().unstack()
+    coverage.index = requisitions[coverage.index]
+    coverage.index.name = "requisition"
+    return coverage.reindex(columns=skills).astype(float).round(1)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide results store, or None when RESULTS_STORE_PATH is empty"""
+    global _store
+    if not STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore(STORE_PATH)
+        return _store
+
+
+def record(store, rows):
+    """Append rows to store if there is one, logging instead of failing the analysis if the write fails"""
+    if store is None or not rows:
+        return
+    try:
+        store.append(rows)
+    except Exception:
+        import logging
+
+        logging.getLogger(__name__).exception("Could not record %d analysis results", len(rows))
+
+
+def synthetic_rows(count, requisitions=20, days=30, seed=0):
+    """Random but plausible rows for benchmarking the dashboard queries"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"skill{i}" for i in range(200)]
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        requisition = int(rng.integers(requisitions))
+        skills = list(rng.choice(vocabulary, size=8, replace=False))
+        rows.append({
+            "analyzed_at": now - timedelta(days=float(rng.uniform(0, days))),
+            "requisition": f"req{requisition:04d}",
+            "requisition_title": f"Requisition {requisition}",
+            "source": "batch",
+            "file": f"resume{i}.pdf",
+            **{column: int(rng.integers(0, 101)) for column in SCORE_COLUMNS},
+            "local_match_score": int(rng.integers(0, 101)),
+            "missing_keywords": list(rng.choice(vocabulary, size=6, replace=False)),
+            "skills": skills,
+            "skill_scores": [int(score) for score in rng.integers(0, 101, size=len(skills))],
+            "duplicate_of": None,
+        })
+    return rows
+
+
+def benchmark(rows):
+    """Time loading and aggregating a store of synthetic rows; returns {step: seconds}
+
+    cold_load is the first read in a fresh process; the rest is what a
+    dashboard refresh costs once the files are loaded.
+    """
+    directory = tempfile.mkdtemp(prefix="results_store_")
+    try:
+        store = ResultsStore(directory)
+        store.append(synthetic_rows(rows))
+        timings = {}
+        started = time.perf_counter()
+        store.load()
+        timings["cold_load"] = time.perf_counter() - started
+        # What a dashboard refresh pays after one more analysis was recorded
+        store.append(synthetic_rows(1, seed=1))
+        started = time.perf_counter()
+        df = store.load()
+        timings["load"] = time.perf_counter() - started
+        for name, query in (("summary", requisition_summary), ("histogram", score_histogram),
+                            ("missing_keywords", top_missing_keywords), ("skill_coverage", skill_coverage)):
+            started = time.perf_counter()
+            query(df)
+            timings[name] = time.perf_counter() - started
+        return timings
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, compact or benchmark the analysis results store")
+    parser.add_argument("--path", default=STORE_PATH or DEFAULT_STORE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("summary", help="print analyses and scores per requisition")
+    commands.add_parser("compact", help="merge each partition's files into one")
+    bench = commands.add_parser("benchmark", help="time the dashboard queries on synthetic rows")
+    bench.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        timings = benchmark(args.rows)
+        for name, seconds in timings.items():
+            print(f"{name:>16}: {seconds * 1000:8.1f} ms")
+        refresh = sum(seconds for name, seconds in timings.items() if name != "cold_load")
+        print(f"{'refresh':>16}: {refresh * 1000:8.1f} ms for {args.rows:,} rows")
+        return 0
+    store = ResultsStore(args.path)
+    if args.command == "compact":
+        print(f"Removed {store.compact()} files")
+        return 0
+    summary = requisition_summary(store.load())
+    print(summary.to_string() if not summary.empty else "No results stored yet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Persistent inverted index over extracted resume text with BM25 retrieval.
+
+Sending a whole talent pool to the LLM for every requisition does not scale.
+Resumes are indexed once into a SQLite FTS5 table (an on-disk inverted index
+with built-in BM25 ranking); a job description then retrieves the top-K
+candidates in milliseconds, and only those are passed on to analyze_resume.
+Text is indexed as the same token stream the local scorer uses, so skills
+like "c++" or "node.js" survive tokenization.
+
+Usage:
+    python resume_index.py add resumes/            # or a .zip of PDFs
+    python resume_index.py search --job-description jd.txt --top-k 20
+    python resume_index.py delete "jane_doe.pdf"
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from scoring import extract_keywords, tokenize
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "resume_index.sqlite3")
+# Query with the job description's most useful terms rather than every word
+MAX_QUERY_TERMS = 60
+
+
+class ResumeIndex:
+    """On-disk inverted index supporting incremental adds, deletes and BM25 search"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # documents holds the original text; resume_terms shares its rowid so
+        # deletes are a primary-key lookup in both tables
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL UNIQUE,
+                text TEXT NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS resume_terms USING fts5(
+                terms, tokenize = "unicode61 tokenchars '+#./'"
+            );
+            """
+        )
+        self._conn.commit()
+
+    def add(self, doc_id, text):
+        """Index one resume, replacing any previous version with the same id"""
+        self.add_many([(doc_id, text)])
+
+    def add_many(self, documents):
+        """Index (doc_id, text) pairs in a single transaction"""
+        with self._lock, self._conn:
+            for doc_id, text in documents:
+                self._delete(doc_id)
+                rowid = self._conn.execute(
+                    "INSERT INTO documents (doc_id, text, added_at) VALUES (?, ?, ?)",
+                    (doc_id, text, time.time()),
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO resume_terms (rowid, terms) VALUES (?, ?)",
+                    (rowid, " ".join(tokenize(text))),
+                )
+
+    def delete(self, doc_id):
+        """Remove a resume from the index; returns True if it was present"""
+        with self._lock, self._conn:
+            return self._delete(doc_id)
+
+    def _delete(self, doc_id):
+        row = self._conn.execute("SELECT id FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return False
+        self._conn.execute("DELETE FROM resume_terms WHERE rowid = ?", row)
+        self._conn.execute("DELETE FROM documents WHERE id = ?", row)
+        return True
+
+    def get_text(self, doc_id):
+        """Return the stored text for a resume, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(self, job_description, k=10):
+        """Return the top-k (doc_id, score) pairs for a job description, best first"""
+        terms = dict.fromkeys(
+            token for keyword in extract_keywords(job_description, MAX_QUERY_TERMS) for token in tokenize(keyword)
+        )
+        if not terms:
+            return []
+        # Quote every term so FTS5 treats it literally, then match any of them
+        query = " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.doc_id, -bm25(resume_terms) AS score FROM resume_terms "
+                "JOIN documents d ON d.id = resume_terms.rowid "
+                "WHERE resume_terms MATCH ? ORDER BY bm25(resume_terms) LIMIT ?",
+                (query, k),
+            ).fetchall()
+        return rows
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def index_source(index, source):
+    """Extract a directory or zip of PDFs into the index; returns the number added"""
+    # Imported here so searching does not pay for the PDF stack
+    import pdf_extract
+    from batch import iter_resume_sources
+
+    documents = []
+    for name, text, error in pdf_extract.extract_many(iter_resume_sources(source)):
+        if error is not None:
+            print(f"{name}: {error}", file=sys.stderr)
+        else:
+            documents.append((name, text))
+    index.add_many(documents)
+    return len(documents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and query the resume inverted index")
+    parser.add_argument("--index", default=os.getenv('RESUME_INDEX_PATH', DEFAULT_INDEX_PATH),
+                        help="path of the SQLite index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="extract and index a directory or zip of PDF resumes")
+    add.add_argument("source")
+    delete = commands.add_parser("delete", help="remove resumes from the index")
+    delete.add_argument("doc_ids", nargs="+")
+    search = commands.add_parser("search", help="retrieve the best candidates for a job description")
+    search.add_argument("--job-description", "-j", required=True)
+    search.add_argument("--top-k", "-k", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    index = ResumeIndex(args.index)
+    if args.command == "add":
+        added = index_source(index, args.source)
+        print(f"Indexed {added} resumes; index now holds {len(index)}")
+    elif args.command == "delete":
+        for doc_id in args.doc_ids:
+            print(f"{doc_id}: {'deleted' if index.delete(doc_id) else 'not found'}")
+    else:
+        with open(args.job_description, encoding='utf-8') as f:
+            job_description = f.read()
+        started = time.perf_counter()
+        results = index.search(job_description, args.top_k)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for rank, (doc_id, score) in enumerate(results, 1):
+            print(f"{rank:>3}. {score:10.4g}  {doc_id}")
+        print(f"{len(results)} of {len(index)} resumes in {elapsed_ms:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Local keyword and skill scoring between a resume and a job description.
+
+Everything here runs in-process with NumPy in a few milliseconds, so
+its results can be shown before the LLM responds and stand in for the LLM
+when the API is unavailable. Scores are on the same 0-100 scale as the
+analysis JSON so they can be rendered with the same components.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = frozenset("""
+a about above across after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each etc few for from
+further had has have having he her here hers him his how i if in into is it its itself just
+least less let like made make many may me might more most must my no nor not of off on once
+only or other our ours out over own per please plus same shall she should so some such than
+that the their them then there these they this those through to too under until up upon us
+very via was we well were what when where which while who whom why will with within without
+would you your yours
+ability able applicant applicants apply candidate candidates company role position job work
+working team teams new strong excellent good great including include includes required
+requirements requirement preferred qualifications qualification responsibilities
+responsibility experience experienced years year skills skill knowledge understanding
+using use used looking join opportunity environment equal employer employment benefits
+salary compensation
+""".split())
+
+# Multi-word and punctuated skills that plain tokenization would split or miss
+SKILL_PHRASES = (
+    "machine learning", "deep learning", "data science", "data analysis", "data engineering",
+    "natural language processing", "computer vision", "project management", "product management",
+    "unit testing", "continuous integration", "ci/cd", "rest api", "rest apis", "microservices",
+    "google cloud", "power bi", "spring boot", "react native", "node.js", "next.js", "vue.js",
+    "c++", "c#", ".net", "scikit-learn", "tensorflow", "pytorch", "github actions",
+    "agile", "scrum", "kubernetes", "docker", "terraform", "aws", "azure", "gcp", "sql",
+    "nosql", "postgresql", "mysql", "mongodb", "redis", "kafka", "spark", "hadoop", "airflow",
+    "python", "java", "javascript", "typescript", "go", "rust", "scala", "ruby", "php", "swift",
+    "kotlin", "react", "angular", "django", "flask", "fastapi", "pandas", "numpy", "tableau",
+    "excel", "linux", "git", "graphql", "html", "css", "figma", "salesforce", "sap",
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_KEYWORDS = 25
+MAX_CHART_SKILLS = 10
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed"""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _count_phrase(text, phrase):
+    pattern = r"(?<![a-z0-9])" + re.escape(phrase) + r"(?![a-z0-9+#])"
+    return len(re.findall(pattern, text))
+
+
+def extract_keywords(job_description, max_keywords=MAX_KEYWORDS):
+    """Pick the job description terms worth checking for: known skills first, then frequent terms"""
+    lowered = (job_description or "").lower()
+    skills = [phrase for phrase in SKILL_PHRASES if _count_phrase(lowered, phrase)]
+    # most_common keeps first-seen order among equal counts
+    counts = Counter(tokenize(job_description)).most_common()
+    covered = {token for phrase in skills for token in tokenize(phrase)}
+    frequent = [term for term, _ in counts if term not in covered and not term.isdigit()]
+    return (skills + frequent)[:max_keywords]
+
+
+def _term_matrix(documents, vocabulary):
+    """Return a (documents x vocabulary) matrix of raw term counts"""
+    rows = []
+    for tokens in documents:
+        counts = Counter(tokens)
+        rows.append([counts[term] for term in vocabulary])
+    return np.array(rows, dtype=float).reshape(len(documents), len(vocabulary))
+
+
+def tfidf_similarity(resume_tokens, job_tokens):
+    """Cosine similarity of sublinear TF-IDF vectors, with IDF over both documents"""
+    vocabulary = sorted(set(resume_tokens) | set(job_tokens))
+    if not vocabulary:
+        return 0.0
+    counts = _term_matrix([resume_tokens, job_tokens], vocabulary)
+    tf = np.where(counts > 0, 1.0 + np.log(np.maximum(counts, 1.0)), 0.0)
+    df = (counts > 0).sum(axis=0)
+    idf = np.log((1.0 + len(counts)) / (1.0 + df)) + 1.0
+    vectors = tf * idf
+    norms = np.linalg.norm(vectors, axis=1)
+    if not norms.all():
+        return 0.0
+    return float(vectors[0] @ vectors[1] / (norms[0] * norms[1]))
+
+
+def bm25_relevance(resume_tokens, query_terms, average_length=None):
+    """BM25 score of the resume for the query terms, normalized to 0-1.
+
+    Normalization divides by the score of a same-length document that
+    mentions every query term once, so the result is comparable across job
+    descriptions; repeated mentions can only push a term up to that cap.
+    """
+    query_terms = list(dict.fromkeys(t for term in query_terms for t in tokenize(term)))
+    if not query_terms or not resume_tokens:
+        return 0.0
+    counts = _term_matrix([resume_tokens], query_terms)[0]
+    length = len(resume_tokens)
+    average_length = average_length or length
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / average_length)
+    saturation = counts * (BM25_K1 + 1.0) / (counts + norm)
+    ideal = (BM25_K1 + 1.0) / (1.0 + norm)
+    # With a single document there is no corpus IDF; weight terms equally
+    return float(np.minimum(saturation / ideal, 1.0).mean())
+
+
+def skill_match_percentages(resume_text, keywords):
+    """Per-keyword match percentage: full phrase hits score high, partial token overlap scores low"""
+    lowered = (resume_text or "").lower()
+    resume_vocab = set(tokenize(resume_text))
+    matches = {}
+    for keyword in keywords:
+        hits = _count_phrase(lowered, keyword)
+        if hits:
+            matches[keyword] = min(100, 70 + 10 * hits)
+            continue
+        parts = tokenize(keyword)
+        overlap = np.mean([part in resume_vocab for part in parts]) if parts else 0.0
+        matches[keyword] = int(round(50 * overlap))
+    return matches
+
+
+def score_resume(resume_text, job_description):
+    """Compute local match scores in the same shape as the LLM analysis where possible"""
+    resume_tokens = tokenize(resume_text)
+    job_tokens = tokenize(job_description)
+    keywords = extract_keywords(job_description)
+
+    skill_matches = skill_match_percentages(resume_text, keywords)
+    matched = [k for k, v in skill_matches.items() if v >= 70]
+    missing = [k for k, v in skill_matches.items() if v < 70]
+    coverage = len(matched) / len(keywords) if keywords else 0.0
+    similarity = tfidf_similarity(resume_tokens, job_tokens)
+    relevance = bm25_relevance(resume_tokens, keywords)
+
+    match_score = int(round(100 * (0.5 * coverage + 0.3 * relevance + 0.2 * similarity)))
+    chart_skills = sorted(skill_matches.items(), key=lambda item: -item[1])[:MAX_CHART_SKILLS]
+    return {
+        "match_score": match_score,
+        "keyword_coverage": int(round(100 * coverage)),
+        "bm25_relevance": int(round(100 * relevance)),
+        "tfidf_similarity": int(round(100 * similarity)),
+        "skill_matches": dict(chart_skills),
+        "matched_keywords": matched,
+        "missing_keywords": missing,
+    }
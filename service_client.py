@@ -0,0 +1,75 @@
+"""Client for analysis_service.py.
+
+When ANALYSIS_SERVICE_URL is set the Streamlit app sends uploads here
+instead of running extraction and analysis in its own process. Events are
+read from the streaming endpoint so sections still render as they complete.
+"""
+import json
+import os
+import urllib.error
+import urllib.request
+import uuid
+
+from analyzer import AnalysisError
+
+SERVICE_URL = os.getenv('ANALYSIS_SERVICE_URL', '').rstrip('/') or None
+TIMEOUT = float(os.getenv('ANALYSIS_SERVICE_TIMEOUT_SECONDS', '300'))
+
+
+def encode_form(fields, files):
+    """Encode text fields and (name, filename, bytes) files as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode("utf-8")
+                     + value.encode("utf-8") + b"\r\n")
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/pdf\r\n\r\n'.encode("utf-8") + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+def _error_message(error):
+    try:
+        return json.loads(error.read())["error"]
+    except (ValueError, KeyError, TypeError):
+        return f"Analysis service error: HTTP {error.code}"
+
+
+def analysis_events(pdf_bytes, filename, job_description, stats=None, base_url=None, previous=None):
+    """Yield ("local_scores", scores) and then each (key, value) section from the service.
+
+    Mirrors analysis_service.analysis_events: a rejected upload raises
+    AnalysisError before anything is yielded. Request stats are copied into
+    stats when the service reports them.
+    """
+    fields = {"job_description": job_description}
+    if previous:
+        fields["previous"] = json.dumps(previous)
+    content_type, body = encode_form(fields, [("resume", filename or "resume.pdf", pdf_bytes)])
+    request = urllib.request.Request(f"{base_url or SERVICE_URL}/v1/analyze?stream=1", data=body,
+                                     headers={"Content-Type": content_type}, method="POST")
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT)
+    except urllib.error.HTTPError as e:
+        raise AnalysisError(_error_message(e))
+    except (urllib.error.URLError, OSError) as e:
+        raise AnalysisError(f"Analysis service unavailable: {getattr(e, 'reason', e)}")
+
+    with response:
+        for line in response:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["event"] == "local_scores":
+                yield "local_scores", event["value"]
+            elif event["event"] == "section":
+                yield event["key"], event["value"]
+            elif event["event"] == "error":
+                raise AnalysisError(event["error"])
+            elif event["event"] == "done":
+                if stats is not None:
+                    stats.update(event["stats"])
+                return
+    raise AnalysisError("The analysis service closed the connection before finishing. Please try again.")
@@ -0,0 +1,214 @@
+"""Coalesce identical in-flight LLM calls across sessions and threads.
+
+When several sessions analyze the same resume against the same job
+description at once, only the first caller (the leader) makes each call;
+the others wait for it and share its result or its error. Calls are keyed
+on their inputs (analyzer uses the section cache key), and a key is only
+registered while its call is in flight, so finished results still come from
+the analysis cache.
+
+Completions are shared through a concurrent.futures.Future, so sync callers,
+async callers and callers on different event loops can wait on the same
+call. Streams are shared through a Broadcast that replays the events so far
+to a subscriber that joins late, then forwards the rest as they arrive.
+
+A caller under a deadline (see deadline.py) stops waiting when its own
+deadline runs out; a leader that runs out of time or is cancelled hands the
+call back to its waiters rather than failing them. A shared stream serves
+every subscriber, so instead of the leader's deadline it gets one of its
+own, as long as a whole analysis, which is cancelled as soon as every
+subscriber has left; a caller that joins just as it stops starts a new one.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError
+
+import deadline
+import metrics
+from llm_backends import DeadlineExceeded, check_deadline
+
+
+class LeaderCancelled(Exception):
+    """The leading caller was cancelled before its call finished; waiters make the call themselves"""
+
+
+class Broadcast:
+    """Fans one stream's events out to every subscribed queue, replaying earlier events to late joiners"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._subscribers = []
+        self._stopped = False
+        # The stream's own Deadline, cancelled once every subscriber has left
+        self.deadline = None
+
+    def put(self, item):
+        with self._lock:
+            self._events.append(item)
+            for subscriber in self._subscribers:
+                subscriber.put(item)
+
+    def subscribe(self, out):
+        """Add out; returns False if the stream has already stopped for lack of subscribers"""
+        with self._lock:
+            if self._stopped:
+                return False
+            for item in self._events:
+                out.put(item)
+            self._subscribers.append(out)
+            return True
+
+    def unsubscribe(self, out):
+        with self._lock:
+            if out in self._subscribers:
+                self._subscribers.remove(out)
+            if self._subscribers:
+                return
+            self._stopped = True
+        if self.deadline is not None:
+            self.deadline.cancel("abandoned")
+
+    @property
+    def abandoned(self):
+        """True once every subscriber has left; the stream then stops and takes no new subscribers"""
+        with self._lock:
+            if not self._subscribers:
+                self._stopped = True
+            return self._stopped
+
+
+def _shared(error):
+    """The exception waiters see when the leader's call raised error"""
+    # The leader's own cancellation or deadline says nothing about the call itself
+    if not isinstance(error, Exception) or isinstance(error, DeadlineExceeded):
+        return LeaderCancelled()
+    return error
+
+
+def _wait(future):
+    """Return the future's result, giving up when the caller's own deadline runs out"""
+    current = deadline.current()
+    if current is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=deadline.POLL_SECONDS)
+        except TimeoutError:
+            check_deadline(current)
+
+
+class SingleFlight:
+    """A registry of in-flight calls keyed by their inputs; concurrent identical calls run once"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key, factory):
+        """Return (flight, True if this caller leads it)"""
+        with self._lock:
+            flight = self._calls.get(key)
+            if flight is None:
+                flight = self._calls[key] = factory()
+                self.leaders += 1
+                return flight, True
+            self.coalesced += 1
+        metrics.record_coalesced(self.name)
+        return flight, False
+
+    def _finish(self, key, flight):
+        with self._lock:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+
+    def call(self, key, func):
+        """Return func(), or the result of an identical call already in flight"""
+        while True:
+            future, leader = self._join(key, Future)
+            if leader:
+                break
+            try:
+                return _wait(future)
+            except LeaderCancelled:
+                continue
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(_shared(e))
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def acall(self, key, func):
+        """Async variant of call: returns await func(), or the result of an identical call in flight"""
+        while True:
+            future, leader = self._join(key, Future)
+            if leader:
+                break
+            try:
+                # Shielded so a cancelled waiter does not cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except LeaderCancelled:
+                continue
+        try:
+            result = await func()
+        except BaseException as e:
+            # A cancelled leader (e.g. an abandoned batch) must not fail everyone waiting on it
+            future.set_exception(_shared(e))
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def stream(self, key, out, run):
+        """Subscribe out to the stream for key.
+
+        If no identical stream is in flight, returns a task that calls
+        run(sink) and must be started by the caller; every event run puts on
+        sink reaches out and any later subscribers. Returns None when out
+        joined a stream that is already running.
+        """
+        while True:
+            broadcast, leader = self._join(key, Broadcast)
+            if broadcast.subscribe(out):
+                break
+            # Its last subscriber left and it is stopping; start a new one
+            self._finish(key, broadcast)
+        if not leader:
+            return None
+        current = deadline.current()
+        if current is not None:
+            # A whole analysis' budget, however little the leader has left
+            broadcast.deadline = deadline.Deadline(max(current.seconds, deadline.DEADLINE_SECONDS), current.shares)
+            if current.stage is not None:
+                broadcast.deadline.start_stage(current.stage)
+
+        def task():
+            try:
+                # Run for every subscriber, not under the leader's deadline
+                with deadline.scope(broadcast.deadline):
+                    run(broadcast)
+            finally:
+                self._finish(key, broadcast)
+
+        return task
+
+    def leave(self, key, out):
+        """Unsubscribe out from the stream for key; the stream stops once nobody is subscribed"""
+        with self._lock:
+            broadcast = self._calls.get(key)
+        if isinstance(broadcast, Broadcast):
+            broadcast.unsubscribe(out)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
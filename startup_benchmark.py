@@ -0,0 +1,141 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Each run starts a fresh interpreter (as a new pod would), imports the
+Streamlit test harness, renders app.py once (first paint) and then reruns
+it, recording the time of each step. The child runs with -X importtime so
+the report also lists the slowest top-level imports and which heavy
+packages the app had loaded by first paint (not counting what the test
+harness imports itself); those should only be imported once an analysis
+actually needs them.
+
+Usage:
+    python startup_benchmark.py --runs 5 --output startup.json
+    python startup_benchmark.py --baseline startup.json --thresholds limits.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmark import StageRecorder, compare
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Packages that should not be needed to paint the first page
+HEAVY_MODULES = ("anthropic", "groq", "numpy", "pandas", "plotly.graph_objects", "PyPDF2", "pyarrow")
+SLOWEST_IMPORTS = 10
+
+CHILD_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+# The harness pulls in some heavy packages itself (plotly, pandas); only count what the app adds
+preloaded = set(sys.modules)
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+painted = time.perf_counter()
+loaded = sorted(set(sys.modules) - preloaded)
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    "import_streamlit": imported - started, "first_render": painted - imported, "rerun": rerun - painted,
+    "exceptions": [str(e.value) for e in at.exception], "modules": loaded,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative seconds} for top-level imports in -X importtime output"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nested imports are indented under their parent
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports[name.strip()] = int(cumulative) / 1e6
+    return imports
+
+
+def run_once(app_path=APP_PATH):
+    """Cold-start the app in a new interpreter; returns (timings, imports, modules)"""
+    env = dict(os.environ)
+    # A key keeps the page on its normal path; nothing is sent at startup
+    env.setdefault('ANTHROPIC_API_KEY', 'startup-benchmark')
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT, app_path],
+                             capture_output=True, text=True, env=env, cwd=os.path.dirname(app_path))
+    elapsed = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(f"startup run failed: {process.stderr.strip().splitlines()[-1:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    if result["exceptions"]:
+        raise RuntimeError(f"app raised on startup: {result['exceptions'][0]}")
+    timings = {stage: result[stage] for stage in ("import_streamlit", "first_render", "rerun")}
+    timings["process"] = elapsed
+    return timings, parse_importtime(process.stderr), result["modules"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import and first-render time of app.py")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--app", default=APP_PATH)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs baseline")
+    parser.add_argument("--thresholds", help='JSON of absolute limits, e.g. {"first_render": {"p95_ms": 1500}}')
+    args = parser.parse_args(argv)
+
+    recorder = StageRecorder()
+    imports = {}
+    heavy = set()
+    for run in range(args.runs):
+        print(f"Startup run {run + 1}/{args.runs}...", file=sys.stderr)
+        timings, run_imports, modules = run_once(args.app)
+        for stage, seconds in timings.items():
+            recorder.add(stage, seconds)
+        for name, seconds in run_imports.items():
+            imports.setdefault(name, []).append(seconds)
+        heavy.update(name for name in HEAVY_MODULES if name in modules)
+
+    results = {"startup": recorder.summary()}
+    slowest = sorted(((sum(v) / len(v), name) for name, v in imports.items()), reverse=True)[:SLOWEST_IMPORTS]
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "heavy_modules_at_first_paint": sorted(heavy),
+        "slowest_imports_ms": {name: round(seconds * 1000, 1) for seconds, name in slowest},
+        "results": results,
+    }
+
+    for stage, stats in results["startup"].items():
+        print(f"{stage:>16}  p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms")
+    print("Slowest imports: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in report["slowest_imports_ms"].items()))
+    print("Heavy modules loaded at first paint: " + (", ".join(report["heavy_modules_at_first_paint"]) or "none"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    thresholds = None
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    problems = compare(results, baseline, args.tolerance, thresholds)
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
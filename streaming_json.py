@@ -0,0 +1,86 @@
+"""Incremental parser for a streamed top-level JSON object.
+
+The analysis arrives as a single JSON object streamed token by token. This
+parser tracks string and nesting state across chunks and reports each
+top-level member as soon as its value is closed, so the UI can render one
+section while the model is still writing the next.
+"""
+import json
+
+
+class IncrementalObjectParser:
+    """Feed text chunks; get back (key, value) pairs for completed top-level members"""
+
+    def __init__(self):
+        self.result = {}
+        self.complete = False
+        self._chunks = []
+        self._member = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def text(self):
+        """All text received so far"""
+        return "".join(self._chunks)
+
+    def feed(self, chunk):
+        """Consume a chunk of streamed text and return newly completed members"""
+        # Only the new chunk is scanned; the open member is buffered as pieces
+        # and joined once it closes, so a long stream stays linear.
+        self._chunks.append(chunk)
+        completed = []
+        if self.complete:
+            return completed
+        start = 0
+        for i, char in enumerate(chunk):
+            if not self._started:
+                # Skip any preamble before the opening brace
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                    start = i + 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(self._take_member(chunk[start:i]), completed)
+                    self.complete = True
+                    return completed
+            elif char == ',' and self._depth == 1:
+                self._emit(self._take_member(chunk[start:i]), completed)
+                start = i + 1
+        if self._started:
+            self._member.append(chunk[start:])
+        return completed
+
+    def _take_member(self, tail):
+        self._member.append(tail)
+        segment = "".join(self._member)
+        self._member = []
+        return segment
+
+    def _emit(self, segment, completed):
+        if not segment.strip():
+            return
+        try:
+            member = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            return
+        for key, value in member.items():
+            self.result[key] = value
+            completed.append((key, value))